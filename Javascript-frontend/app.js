@@ -5,11 +5,19 @@ document.addEventListener('DOMContentLoaded', function() {
     const resultsSection = document.getElementById('results-section');
     const progressBar = document.getElementById('progress-bar');
     const analysisContent = document.getElementById('analysis-content');
+    const profileSelect = document.getElementById('profile-select');
+    const documentInput = document.getElementById('document-input');
+    const documentName = document.getElementById('document-name');
 
-    // Analysis steps configuration - now all steps are included in the main flow
-    const steps = ['strategy', 'competitors', 'revenue', 'cost', 'roi', 'justification', 'deck'];
+    // Steps of the current run; the backend sends the selected profile's steps with the run
+    let steps = ['strategy', 'competitors', 'revenue', 'cost', 'roi', 'justification', 'deck'];
     let currentStep = 0;
     let completedSteps = [];
+    let failedSteps = [];
+
+    // Identifies this page's analysis to the backend so concurrent users don't share context
+    const sessionId = crypto.randomUUID();
+    let currentRunId = null;
 
     // Dark theme detection
     function initializeTheme() {
@@ -21,11 +29,47 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    // Enable/disable analyze button based on textarea content
-    textarea.addEventListener('input', function() {
-        analyzeBtn.disabled = !this.value.trim();
+    // Offer the backend's analysis profiles, each listed with the steps it runs
+    async function loadProfiles() {
+        try {
+            const { profiles } = await fetch('http://localhost:5000/profiles').then(r => r.json());
+            profileSelect.innerHTML = Object.entries(profiles).map(([name, profileSteps]) =>
+                `<option value="${name}"${name === 'full' ? ' selected' : ''}>` +
+                `${name.charAt(0).toUpperCase() + name.slice(1)} (${profileSteps.map(s => formatStepName(s)).join(', ')})</option>`
+            ).join('');
+        } catch (error) {
+            console.error('Could not load analysis profiles:', error);
+        }
+    }
+    loadProfiles();
+
+    // Enable/disable analyze button based on textarea content or an attached document
+    function updateAnalyzeButton() {
+        analyzeBtn.disabled = !textarea.value.trim() && !documentInput.files.length;
+    }
+    textarea.addEventListener('input', updateAnalyzeButton);
+    documentInput.addEventListener('change', function() {
+        documentName.textContent = this.files.length ? this.files[0].name : 'Attach document';
+        updateAnalyzeButton();
     });
 
+    // The backend summarises the document once into a brief that every agent reads
+    async function uploadDocument(file) {
+        const response = await fetch(`http://localhost:5000/documents?name=${encodeURIComponent(file.name)}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'text/plain' },
+            body: await file.text()
+        });
+        let result = await response.json();
+        // With a job queue a worker summarises it in the background
+        while (result.job_id && !result.error) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            result = await (await fetch(`http://localhost:5000/documents/jobs/${result.job_id}`)).json();
+        }
+        if (result.error) throw new Error(result.error);
+        return result.document_id;
+    }
+
     // Tabs container creation
     function createTabsContainer() {
         const tabsContainer = document.createElement('div');
@@ -76,11 +120,22 @@ document.addEventListener('DOMContentLoaded', function() {
         const tabsList = document.querySelector('.tabs-list');
         const tabContent = document.querySelector('.tab-content');
 
+        // Replace a tab already showing the sections that streamed in before formatting finished
+        const existingTab = tabsList.querySelector(`.tab[data-step="${step}"]`);
+        const wasActive = existingTab?.classList.contains('active');
+        existingTab?.remove();
+        tabContent.querySelector(`.tab-pane[data-step="${step}"]`)?.remove();
+
         // Create tab button
         const tab = document.createElement('button');
         tab.className = 'tab';
         tab.textContent = formatStepName(step);
-        tabsList.appendChild(tab);
+        tab.setAttribute('data-step', step);
+
+        // Steps can finish in any order, so keep tabs in pipeline order
+        const nextTab = Array.from(tabsList.querySelectorAll('.tab'))
+            .find(t => steps.indexOf(t.getAttribute('data-step')) > steps.indexOf(step));
+        tabsList.insertBefore(tab, nextTab || null);
 
         // Parse content
         let formattedContent;
@@ -125,10 +180,23 @@ document.addEventListener('DOMContentLoaded', function() {
         // Add sections
         if (formattedContent && formattedContent.sections) {
             formattedContent.sections.forEach(section => {
+                const paragraphs = Array.isArray(section.content)
+                    ? section.content.map(p => `<p>${p}</p>`).join('')
+                    : (section.content || '');
+                const keyPoints = section.key_points?.length > 0
+                    ? `<ul>${section.key_points.map(point => `<li>${point}</li>`).join('')}</ul>`
+                    : '';
+                const metrics = section.metrics?.length > 0
+                    ? `<ul class="metrics">${section.metrics.map(m =>
+                        `<li><strong>${m.label}:</strong> ${m.unit === 'USD' ? '$' + m.value : m.value + (m.unit === 'year' ? '' : m.unit)}</li>`
+                      ).join('')}</ul>`
+                    : '';
                 htmlContent += `
                     <div class="analysis-section">
                         <h3>${section.title}</h3>
-                        ${section.content}
+                        ${paragraphs}
+                        ${keyPoints}
+                        ${metrics}
                     </div>
                 `;
             });
@@ -176,8 +244,8 @@ document.addEventListener('DOMContentLoaded', function() {
         // Store the formatted content for downloading
         contentDiv.dataset.content = JSON.stringify(formattedContent);
 
-        // Only show this tab if it's the first one
-        if (document.querySelectorAll('.tab').length === 1) {
+        // Only show this tab if it's the first one or it was showing before being replaced
+        if (wasActive || document.querySelectorAll('.tab').length === 1) {
             document.querySelectorAll('.tab-pane').forEach(pane => pane.style.display = 'none');
             document.querySelectorAll('.tab').forEach(t => t.classList.remove('active'));
             contentDiv.style.display = 'block';
@@ -234,7 +302,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 .style('stroke', getComputedStyle(document.documentElement).getPropertyValue('--border-color').trim())
                 .style('stroke-width', 2);
 
-            if (currentStep === index && !completedSteps.includes(step) && 
+            if (currentStep === index && !completedSteps.includes(step) && !failedSteps.includes(step) && 
                 currentStep < steps.length) {
                 const loadingCircle = g.append('circle')
                     .attr('class', 'loading-indicator')
@@ -277,7 +345,15 @@ document.addEventListener('DOMContentLoaded', function() {
         };
     }
 
+    // Failed steps are finished too, so the progress bar moves past them
+    function nextPendingStep() {
+        return steps.findIndex(s => !completedSteps.includes(s) && !failedSteps.includes(s));
+    }
+
     function getStepColor(step) {
+        if (failedSteps.includes(step)) {
+            return getComputedStyle(document.documentElement).getPropertyValue('--brand-error').trim();
+        }
         if (completedSteps.includes(step)) {
             return getComputedStyle(document.documentElement).getPropertyValue('--brand-success').trim();
         }
@@ -293,7 +369,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const processPromise = fetch(`http://localhost:5000/process/${step}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({}),
+                body: JSON.stringify({ session_id: sessionId }),
             }).then(r => r.json());
 
             const data = await processPromise;
@@ -305,30 +381,82 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    async function pollForFormattedResult(step) {
-        for (let i = 0; i < 30; i++) {  // Try for 30 seconds
-            const response = await fetch(`http://localhost:5000/get_formatted_result/${step}`);
-            const result = await response.json();
-            
-            if (result.status === "complete") {
-                return result.formatted_result;
-            } else if (result.error) {
-                throw new Error(result.error);
-            }
-            
-            await new Promise(resolve => setTimeout(resolve, 1000));  // Wait 1 second between polls
-        }
-        throw new Error("Timeout waiting for formatted result");
+    // Follow a run's event stream, adding each tab the moment its formatting is ready
+    function followRunEvents(runId) {
+        return new Promise((resolve, reject) => {
+            const source = new EventSource(`http://localhost:5000/runs/${runId}/events`);
+
+            source.addEventListener('step_started', e => {
+                const { step } = JSON.parse(e.data);
+                console.log(`Started ${step}`);
+            });
+
+            source.addEventListener('raw_ready', e => {
+                const { step } = JSON.parse(e.data);
+                console.log(`Raw ${step} result ready`);
+            });
+
+            // Sections arrive one at a time while the formatter is still writing the rest
+            const partialSections = {};
+            source.addEventListener('section_ready', e => {
+                const { step, section } = JSON.parse(e.data);
+                partialSections[step] = [...(partialSections[step] || []), section];
+                addTab(step, { sections: partialSections[step] });
+            });
+
+            source.addEventListener('formatted_ready', e => {
+                const { step, formatted_result } = JSON.parse(e.data);
+                delete partialSections[step];
+                addTab(step, formatted_result);
+                completedSteps.push(step);
+                currentStep = nextPendingStep();
+                createProgressBar();
+            });
+
+            // Named 'error' events come from the server, plain errors are connection problems
+            source.addEventListener('error', e => {
+                if (e.data) {
+                    const { step, error } = JSON.parse(e.data);
+                    console.error(`Error in ${step}:`, error);
+                    if (!step) {
+                        analysisContent.insertAdjacentHTML('afterbegin', `<div class="error">Error during analysis: ${error}</div>`);
+                        return;
+                    }
+                    delete partialSections[step];
+                    addTab(step, { sections: [{ title: 'Step failed', content: `<div class="error">${error}</div>` }] });
+                    failedSteps.push(step);
+                    currentStep = nextPendingStep();
+                    createProgressBar();
+                } else if (source.readyState === EventSource.CLOSED) {
+                    reject(new Error('Lost connection to analysis events'));
+                }
+            });
+
+            source.addEventListener('run_complete', e => {
+                source.close();
+                resolve(JSON.parse(e.data));
+            });
+
+            source.addEventListener('run_cancelled', e => {
+                source.close();
+                resolve({ ...JSON.parse(e.data), cancelled: true });
+            });
+        });
     }
 
     // Main analysis handler
     analyzeBtn.addEventListener('click', async function() {
         const context = textarea.value.trim();
-        if (!context) return;
+        const file = documentInput.files[0];
+        if (!context && !file) return;
 
-        // If currently processing, refresh the page to stop
+        // If currently processing, cancel the run on the server so it stops spending tokens
         if (analyzeBtn.textContent === 'Stop Processing') {
-            location.reload(true);
+            if (!currentRunId) {
+                location.reload(true);  // Still uploading, nothing runs on the server yet
+                return;
+            }
+            await fetch(`http://localhost:5000/runs/${currentRunId}/cancel`, { method: 'POST' });
             return;
         }
 
@@ -337,47 +465,44 @@ document.addEventListener('DOMContentLoaded', function() {
             analyzeBtn.textContent = 'Stop Processing';
             
             // Reset UI
+            currentRunId = null;
             completedSteps = [];
+            failedSteps = [];
             currentStep = 0;
             analysisContent.innerHTML = '';
             resultsSection.style.display = 'block';
 
-            // Submit context
-            const contextResponse = await fetch('http://localhost:5000/submit_context', {
+            // Submit the concept and start the whole pipeline on the server in one call,
+            // the backend runs independent steps concurrently
+            createProgressBar();
+            let documentId = null;
+            if (file) {
+                analysisContent.innerHTML = `<div class="document-status">Summarising ${file.name}...</div>`;
+                documentId = await uploadDocument(file);
+                analysisContent.innerHTML = '';
+            }
+            const response = await fetch('http://localhost:5000/runs', {
                 method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ custom_context: context })
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    custom_context: context,
+                    session_id: sessionId,
+                    profile: profileSelect.value,
+                    document_id: documentId
+                })
             });
+            const result = await response.json();
+            if (result.error) throw new Error(result.error);
+            steps = result.steps;
+            createProgressBar();
 
-            if (!contextResponse.ok) throw new Error('Failed to submit context');
-
-            // Process all steps sequentially
-            for (const step of steps) {
-                currentStep = steps.indexOf(step);
-                createProgressBar();
-                
-                try {
-                    const response = await fetch(`http://localhost:5000/process/${step}`, {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify({})
-                    });
-                    const result = await response.json();
-                    
-                    if (result.status === "processing") {
-                        const formattedResult = await pollForFormattedResult(step);
-                        addTab(step, formattedResult);
-                    } else {
-                        addTab(step, result);
-                    }
-                    
-                    completedSteps.push(step);
-                    createProgressBar();
-                } catch (error) {
-                    console.error('Error:', error);
-                }
+            // Steps are pushed to us in whatever order they finish
+            currentRunId = result.run_id;
+            const outcome = await followRunEvents(result.run_id);
+            if (outcome.cancelled) {
+                analysisContent.insertAdjacentHTML('afterbegin', `<div class="error">Analysis stopped: ${outcome.reason}</div>`);
+                analyzeBtn.textContent = 'Analyze';
+                return;
             }
 
             // Set to Analysis Complete when done
@@ -581,153 +706,15 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     };
 
-    // Add this function to handle downloading all tabs
-    async function downloadAllTabs() {
-        const zip = new JSZip();
-        const tabs = document.querySelectorAll('.tab-pane');
-        
-        // Process each tab
-        for (const tab of tabs) {
-            const stepName = tab.getAttribute('data-step');
-            if (!stepName) continue;
-
-            // Get content for each format
-            try {
-                // Add HTML version
-                const htmlContent = `
-                    <!DOCTYPE html>
-                    <html>
-                    <head>
-                        <title>${formatStepName(stepName, true)}</title>
-                        <style>
-                            body { font-family: Arial, sans-serif; line-height: 1.6; padding: 20px; }
-                            h2 { color: #333; }
-                            .analysis-section { margin-bottom: 20px; }
-                            ul { margin-top: 10px; }
-                        </style>
-                    </head>
-                    <body>
-                        ${tab.querySelector('.markdown-content').innerHTML}
-                    </body>
-                    </html>`;
-                zip.file(`${stepName}/${stepName}_analysis.html`, htmlContent);
-
-                // Add text version
-                const textContent = extractTextContent(tab);
-                zip.file(`${stepName}/${stepName}_analysis.txt`, textContent);
-
-                // Add PDF version
-                const pdfDoc = await generatePDF(tab, stepName);
-                const pdfBlob = await pdfDoc.getBlob();
-                zip.file(`${stepName}/${stepName}_analysis.pdf`, pdfBlob);
-            } catch (error) {
-                console.error(`Error processing ${stepName}:`, error);
-            }
-        }
-
-        // Generate and download the zip file
-        try {
-            const content = await zip.generateAsync({type: 'blob'});
-            const url = URL.createObjectURL(content);
-            const a = document.createElement('a');
-            a.href = url;
-            a.download = 'business_analysis.zip';
-            document.body.appendChild(a);
-            a.click();
-            document.body.removeChild(a);
-            URL.revokeObjectURL(url);
-        } catch (error) {
-            console.error('Error creating zip file:', error);
-        }
-    }
-
-    // Helper function to extract text content
-    function extractTextContent(container) {
-        const content = container.querySelector('.markdown-content');
-        if (!content) return '';
-        
-        let textContent = '';
-        const stepName = container.getAttribute('data-step');
-        
-        // Add title
-        textContent += `${formatStepName(stepName, true).toUpperCase()}\n\n`;
-        
-        // Process each section
-        content.querySelectorAll('.analysis-section').forEach(section => {
-            const title = section.querySelector('h3')?.textContent;
-            if (title) {
-                textContent += `${title.toUpperCase()}\n`;
-                textContent += '='.repeat(title.length) + '\n\n';
-            }
-            
-            const sectionContent = section.textContent
-                .replace(title || '', '')
-                .split('\n')
-                .map(line => line.trim())
-                .filter(line => line)
-                .join('\n');
-            
-            textContent += sectionContent + '\n\n';
-        });
-        
-        return textContent;
-    }
-
-    // Helper function to generate PDF
-    async function generatePDF(container, step) {
-        const content = container.querySelector('.markdown-content');
-        if (!content) return null;
-
-        let docDefinition = {
-            content: [],
-            styles: {
-                header: {
-                    fontSize: 18,
-                    bold: true,
-                    margin: [0, 0, 0, 10]
-                },
-                sectionHeader: {
-                    fontSize: 14,
-                    bold: true,
-                    margin: [0, 15, 0, 5]
-                },
-                paragraph: {
-                    fontSize: 12,
-                    margin: [0, 5, 0, 10]
-                }
-            }
-        };
-
-        // Add title
-        docDefinition.content.push({
-            text: formatStepName(step, true),
-            style: 'header'
-        });
-
-        // Process each section
-        content.querySelectorAll('.analysis-section').forEach(section => {
-            const title = section.querySelector('h3')?.textContent;
-            if (title) {
-                docDefinition.content.push({
-                    text: title,
-                    style: 'sectionHeader'
-                });
-            }
-
-            const text = section.textContent.replace(title || '', '').trim();
-            const paragraphs = text.split('.,').map(p => p.trim());
-            
-            paragraphs.forEach(paragraph => {
-                if (paragraph) {
-                    docDefinition.content.push({
-                        text: paragraph + '.',
-                        style: 'paragraph'
-                    });
-                }
-            });
-        });
-
-        return pdfMake.createPdf(docDefinition);
+    // Download every tab as a ZIP rendered by the backend, so the page does no rendering work
+    function downloadAllTabs() {
+        if (!currentRunId) return;
+        const a = document.createElement('a');
+        a.href = `http://localhost:5000/runs/${currentRunId}/export`;
+        a.download = 'business_analysis.zip';
+        document.body.appendChild(a);
+        a.click();
+        document.body.removeChild(a);
     }
 
     // Add download all button to UI after analysis completes
@@ -1,20 +1,46 @@
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
-from .agents.format_handler import FormatHandler
-from .agents.strategy_analysis import StrategyAnalysis
-from .agents.competitor_analysis import CompetitorAnalysis
-from .agents.revenue_analysis import RevenueAnalysis
-from .agents.cost_analysis import CostAnalysis
-from .agents.roi_analysis import ROIAnalysis
-from .agents.business_justification import BusinessJustification
-from .agents.investor_deck import InvestorDeck
-from concurrent.futures import ThreadPoolExecutor
+from .agents.format_handler import FormatHandler, FORMATTERS
+from .agents.registry import build_agents
+from .agents.context_filter_agent import ContextFilterAgent
+from .agents.question_answering import QuestionAnswering
+from .agents.document_summary import DocumentSummary
+from .scheduler import DependencyScheduler
+from .run_events import RunEvents
+from .context_store import ContextStore
+from .llm_cache import ResponseCache, CachedClient, AsyncCachedClient, REFRESH
+from .rate_limiter import RateLimiter, RateLimitedClient, AsyncRateLimitedClient
+from .metrics import Metrics, MeteredClient, AsyncMeteredClient
+from .hedging import HedgePolicy, HedgedClient, AsyncHedgedClient
+from .run_store import RunStore, input_hash
+from .export import Exporter
+from .concept_index import ConceptIndex
+from .run_index import RunIndexes
+from .documents import DocumentIngestor
+from .tracing import Tracer, span
+from .cancellation import RunCancellations, RunFollowers
+from . import cancellation
+from config.ai_models import AI_CONFIG, ANALYSIS_PROFILES, DOCUMENT_CONFIG, QA_CONFIG
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextvars
+import itertools
+import threading
+import time
+import uuid
+
 
 class AgentHandler:
-    def __init__(self):
+    def __init__(self, client=None):
         print("\nagent_handler.py: Initializing AgentHandler...")
+        if client is None:
+            client = self._create_client()
         
+        self.executor = ThreadPoolExecutor(max_workers=3)  # Allow 3 concurrent formatting tasks
+        self._init_components(client)
+
+    @staticmethod
+    def _create_client():
         # Check all OpenAI-related env vars
         env_vars = {
             'OPENAI_API_KEY': os.getenv('OPENAI_API_KEY'),
@@ -33,73 +59,464 @@ class AgentHandler:
         if not api_key:
             raise ValueError("OpenAI API key not found in environment variables")
             
-        self.client = OpenAI(
+        client = OpenAI(
             api_key=api_key,
-            organization=os.getenv('OPENAI_ORGANIZATION_ID')
+            organization=os.getenv('OPENAI_ORGANIZATION_ID'),
+            max_retries=0  # RateLimitedClient retries with backoff shared across all calls
         )
         print("agent_handler.py: Successfully created OpenAI client")
-        self.formatter = FormatHandler(self.client)
-        self.agents = {
-            'strategy': StrategyAnalysis(self.client),
-            'competitors': CompetitorAnalysis(self.client),
-            'revenue': RevenueAnalysis(self.client),
-            'cost': CostAnalysis(self.client),
-            'roi': ROIAnalysis(self.client),
-            'justification': BusinessJustification(self.client),
-            'deck': InvestorDeck(self.client)
-        }
-        self.context = {}
-        self.formatting_tasks = {}
-        self.executor = ThreadPoolExecutor(max_workers=3)  # Allow 3 concurrent formatting tasks
+        return client
+
+    def _init_components(self, client, asynchronous=False):
+        """Set up everything that does not depend on whether the client is sync or async"""
+        cache_wrapper, limit_wrapper, metered, hedged = (
+            (AsyncCachedClient, AsyncRateLimitedClient, AsyncMeteredClient, AsyncHedgedClient) if asynchronous
+            else (CachedClient, RateLimitedClient, MeteredClient, HedgedClient)
+        )
+        # Cache hits are answered before the rate limiter, so they never wait for a slot
+        self.limiter = RateLimiter.from_env()
+        limited = limit_wrapper(client, self.limiter)
+        self.cache = ResponseCache.from_env()
+        self.client = cache_wrapper(limited, self.cache) if self.cache else limited
+
+        # Each agent gets its own metered view of the shared client, labelled with its step,
+        # and hedges its own slow calls against that step's latency history. The hedge sits
+        # below the cache, so it only times and duplicates calls that reach the provider
+        self.metrics = Metrics()
+        self.metrics.gauge('llm_concurrency_limit', "Current adaptive limit on concurrent LLM calls",
+                           lambda: self.limiter.stats()['concurrency_limit'])
+        self.metrics.gauge('llm_in_flight', "LLM calls currently in flight", lambda: self.limiter.stats()['in_flight'])
+        self.formatter = FormatHandler(metered(self.client, self.metrics, 'format'))
+        self.hedging = HedgePolicy.from_env()
+        def agent_client(step):
+            client = hedged(limited, self.metrics, step, self.hedging, AI_CONFIG[step].get('fallback_model'), self.limiter)
+            return metered(cache_wrapper(client, self.cache) if self.cache else client, self.metrics, step)
+
+        self.agents = build_agents(AI_CONFIG, agent_client)
+        self.context_filter = ContextFilterAgent(AI_CONFIG)
+        self.contexts = ContextStore.from_env()
+        self.scheduler = DependencyScheduler(AI_CONFIG, profiles=ANALYSIS_PROFILES)
+        self.events = RunEvents()
+        self.cancellations = RunCancellations()
+        self.followers = RunFollowers.from_env(self.events, self.cancel_run)
+        self.runs = RunStore.from_env()
+        self.tracer = Tracer(self.runs)
+        self.exporter = Exporter.from_env(self.runs)
+        self.similar = ConceptIndex.from_env(self.runs, self.metrics)
+        self.indexes = RunIndexes(self.runs) if self.runs else None
+        self.qa = QuestionAnswering(metered(self.client, self.metrics, 'ask'), QA_CONFIG)
+        self.documents = DocumentIngestor(
+            DocumentSummary(metered(self.client, self.metrics, 'document'), DOCUMENT_CONFIG), DOCUMENT_CONFIG, self.runs
+        )
+
+    def check_session(self, session_id):
+        """Raise ValueError for a malformed session id"""
+        self.contexts.get(session_id)
+
+    def submit_context(self, session_id, custom_context):
+        """Store the business concept for a session and return the session id"""
+        context = self.contexts.get(session_id)
+        self._set_concept(context, custom_context)
+        return context.session_id
 
     def process_request(self, step, data):
         print(f"\nagent_handler.py: Processing step: {step}")
-        print(f"agent_handler.py: Current context keys: {list(self.context.keys())}")
         print(f"agent_handler.py: Incoming data: {data}")
         
         if step not in self.agents:
             return {"error": f"Unknown step: {step}"}
         
-        # Update context with incoming data
-        if 'custom_context' in data:
-            self.context['custom_context'] = data['custom_context']
+        context = self._context_for(data)
+        print(f"agent_handler.py: Current context keys: {context.keys()}")
+        if data.get('rerun'):
+            context.similar_match = False
+            context.regenerate.add(step)
+        else:
+            self._wait_for_run(step, context)
+            if step in context:
+                print(f"agent_handler.py: Returning precomputed {step} result")
+                return self._precomputed(step, context)
+
+        raw_result = self._run_step(step, context)
         
-        # Get response from the agent
-        agent = self.agents[step]
-        print(f"agent_handler.py: Calling {step} agent with context: {self.context}")
-        raw_result = agent.process(self.context)
+        return {
+            "status": "processing",
+            "raw_result": raw_result,
+            "step": step
+        }
+
+    def start_run(self, data):
+        """Start processing all steps in the background and return the run id to follow"""
+        context = self.contexts.get(data.get('session_id'))  # Reject bad session ids before starting
+        self._prepare_run(context, data)
+        run_id = self._open_run(context, self.scheduler.select(data.get('profile'), data.get('steps')))
+        # The run traces under the request that started it
+        threading.Thread(target=contextvars.copy_context().run, args=(self.process_all, data, run_id), daemon=True).start()
+        print(f"agent_handler.py: Started run {run_id}")
+        return run_id
+
+    def prepare_run(self, run_id, payload):
+        """Set up a run created by another process, e.g. a queued run, so process_all can publish to it.
+
+        The run id doubles as a private session holding the payload's concept and rerun
+        options, so concurrent runs never share a context; discard it once the run is done.
+        """
+        context = self.contexts.get(run_id)
+        self._set_concept(context, payload['concept'])
+        self._prepare_run(context, payload)
+        self.events.open(run_id)
+        context.run_id = run_id
+        return context
+
+    def restore_run(self, run_id, session_id=None):
+        """Load a stored run into a session and replay its events, so it is served without calling the agents.
+
+        Returns the session id, or None when the run is not stored or did not complete.
+        """
+        stored = self.runs.get(run_id) if self.runs else None
+        if stored is None or stored['status'] != 'complete':
+            return None
+
+        context = self.contexts.get(session_id)
+        self._set_concept(context, stored['concept'])
+        for step, result in stored['steps'].items():
+            context[step] = result['raw_result']
+            formatted = Future()
+            formatted.set_result(result['formatted_result'])
+            context.formatting_tasks[step] = formatted
+        context.run_id = run_id
+
+        if not self.events.exists(run_id):
+            self.events.open(run_id)
+            for step, result in stored['steps'].items():
+                self.events.publish(run_id, 'raw_ready', {'step': step, 'raw_result': result['raw_result']})
+                self.events.publish(run_id, 'formatted_ready', {'step': step, 'formatted_result': result['formatted_result']})
+            self.events.publish(run_id, 'run_complete', {'steps': list(stored['steps']), 'errors': {}})
+            self.events.close(run_id)
+        print(f"agent_handler.py: Restored run {run_id} into session {context.session_id}")
+        return context.session_id
+
+    def process_all(self, data, run_id=None):
+        """Run every agent, starting each one as soon as the steps it depends on are done"""
+        print(f"\nagent_handler.py: Processing all steps")
+        context = self._context_for(data)
         
-        print(f"agent_handler.py: Got raw result from {step}")
-        print(f"agent_handler.py: First 200 chars: {raw_result[:200]}...")
+        def on_complete(step, result, error):
+            if error:
+                self._publish(run_id, 'error', {'step': step, 'error': error})
         
-        # Store raw result in context
-        self.context[step] = raw_result
-        print(f"agent_handler.py: Updated context keys: {list(self.context.keys())}")
+        steps = self.scheduler.select(data.get('profile'), data.get('steps'))
+        cancelled = self.cancellations.open(run_id)
+        try:
+            with cancellation.scope(cancelled), self.tracer.span('run', run_id, lane='run', steps=len(steps)) as traced:
+                results, errors = self.scheduler.run(
+                    lambda step: self._run_step(step, context, run_id),
+                    steps=steps,
+                    on_complete=on_complete
+                )
+                
+                # The run is only finished once every formatting task has completed too
+                cancelled.wait([future for step, future in list(context.formatting_tasks.items()) if step in results])
+                traced.set(errors=len(errors), cancelled=cancelled.reason)
+            self._finish_run(run_id, cancelled, results, errors)
+        except Exception as e:
+            print(f"agent_handler.py: Error processing all steps: {e}")
+            self._publish(run_id, 'error', {'step': None, 'error': str(e)})
+            raise
+        finally:
+            if run_id:
+                self.cancellations.close(run_id)
+                self.events.close(run_id)
         
-        # Start formatting
-        future = self.executor.submit(
-            self.formatter.format_analysis,
-            raw_result
-        )
-        self.formatting_tasks[step] = future
+        return {
+            "status": "processing",
+            "raw_results": results,
+            "errors": errors
+        }
+
+    def _finish_run(self, run_id, cancelled, results, errors):
+        if cancelled.cancelled:
+            print(f"agent_handler.py: Run {run_id} cancelled: {cancelled.reason}")
+            self._publish(run_id, 'run_cancelled', {'reason': cancelled.reason, 'steps': list(results), 'errors': errors})
+        else:
+            self._publish(run_id, 'run_complete', {'steps': list(results.keys()), 'errors': errors})
+
+    def cancel_run(self, run_id, reason="Cancelled by the client"):
+        """Stop a run in progress: no more steps start, queued formatting is dropped and LLM
+        calls that have not been sent are abandoned. Returns None for an unknown run.
+        """
+        if self.cancellations.cancel(run_id, reason):
+            return True
+        if not self.events.exists(run_id) and not (self.runs and self.runs.get(run_id)):
+            return None
+        raise ValueError("Run has already finished")
+
+    def stream_request(self, step, data):
+        """Yield the agent's output as it is generated, then store and format the full text"""
+        print(f"\nagent_handler.py: Streaming step: {step}")
+        context = self._context_for(data)
         
+        chunks = []
+        for chunk in self.agents[step].stream(self.agent_context(step, context)):
+            chunks.append(chunk)
+            yield chunk
+        
+        # Downstream agents still need the complete text
+        self._store_result(step, ''.join(chunks), context)
+
+    def _context_for(self, data):
+        """Look up the caller's session, applying any business concept sent with the request"""
+        context = self.contexts.get(data.get('session_id'))
+        if data.get('custom_context'):
+            self._set_concept(context, data['custom_context'])
+        return context
+
+    def _set_concept(self, context, custom_context):
+        """Store the concept, dropping results and run links that were computed for a different one"""
+        if context.get('custom_context') == custom_context:
+            return
+        for step in self.agents:
+            if step in context:
+                del context[step]
+        context.run_id = None
+        context.similar_match = None
+        context['custom_context'] = custom_context
+
+    def _prepare_run(self, context, data):
+        """Apply a run request's rerun and incremental re-run options to the session.
+
+        With base_run_id, each step whose input fingerprint matches that run's is served from
+        it, except the steps listed in regenerate. A regenerated step's new output changes
+        its dependents' fingerprints, so exactly the affected steps call their agents.
+        """
+        context.base_run = None
+        context.regenerate = set(self.agents) if data.get('rerun') else set(data.get('regenerate') or [])
+        unknown = context.regenerate - set(self.agents)
+        if unknown:
+            raise ValueError(f"Unknown steps: {sorted(unknown)}")
+        if data.get('base_run_id'):
+            context.base_run = self.runs.get(data['base_run_id']) if self.runs else None
+            if context.base_run is None:
+                raise ValueError(f"Unknown run: {data['base_run_id']}")
+        if context.regenerate or context.base_run:
+            context.similar_match = False
+
+    def _open_run(self, context, steps):
+        """Create a run of the given steps for the session's concept in the event log and the run store"""
+        run_id = uuid.uuid4().hex
+        self.events.open(run_id)
+        if self.runs:
+            self.runs.start(run_id, context.session_id, context.get('custom_context', ''))
+        self._publish(run_id, 'run_started', {'steps': steps})
+        self.tracer.bind(run_id)
+        self.cancellations.open(run_id, context.session_id)
+        context.run_id = run_id
+        return run_id
+
+    def _wait_for_run(self, step, context):
+        """If a server-side run is computing this step for the session, wait for it instead of starting over"""
+        if step in context or not context.run_id:
+            return
+        for event in self.events.subscribe(context.run_id):
+            if event and event['data'].get('step') in (step, None) and event['event'] in ('raw_ready', 'error'):
+                return
+
+    def _precomputed(self, step, context):
         return {
             "status": "processing",
-            "raw_result": raw_result,
-            "step": step
+            "raw_result": context[step],
+            "step": step,
+            "precomputed": True
         }
 
-    def get_formatted_result(self, step):
+    def _run_step(self, step, context, run_id=None):
+        """Call one agent, store its raw result in context and start formatting it"""
+        agent = self.agents[step]
+        cancellation.check()
+        self._publish(run_id, 'step_started', {'step': step})
+        with span('step', lane=step, step=step) as traced:
+            fingerprint = self._input_hash(step, context)
+            unchanged = self._unchanged_result(step, context, fingerprint, run_id)
+            if unchanged:
+                traced.set(source='unchanged')
+                return self._store_result(step, unchanged['raw_result'], context, run_id, fingerprint, unchanged['formatted_result'])
+            raw_result = self._reused_result(step, context, run_id)
+            traced.set(source='agent' if raw_result is None else 'similar')
+            if raw_result is None:
+                print(f"agent_handler.py: Calling {step} agent with context keys: {context.keys()}")
+                refresh = REFRESH.set(step in context.regenerate)
+                try:
+                    raw_result = agent.process(self.agent_context(step, context, run_id))
+                finally:
+                    REFRESH.reset(refresh)
+            traced.set(raw_bytes=len(raw_result))
+            return self._store_result(step, raw_result, context, run_id, fingerprint)
+
+    def _input_hash(self, step, context):
+        dependencies = AI_CONFIG.get(step, {}).get('dependencies', [])
+        return input_hash(step, AI_CONFIG.get(step, {}), context.get('custom_context', ''),
+                          {dep: context.get(dep, '') for dep in dependencies})
+
+    def _unchanged_result(self, step, context, fingerprint, run_id=None):
+        """The base run's result for this step if its inputs are unchanged and it was not asked to regenerate"""
+        stored = context.base_run['steps'].get(step) if context.base_run else None
+        if not stored or step in context.regenerate or stored['raw_result'] is None or stored['input_hash'] != fingerprint:
+            return None
+        print(f"agent_handler.py: Inputs of {step} unchanged, reusing run {context.base_run['run_id']}")
+        self._publish(run_id, 'step_reused', {'step': step, 'source_run_id': context.base_run['run_id'], 'unchanged': True})
+        return stored
+
+    def _reused_result(self, step, context, run_id=None):
+        """This step's output from the run of a near-duplicate concept, or None to call the agent"""
+        if not self.similar or not self._reusable(step):
+            return None
+        if context.similar_match is None:
+            context.similar_match = self.similar.match(context.get('custom_context', ''), run_id) or False
+        if not context.similar_match:
+            return None
+        source_run_id, _, score = context.similar_match
+        raw_result = self.runs.step_result(source_run_id, step)
+        if raw_result is not None:
+            print(f"agent_handler.py: Reusing {step} from run {source_run_id} (similarity {score:.2f})")
+            self._publish(run_id, 'step_reused', {'step': step, 'source_run_id': source_run_id, 'similarity': score})
+        return raw_result
+
+    def _reusable(self, step):
+        """Steps marked reuse_similar whose dependencies can all be reused as well"""
+        config = AI_CONFIG.get(step, {})
+        return bool(config.get('reuse_similar')) and all(self._reusable(dep) for dep in config.get('dependencies', []))
+
+    def agent_context(self, step, context, run_id=None):
+        """Hand the agent its upstream analyses, compacted to the step's token budget"""
+        with span('context_filter') as traced:
+            filtered, report = self.context_filter.process(context, step, self.agents[step].system_role)
+            traced.set(budget=report['budget'], tokens_before=report['tokens_before'], tokens_after=report['tokens_after'])
+        if report['tokens_saved']:
+            print(f"agent_handler.py: Compacted context for {step}: {report['tokens_before']} -> {report['tokens_after']} tokens")
+            self._publish(run_id, 'context_compacted', report)
+        return filtered
+
+    def _store_result(self, step, raw_result, context, run_id=None, fingerprint=None, formatted=None):
+        cancellation.check()  # A result that arrives after its run was cancelled is dropped
+        print(f"agent_handler.py: Got raw result from {step}")
+        print(f"agent_handler.py: First 200 chars: {raw_result[:200]}...")
+        
+        # Store raw result in context
+        context[step] = raw_result
+        print(f"agent_handler.py: Updated context keys: {context.keys()}")
+        self._publish(run_id, 'raw_ready', {'step': step, 'raw_result': raw_result, 'input_hash': fingerprint})
+        
+        # Start formatting, unless the result was reused already formatted
+        if formatted is not None:
+            future = Future()
+            future.set_result(formatted)
+            self._publish_formatted(run_id, step, formatted)
+        else:
+            future = self._start_formatting(step, raw_result, run_id)
+        context.formatting_tasks[step] = future
+        return raw_result
+
+    def _start_formatting(self, step, raw_result, run_id=None):
+        future = self.executor.submit(contextvars.copy_context().run, self._format_step, step, raw_result, run_id,
+                                      time.monotonic())
+        # Formatting that has not started yet is dropped when the run is cancelled
+        cancellation.current().on_cancel(future.cancel)
+        return future
+
+    def _format_step(self, step, raw_result, run_id=None, queued_at=None):
+        """Format a step's result and publish it; the task is only done once its event is out"""
+        cancellation.check()
+        formatter = self._formatter_for(step)
+        start = time.monotonic()
+        try:
+            with self._format_span(step, formatter, raw_result, start - (queued_at or start)) as traced:
+                formatted = self.formatter.format_step(raw_result, formatter, self._section_publisher(step, run_id))
+                traced.set(sections=len(formatted.get('sections', [])) if isinstance(formatted, dict) else None)
+        except Exception as e:
+            self._publish_formatted(run_id, step, error=e)
+            raise
+        finally:
+            self.metrics.observe_format(step, formatter, time.monotonic() - start)
+        self._publish_formatted(run_id, step, formatted)
+        return formatted
+
+    @staticmethod
+    def _format_span(step, formatter, raw_result, queue_seconds):
+        # Formatting outlives the step that started it, so it gets its own lane
+        return span('format', lane=f"{step} format", step=step, formatter=formatter, raw_bytes=len(raw_result),
+                    queue_seconds=round(queue_seconds, 6))
+
+    def _formatter_for(self, step):
+        formatter = AI_CONFIG.get(step, {}).get('formatter', 'local')
+        if formatter not in FORMATTERS:
+            raise ValueError(f"Unknown formatter for {step}: {formatter}")
+        return formatter
+
+    def _publish(self, run_id, event, data):
+        # Once a run is cancelled, only process_all reports on it, outside the run's scope
+        if run_id and not cancellation.current().cancelled:
+            self.events.publish(run_id, event, data)
+            self._persist(run_id, event, data)
+
+    def _persist(self, run_id, event, data):
+        """Record a published event in the run store and the run's question index"""
+        if self.runs:
+            self.runs.record(run_id, event, data)
+        if event == 'formatted_ready' and self.indexes:
+            self.indexes.add(run_id, data['step'], data['formatted_result'])
+
+    def _section_publisher(self, step, run_id):
+        """Callback that publishes each section as the formatter completes it"""
+        if not run_id:
+            return None
+        index = itertools.count()
+        return lambda section: self._publish(run_id, 'section_ready', {'step': step, 'index': next(index), 'section': section})
+
+    def _publish_formatted(self, run_id, step, formatted=None, error=None):
+        if error is not None:
+            self._publish(run_id, 'error', {'step': step, 'error': f"Formatting failed: {str(error)}"})
+        else:
+            self._publish(run_id, 'formatted_ready', {'step': step, 'formatted_result': formatted})
+
+    def ask(self, run_id, question, k=None):
+        """Answer a question about a run from its most relevant sections, or None for an unknown run"""
+        found = self._ask_sources(run_id, question, k)
+        if found is None:
+            return None
+        self.tracer.bind(run_id)
+        sources, search_ms = found
+        return {'answer': self.answer(question, sources), 'sources': sources, 'search_ms': round(search_ms, 2)}
+
+    def answer(self, question, sources):
+        return self.qa.process({'question': question, 'sources': sources})
+
+    def _ask_sources(self, run_id, question, k=None):
+        if not self.indexes:
+            raise ValueError("Questions need the run store")
+        return self.indexes.search(run_id, question, k or QA_CONFIG.get('top_k', 5))
+
+    def ingest_document(self, text, name=''):
+        """Reduce an uploaded document to the brief runs can be given with its document_id"""
+        return self.documents.ingest(text, name)
+
+    def document_job(self, job_id):
+        """Documents are summarised while their request waits here, so there are no jobs to look up"""
+        return None
+
+    def get_formatted_result(self, step, session_id=None):
         """Check if formatting is complete and return result"""
-        if step not in self.formatting_tasks:
+        formatting_tasks = self.contexts.get(session_id).formatting_tasks
+        if step not in formatting_tasks:
             return {"error": "No formatting task found for this step"}
             
-        future = self.formatting_tasks[step]
+        future = formatting_tasks[step]
         
+        if future.cancelled():
+            return {"error": "Formatting was cancelled with its run"}
         if future.done():
             try:
                 formatted_result = future.result()
-                del self.formatting_tasks[step]  # Cleanup completed task
+                formatting_tasks.pop(step, None)  # Cleanup completed task
                 return {
                     "status": "complete",
                     "formatted_result": formatted_result
@@ -111,4 +528,12 @@ class AgentHandler:
 
     def __del__(self):
         """Cleanup executor on deletion"""
-        self.executor.shutdown(wait=False) 
\ No newline at end of file
+        if getattr(self, 'executor', None):
+            self.executor.shutdown(wait=False)
+        if getattr(self, 'exporter', None):
+            try:
+                self.exporter.close()
+            except OSError:
+                pass  # Collected in the same GC pass as its pool, which closed its pipes already
+        if getattr(self, 'documents', None):
+            self.documents.pool.shutdown(wait=False) 
\ No newline at end of file
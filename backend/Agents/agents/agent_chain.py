@@ -1,28 +1,137 @@
+import uuid
+from ..documents import with_brief
+
+
 class AgentChain:
-    def __init__(self):
-        self.context_filter = ContextFilterAgent()
-        self.formatting_agent = FormattingAgent()
-        self.raw_outputs = []  # Store all raw outputs
-
-    async def process_chain(self, initial_data):
-        for agent in self.agents:
-            # Store raw output
-            raw_output = await agent.process(initial_data)
-            self.raw_outputs.append(raw_output)
-
-            # Filter context for next agent
-            filtered_context = await self.context_filter.process(
-                self.raw_outputs,
-                type(self.agents[next_index]).__name__
-            )
-
-            # Update context for next agent
-            initial_data = filtered_context
-
-        # Format final output for frontend
-        formatted_output = await self.formatting_agent.process(self.raw_outputs[-1])
-        
+    """Runs the whole agent pipeline for a concept on the server, as soon as it is submitted.
+
+    The run does not depend on the client staying connected: clients follow it through
+    /runs/<run_id>/events, poll its status, or call /process/<step>, which returns the
+    chain's result for that step instead of running the agent again.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def start(self, custom_context, session_id=None, rerun=False, profile=None, steps=None, document_id=None):
+        """Store the concept and start the selected steps, returning the ids to follow the run with.
+
+        A profile or list of steps limits the run to those steps and their dependencies;
+        by default every step runs. With the document_id of an ingested document, its
+        brief is added to the concept. A concept that already has a complete stored run of
+        those steps is served from it unless rerun is set.
+        """
+        if document_id:
+            document = self.handler.documents.get(document_id)
+            if document is None:
+                raise ValueError(f"Unknown document: {document_id}")
+            custom_context = with_brief(custom_context, document)
+        if not custom_context or not custom_context.strip():
+            raise ValueError("custom_context is required")
+        selected = self.handler.scheduler.select(profile, steps)
+        stored = None if rerun or not self.handler.runs else self.handler.runs.latest_complete(custom_context, selected)
+        if stored:
+            session_id = self.handler.restore_run(stored, session_id or uuid.uuid4().hex)
+            if session_id:
+                print(f"agent_chain.py: Reusing stored run {stored} for session {session_id}")
+                return {'run_id': stored, 'session_id': session_id, 'steps': selected, 'reused': True}
+
+        session_id = self.handler.submit_context(session_id or uuid.uuid4().hex, custom_context)
+        run_id = self.handler.start_run({'session_id': session_id, 'rerun': rerun, 'steps': selected})
+        print(f"agent_chain.py: Started run {run_id} of {len(selected)} steps for session {session_id}")
+        return {'run_id': run_id, 'session_id': session_id, 'steps': selected}
+
+    def regenerate(self, run_id, steps=(), custom_context=None, session_id=None):
+        """Start a run that recomputes only what changed since run_id.
+
+        The listed steps are regenerated, and so is every step whose inputs differ from
+        run_id's, such as the dependents of a regenerated step or every step after a concept
+        edit. The rest are served from run_id. Returns None for an unknown run.
+        """
+        stored = self.handler.runs.get(run_id) if self.handler.runs else None
+        if stored is None:
+            return None
+        if stored['status'] == 'running':
+            raise ValueError("Run has not finished yet")
+        unknown = [step for step in steps if step not in self.handler.agents]
+        if unknown:
+            raise ValueError(f"Unknown steps: {unknown}")
+        custom_context = custom_context or stored['concept']
+        if not steps and custom_context == stored['concept']:
+            raise ValueError("Nothing to regenerate: name steps or send an edited custom_context")
+
+        run_steps = self.handler.scheduler.closure(list(stored['steps']) + list(steps))
+        session_id = self.handler.submit_context(session_id or uuid.uuid4().hex, custom_context)
+        new_run_id = self.handler.start_run({
+            'session_id': session_id,
+            'base_run_id': run_id,
+            'regenerate': list(steps),
+            'steps': run_steps
+        })
+        print(f"agent_chain.py: Started run {new_run_id} from run {run_id}, regenerating {list(steps)}")
+        # Upper bound: a dependent is reused after all if its inputs come out unchanged
+        affected = self.handler.scheduler.dependents(steps) if custom_context == stored['concept'] else run_steps
+        return {
+            'run_id': new_run_id,
+            'session_id': session_id,
+            'base_run_id': run_id,
+            'affected': [step for step in affected if step in run_steps]
+        }
+
+    def status(self, run_id):
+        """Summarise a run from its event log, or None for an unknown run"""
+        history = self.handler.events.history(run_id)
+        if history is None:
+            return self._stored_status(run_id)
+
+        steps = {}
+        errors = {}
+        planned = list(self.handler.agents)
+        cancelled = None
+        for event in history['events']:
+            step = event['data'].get('step')
+            if event['event'] == 'run_started':
+                planned = event['data']['steps']
+            elif event['event'] == 'step_started':
+                steps[step] = 'running'
+            elif event['event'] == 'raw_ready':
+                steps[step] = 'formatting'
+            elif event['event'] == 'formatted_ready':
+                steps[step] = 'complete'
+            elif event['event'] == 'run_cancelled':
+                cancelled = event['data']['reason']
+                errors['run'] = cancelled
+            elif event['event'] == 'error':
+                errors[step or 'run'] = event['data']['error']
+                if step:
+                    steps[step] = 'failed'
+
+        pending = [step for step in planned if step not in steps]
+        steps.update({step: 'skipped' if history['closed'] else 'pending' for step in pending})
+        if cancelled:
+            steps.update({step: 'cancelled' for step, state in steps.items() if state not in ('complete', 'failed')})
+        if cancelled:
+            status = 'cancelled'
+        elif not history['closed']:
+            status = 'running'
+        else:
+            # The same rule as the run store, so the answer does not change once the run is only stored
+            status = 'failed' if errors else 'complete'
+        return {
+            'run_id': run_id,
+            'status': status,
+            'steps': steps,
+            'errors': errors
+        }
+
+    def _stored_status(self, run_id):
+        """Status of a run that is no longer in this process's event log, from the run store"""
+        stored = self.handler.runs.get(run_id) if self.handler.runs else None
+        if stored is None:
+            return None
         return {
-            'formatted_output': formatted_output,
-            'raw_outputs': self.raw_outputs  # Keep raw data for reference
+            'run_id': run_id,
+            'status': stored['status'],
+            'steps': {step: result['status'] for step, result in stored['steps'].items()},
+            'errors': stored['errors']
         }
@@ -0,0 +1,74 @@
+from ..tracing import span
+
+class BaseAgent:
+    """Shared OpenAI call for the analysis agents, subclasses only build the prompt"""
+
+    model = "gpt-3.5-turbo"
+    temperature = 0.7
+
+    def __init__(self, client, config=None):
+        self.client = client
+        # The step's entry in AI_CONFIG decides the model and temperature
+        config = config or {}
+        self.model = config.get('model', self.model)
+        self.temperature = config.get('temperature', self.temperature)
+
+    def build_messages(self, context):
+        raise NotImplementedError
+
+    def _messages(self, context):
+        with span('prompt', agent=type(self).__name__) as prompt:
+            messages = self.build_messages(context)
+            prompt.set(messages=len(messages), prompt_bytes=sum(len(message.get('content') or '') for message in messages))
+        return messages
+
+    def process(self, context):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(context),
+            temperature=self.temperature
+        )
+
+        return response.choices[0].message.content
+
+    def stream(self, context):
+        """Yield the answer piece by piece as the model generates it"""
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(context),
+            temperature=self.temperature,
+            stream=True
+        )
+
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    async def aprocess(self, context):
+        """Same as process, for agents built with an AsyncOpenAI client"""
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(context),
+            temperature=self.temperature
+        )
+
+        return response.choices[0].message.content
+
+    async def astream(self, context):
+        """Same as stream, for agents built with an AsyncOpenAI client"""
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(context),
+            temperature=self.temperature,
+            stream=True
+        )
+
+        async for chunk in response:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
@@ -1,8 +1,8 @@
-from openai import OpenAI
+from .base_agent import BaseAgent
 
-class BusinessJustification:
-    def __init__(self, client):
-        self.client = client
+class BusinessJustification(BaseAgent):
+    def __init__(self, client, config=None):
+        super().__init__(client, config)
         self.system_role = """You are a business case and investment justification expert.
         
         Focus your analysis on:
@@ -15,7 +15,7 @@ class BusinessJustification:
         
         Create a compelling business case that ties together all previous analyses."""
 
-    def process(self, context):
+    def build_messages(self, context):
         custom_context = context.get('custom_context', '')
         strategy_analysis = context.get('strategy', '')
         competitor_analysis = context.get('competitors', '')
@@ -60,15 +60,7 @@ class BusinessJustification:
         
         Format your response with clear sections, compelling arguments, and specific supporting data."""
 
-        messages = [
+        return [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt}
         ]
-
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7
-        )
-
-        return response.choices[0].message.content 
\ No newline at end of file
@@ -1,8 +1,8 @@
-from openai import OpenAI
+from .base_agent import BaseAgent
 
-class CompetitorAnalysis:
-    def __init__(self, client):
-        self.client = client
+class CompetitorAnalysis(BaseAgent):
+    def __init__(self, client, config=None):
+        super().__init__(client, config)
         self.system_role = """You are a competitive intelligence expert.
         
         Analyze competitors focusing on:
@@ -15,7 +15,7 @@ class CompetitorAnalysis:
         
         Provide specific examples and data points where possible."""
 
-    def process(self, context):
+    def build_messages(self, context):
         custom_context = context.get('custom_context', '')
         strategy_analysis = context.get('strategy', '')
         
@@ -45,15 +45,7 @@ class CompetitorAnalysis:
         
         Format your response with clear sections, competitor comparisons, and specific insights."""
 
-        messages = [
+        return [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt}
         ]
-
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7
-        )
-
-        return response.choices[0].message.content 
\ No newline at end of file
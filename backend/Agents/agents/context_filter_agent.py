@@ -1,15 +1,147 @@
-from typing import Dict, List, Any
+import re
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from ..tokens import count_tokens
+
+# Dollar amounts, percentages, multiples, CAGR and years are kept whenever they fit
+NUMERIC_FACT = re.compile(
+    r"\$\s?\d|\d(?:[\d,.]*\d)?\s?(?:%|percent\b|x\b|k\b|m\b|bn?\b|million\b|billion\b|thousand\b)"
+    r"|\bCAGR\b|\b(?:19|20)\d{2}\b",
+    re.IGNORECASE
+)
+# Break after sentence ends, at line breaks, and before inline headings and bullets
+SEGMENT_BREAK = re.compile(r"(?<=[.!?])\s+|\n+|\s+(?=#{1,6}\s)|\s+(?=[-*•]\s)")
+HEADING = re.compile(r"^#{1,6}\s")
+WORD = re.compile(r"[a-z0-9$%]+")
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'of', 'to', 'in', 'for', 'on', 'with', 'by', 'as', 'at',
+    'is', 'are', 'be', 'this', 'that', 'it', 'its', 'from', 'will', 'can', 'their', 'such'
+}
+
 
 class ContextFilterAgent:
-    def __init__(self):
-        self.system_prompt = """
-        You are a context filtering specialist. Your job is to:
-        1. Analyze all previous agent outputs
-        2. Identify key information relevant to the next task
-        3. Summarize critical context
-        4. Maintain important details while reducing overall size
-        """
-
-    async def process(self, previous_outputs: List[Dict[str, Any]], next_agent_type: str) -> Dict[str, Any]:
-        # Filter and condense context
-        # Return relevant data for next agent
+    """Local, non-LLM compaction of upstream analyses to fit each step's token budget.
+
+    Sentences are ranked with hashed TF-IDF vectors by how central they are to their
+    analysis and how relevant they are to the next agent's focus. Sentences with numeric
+    facts are kept first, then the best of the rest until the budget is used up.
+    """
+
+    def __init__(self, config: Dict[str, Dict[str, Any]], dimensions: int = 2048):
+        self.config = config
+        self.dimensions = dimensions
+
+    def process(self, context: Dict[str, Any], step: str, focus: str = '') -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Return the context to hand to `step`'s agent and a report of tokens saved"""
+        step_config = self.config.get(step, {})
+        model = step_config.get('model', 'gpt-3.5-turbo')
+        budget = step_config.get('context_budget')
+        dependencies = step_config.get('dependencies', [])
+
+        filtered = {'custom_context': context.get('custom_context', '')}
+        texts = {dep: context.get(dep, '') for dep in dependencies}
+        filtered.update(texts)
+
+        before = {dep: count_tokens(text, model) for dep, text in texts.items()}
+        after = dict(before)
+        if budget is not None and sum(before.values()) > budget:
+            shares = self._allocate(before, budget)
+            query = focus or step_config.get('system_role', '')
+            for dep, text in texts.items():
+                if before[dep] > shares[dep]:
+                    filtered[dep] = self.compact(text, shares[dep], query, model)
+                    after[dep] = count_tokens(filtered[dep], model)
+
+        report = {
+            'step': step,
+            'budget': budget,
+            'tokens_before': sum(before.values()),
+            'tokens_after': sum(after.values()),
+            'tokens_saved': sum(before.values()) - sum(after.values()),
+            'dependencies': {dep: {'before': before[dep], 'after': after[dep]} for dep in dependencies}
+        }
+        return filtered, report
+
+    def compact(self, text: str, budget: int, query: str = '', model: str = 'gpt-3.5-turbo') -> str:
+        """Keep the highest ranked sentences of text that fit in budget tokens, in original order"""
+        segments = [segment.strip() for segment in SEGMENT_BREAK.split(text) if segment and segment.strip()]
+        if not segments:
+            return text
+
+        headings = np.array([bool(HEADING.match(segment)) for segment in segments])
+        tokens = np.array([count_tokens(segment, model) for segment in segments])
+        # Every sentence belongs to the heading above it
+        groups = np.cumsum(headings)
+        scores = self._score(segments, query)
+        numeric = np.array([bool(NUMERIC_FACT.search(segment)) for segment in segments])
+
+        sentences = np.flatnonzero(~headings)
+        ranked = sorted(sentences, key=lambda i: (not numeric[i], -scores[i]))
+
+        chosen = set()
+        used = 0
+        for i in ranked:
+            heading = np.flatnonzero(headings & (groups == groups[i]))
+            new_heading = [h for h in heading if h not in chosen]
+            cost = tokens[i] + sum(tokens[h] for h in new_heading)
+            if used + cost > budget:
+                continue
+            chosen.update([i, *new_heading])
+            used += cost
+
+        return '\n'.join(segments[i] for i in sorted(chosen))
+
+    def _score(self, segments: List[str], query: str) -> np.ndarray:
+        """Centrality to the whole text plus similarity to the query, slightly favoring early sentences"""
+        matrix = self._vectorize(segments + [query])
+        sentences, query_vector = matrix[:-1], matrix[-1]
+
+        centroid = sentences.sum(axis=0)
+        norm = np.linalg.norm(centroid)
+        if norm:
+            centroid /= norm
+
+        position = 1.0 - np.arange(len(segments)) / max(len(segments), 1)
+        return 0.6 * (sentences @ centroid) + 0.3 * (sentences @ query_vector) + 0.1 * position
+
+    def _vectorize(self, texts: List[str]) -> np.ndarray:
+        """Row-normalized TF-IDF vectors over hashed words"""
+        rows = []
+        columns = []
+        for row, text in enumerate(texts):
+            for word in WORD.findall(text.lower()):
+                if word not in STOPWORDS:
+                    rows.append(row)
+                    columns.append(zlib.crc32(word.encode('utf-8')) % self.dimensions)
+
+        counts = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(columns, dtype=np.intp)), 1.0)
+
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1.0
+        matrix = np.log1p(counts) * idf
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @staticmethod
+    def _allocate(sizes: Dict[str, int], budget: int) -> Dict[str, int]:
+        """Split the budget evenly, giving what short analyses don't need to the longer ones"""
+        shares = {}
+        remaining = dict(sizes)
+        left = budget
+        while remaining:
+            fair = left / len(remaining)
+            small = {dep: size for dep, size in remaining.items() if size <= fair}
+            if not small:
+                shares.update({dep: int(fair) for dep in remaining})
+                break
+            for dep, size in small.items():
+                shares[dep] = size
+                left -= size
+                del remaining[dep]
+        return shares
@@ -1,8 +1,8 @@
-from openai import OpenAI
+from .base_agent import BaseAgent
 
-class CostAnalysis:
-    def __init__(self, client):
-        self.client = client
+class CostAnalysis(BaseAgent):
+    def __init__(self, client, config=None):
+        super().__init__(client, config)
         self.system_role = """You are a cost analysis and financial modeling expert.
         
         Focus your analysis on:
@@ -15,13 +15,11 @@ class CostAnalysis:
         
         Include specific cost metrics and financial data where possible."""
 
-    def process(self, context):
+    def build_messages(self, context):
         custom_context = context.get('custom_context', '')
         strategy_analysis = context.get('strategy', '')
-        competitor_analysis = context.get('competitors', '')
-        revenue_analysis = context.get('revenue', '')
         
-        prompt = f"""Based on the context and previous analyses, provide a detailed cost analysis that includes:
+        prompt = f"""Based on the context and strategy analysis, provide a detailed cost analysis that includes:
         
         1. Cost Structure Analysis
         - Fixed costs identification
@@ -46,23 +44,9 @@ class CostAnalysis:
         Strategy Analysis:
         {strategy_analysis}
         
-        Competitor Analysis:
-        {competitor_analysis}
-        
-        Revenue Analysis:
-        {revenue_analysis}
-        
         Format your response with clear sections, specific cost metrics, and detailed financial projections."""
 
-        messages = [
+        return [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt}
         ]
-
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7
-        )
-
-        return response.choices[0].message.content 
\ No newline at end of file
@@ -0,0 +1,38 @@
+from .base_agent import BaseAgent
+
+class DocumentSummary(BaseAgent):
+    def __init__(self, client, config=None):
+        super().__init__(client, config)
+        config = config or {}
+        self.summary_words = config.get('summary_words', 200)
+        self.brief_words = config.get('brief_words', 500)
+        self.system_role = """You are a business analyst preparing source material for a team of analysts.
+
+        Work only from the text you are given and never add facts of your own. Keep every
+        figure, price, date, market size, customer, competitor and named plan, with its units."""
+
+    def build_messages(self, context):
+        name = context.get('name') or 'the document'
+
+        if 'summaries' in context:
+            # Reduce: combine the notes on each part into one brief
+            notes = "\n\n".join(f"[{i}] {summary}" for i, summary in enumerate(context['summaries'], 1))
+            prompt = f"""Notes on consecutive parts of {name}:
+
+            {notes}
+
+            Combine them into one brief of at most {self.brief_words} words, with short sections for
+            the business and its offering, market and customers, competitors, costs, revenue and
+            funding, and plans and risks. Leave out sections the notes say nothing about."""
+        else:
+            # Map: notes on one part of the document
+            prompt = f"""Part {context.get('part', 1)} of {context.get('parts', 1)} of {name}:
+
+            {context.get('text', '')}
+
+            Summarise this part in at most {self.summary_words} words of bullet points."""
+
+        return [
+            {"role": "system", "content": self.system_role},
+            {"role": "user", "content": prompt}
+        ]
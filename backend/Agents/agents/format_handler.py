@@ -1,53 +1,150 @@
+import asyncio
 from openai import OpenAI
+from format_handler import format_analysis as format_locally, parse_analysis
+from ..section_stream import SectionStreamParser, parse_sections
+
+FORMATTERS = ('local', 'auto', 'llm')
 
 class FormatHandler:
     def __init__(self, client: OpenAI = None):
         self.client = client or OpenAI()
         
-    def format_analysis(self, text: str) -> dict:
+    def format_step(self, text: str, formatter: str = 'local', on_section=None):
+        """Format with the local parser, the LLM, or the parser falling back to the LLM ('auto')"""
+        if formatter == 'llm':
+            return self.format_analysis(text, on_section)
+        if formatter == 'auto':
+            try:
+                return self._parse(text)
+            except ValueError as e:
+                print(f"format_handler.py: Local parse failed, falling back to LLM: {e}")
+                return self.format_analysis(text, on_section)
+        return self._format_locally(text)
+
+    async def aformat_step(self, text: str, formatter: str = 'local', on_section=None):
+        """Same as format_step, for use with an AsyncOpenAI client"""
+        if formatter == 'llm':
+            return await self.aformat_analysis(text, on_section)
+        # Parsing a long analysis would hold up the event loop
+        if formatter == 'auto':
+            try:
+                return await asyncio.to_thread(self._parse, text)
+            except ValueError as e:
+                print(f"format_handler.py: Local parse failed, falling back to LLM: {e}")
+                return await self.aformat_analysis(text, on_section)
+        return await asyncio.to_thread(self._format_locally, text)
+
+    # The local formatters return the whole result at once: section_ready events are only
+    # published while the 'llm' formatter streams its reply
+    @staticmethod
+    def _sections(text: str):
+        """A reply already in the sections JSON shape, repaired like a streamed one, or None"""
+        if not text or not text.lstrip().startswith('{'):
+            return None
+        parsed = parse_sections(text)
+        return parsed if parsed['sections'] else None
+
+    def _parse(self, text: str) -> dict:
+        return self._sections(text) or parse_analysis(text)
+
+    def _format_locally(self, text: str) -> dict:
+        return self._sections(text) or format_locally(text)
+
+    def format_analysis(self, text: str, on_section=None) -> dict:
+        """Format with the LLM, passing each section to on_section as soon as it has streamed in"""
         print(f"\nformat_handler.py: Starting formatting")
         print(f"format_handler.py: Received text length: {len(text)}")
         print(f"format_handler.py: First 200 chars: {text[:200]}...")
         
+        parser = SectionStreamParser()
+        sections = []
         try:
             response = self.client.chat.completions.create(
                 model="gpt-3.5-turbo-16k",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": """Format this business analysis text into clear sections.
-                        Extract key metrics, bullet points, and main insights.
-                        Return the response in this JSON structure:
-                        {
-                            "sections": [
-                                {
-                                    "title": "section title",
-                                    "content": ["paragraph 1", "paragraph 2"],
-                                    "key_points": ["point 1", "point 2"],
-                                    "metrics": [
-                                        {"label": "metric name", "value": "value", "unit": "unit"}
-                                    ]
-                                }
-                            ]
-                        }"""
-                    },
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.1
+                messages=self._messages(text),
+                temperature=0.1,
+                stream=True
             )
+            for chunk in response:
+                self._collect(parser, self._delta(chunk), sections, on_section)
             
-            result = response.choices[0].message.content
-            print(f"format_handler.py: Formatting complete")
-            print(f"format_handler.py: Result first 200 chars: {result[:200]}...")
-            return result
+        except Exception as e:
+            print(f"format_handler.py: Error in formatting: {e}")
+        return self._result(parser, sections, on_section, text)
+
+    async def aformat_analysis(self, text: str, on_section=None) -> dict:
+        """Same as format_analysis, for use with an AsyncOpenAI client"""
+        print(f"\nformat_handler.py: Starting async formatting, text length: {len(text)}")
+        
+        parser = SectionStreamParser()
+        sections = []
+        try:
+            response = await self.client.chat.completions.create(
+                model="gpt-3.5-turbo-16k",
+                messages=self._messages(text),
+                temperature=0.1,
+                stream=True
+            )
+            async for chunk in response:
+                self._collect(parser, self._delta(chunk), sections, on_section)
             
         except Exception as e:
             print(f"format_handler.py: Error in formatting: {e}")
-            return {
-                "sections": [{
-                    "title": "Error in Formatting",
-                    "content": [str(text)],
-                    "key_points": [],
-                    "metrics": []
-                }]
-            } 
\ No newline at end of file
+        return self._result(parser, sections, on_section, text)
+
+    @staticmethod
+    def _delta(chunk):
+        return chunk.choices[0].delta.content if chunk.choices else None
+
+    @staticmethod
+    def _collect(parser, delta, sections, on_section):
+        if not delta:
+            return
+        for section in parser.feed(delta):
+            sections.append(section)
+            if on_section:
+                on_section(section)
+
+    def _result(self, parser, sections, on_section, text):
+        # A reply cut off mid-section still keeps everything that came before it
+        for section in parser.finish():
+            sections.append(section)
+            if on_section:
+                on_section(section)
+        if not sections:
+            return self._fallback(text)
+        print(f"format_handler.py: Formatting complete, {len(sections)} sections, {parser.skipped} skipped")
+        return {"sections": sections}
+
+    def _messages(self, text: str) -> list:
+        return [
+            {
+                "role": "system",
+                "content": """Format this business analysis text into clear sections.
+                Extract key metrics, bullet points, and main insights.
+                Return the response in this JSON structure:
+                {
+                    "sections": [
+                        {
+                            "title": "section title",
+                            "content": ["paragraph 1", "paragraph 2"],
+                            "key_points": ["point 1", "point 2"],
+                            "metrics": [
+                                {"label": "metric name", "value": "value", "unit": "unit"}
+                            ]
+                        }
+                    ]
+                }"""
+            },
+            {"role": "user", "content": text}
+        ]
+
+    def _fallback(self, text: str) -> dict:
+        return {
+            "sections": [{
+                "title": "Error in Formatting",
+                "content": [str(text)],
+                "key_points": [],
+                "metrics": []
+            }]
+        }
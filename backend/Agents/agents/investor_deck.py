@@ -1,8 +1,8 @@
-from openai import OpenAI
+from .base_agent import BaseAgent
 
-class InvestorDeck:
-    def __init__(self, client):
-        self.client = client
+class InvestorDeck(BaseAgent):
+    def __init__(self, client, config=None):
+        super().__init__(client, config)
         self.system_role = """You are a presentation and executive communication expert.
         
         Focus on creating a compelling investor deck that:
@@ -15,7 +15,7 @@ class InvestorDeck:
         
         Create a structured presentation outline that synthesizes all previous analyses."""
 
-    def process(self, context):
+    def build_messages(self, context):
         custom_context = context.get('custom_context', '')
         strategy_analysis = context.get('strategy', '')
         competitor_analysis = context.get('competitors', '')
@@ -69,15 +69,7 @@ class InvestorDeck:
         
         Format your response as a clear presentation outline with key points and supporting data for each slide."""
 
-        messages = [
+        return [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt}
         ]
-
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7
-        )
-
-        return response.choices[0].message.content 
\ No newline at end of file
@@ -0,0 +1,29 @@
+from .base_agent import BaseAgent
+from ..export import step_title
+
+class QuestionAnswering(BaseAgent):
+    def __init__(self, client, config=None):
+        super().__init__(client, config)
+        self.system_role = """You are a business analyst answering follow-up questions about an analysis you wrote.
+        
+        Answer only from the excerpts you are given. Cite the excerpts you use by their
+        number, like [2]. If the excerpts do not answer the question, say so."""
+
+    def build_messages(self, context):
+        question = context.get('question', '')
+        excerpts = "\n\n".join(
+            f"[{i}] {step_title(source['step'])} - {source['title']}\n{source['text']}"
+            for i, source in enumerate(context.get('sources', []), 1)
+        )
+        
+        prompt = f"""Excerpts from the analysis:
+        
+        {excerpts}
+        
+        Question:
+        {question}"""
+
+        return [
+            {"role": "system", "content": self.system_role},
+            {"role": "user", "content": prompt}
+        ]
@@ -0,0 +1,21 @@
+import importlib
+
+
+def agent_class(path):
+    """The class named by an AI_CONFIG 'agent' entry: 'module.Class' within this package, or a dotted module path"""
+    module_name, _, class_name = path.rpartition('.')
+    if not module_name:
+        raise ValueError(f"Agent must be given as module.Class: {path}")
+    if '.' in module_name:
+        module = importlib.import_module(module_name)
+    else:
+        module = importlib.import_module(f".{module_name}", __package__)
+    cls = getattr(module, class_name, None)
+    if cls is None:
+        raise ValueError(f"No agent class {class_name} in {module.__name__}")
+    return cls
+
+
+def build_agents(config, client_for):
+    """Instantiate every step's agent with the client client_for(step) returns and its config"""
+    return {step: agent_class(step_config['agent'])(client_for(step), step_config) for step, step_config in config.items()}
@@ -1,8 +1,8 @@
-from openai import OpenAI
+from .base_agent import BaseAgent
 
-class RevenueAnalysis:
-    def __init__(self, client):
-        self.client = client
+class RevenueAnalysis(BaseAgent):
+    def __init__(self, client, config=None):
+        super().__init__(client, config)
         self.system_role = """You are a revenue analysis expert.
         
         Focus your analysis on:
@@ -15,7 +15,7 @@ class RevenueAnalysis:
         
         Include specific financial metrics and projections where possible."""
 
-    def process(self, context):
+    def build_messages(self, context):
         custom_context = context.get('custom_context', '')
         strategy_analysis = context.get('strategy', '')
         competitor_analysis = context.get('competitors', '')
@@ -48,15 +48,7 @@ class RevenueAnalysis:
         
         Format your response with clear sections, specific financial metrics, and detailed projections."""
 
-        messages = [
+        return [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt}
         ]
-
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7
-        )
-
-        return response.choices[0].message.content 
\ No newline at end of file
@@ -1,8 +1,10 @@
-from openai import OpenAI
+from .base_agent import BaseAgent
 
-class StrategyAnalysis:
-    def __init__(self, client):
-        self.client = client
+class StrategyAnalysis(BaseAgent):
+    NO_INPUT_ERROR = "Error: No business concept provided for analysis."
+
+    def __init__(self, client, config=None):
+        super().__init__(client, config)
         self.system_role = """You are a strategic business analyst with expertise in market analysis and business strategy.
         
         Provide detailed analysis covering:
@@ -15,17 +17,10 @@ class StrategyAnalysis:
         
         Include specific metrics and data points where relevant."""
 
-    def process(self, context):
-        print(f"\nstrategy_analysis.py: Starting analysis")
-        print(f"strategy_analysis.py: Received context keys: {list(context.keys())}")
-        print(f"strategy_analysis.py: Custom context: {context.get('custom_context', 'None')}")
-        
-        # Create a more specific prompt with the user's input
+    def build_messages(self, context):
         user_input = context.get('custom_context', '')
-        if not user_input:
-            print("strategy_analysis.py: WARNING - No custom context found!")
-            return "Error: No business concept provided for analysis."
         
+        # Create a more specific prompt with the user's input
         prompt = f"""Analyze this specific business concept in detail: {user_input}
 
         Provide a strategic analysis covering:
@@ -38,18 +33,49 @@ class StrategyAnalysis:
 
         Focus specifically on this business concept, not generic analysis."""
         
-        messages = [
+        print("strategy_analysis.py: Sending to OpenAI with prompt:", prompt)
+        return [
             {"role": "system", "content": self.system_role},
             {"role": "user", "content": prompt}
         ]
+
+    def has_input(self, context):
+        print(f"\nstrategy_analysis.py: Starting analysis")
+        print(f"strategy_analysis.py: Received context keys: {list(context.keys())}")
+        print(f"strategy_analysis.py: Custom context: {context.get('custom_context', 'None')}")
         
-        print("strategy_analysis.py: Sending to OpenAI with prompt:", prompt)
-        response = self.client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7
-        )
+        if not context.get('custom_context', ''):
+            print("strategy_analysis.py: WARNING - No custom context found!")
+            return False
+        return True
+
+    def process(self, context):
+        if not self.has_input(context):
+            return self.NO_INPUT_ERROR
+        
+        result = super().process(context)
+        print(f"strategy_analysis.py: Received response, first 200 chars: {result[:200]}...")
+        return result
+
+    def stream(self, context):
+        if not self.has_input(context):
+            yield self.NO_INPUT_ERROR
+            return
+        
+        yield from super().stream(context)
+
+    async def aprocess(self, context):
+        if not self.has_input(context):
+            return self.NO_INPUT_ERROR
         
-        result = response.choices[0].message.content
+        result = await super().aprocess(context)
         print(f"strategy_analysis.py: Received response, first 200 chars: {result[:200]}...")
-        return result 
\ No newline at end of file
+        return result
+
+    async def astream(self, context):
+        if not self.has_input(context):
+            yield self.NO_INPUT_ERROR
+            return
+        
+        async for chunk in super().astream(context):
+            yield chunk
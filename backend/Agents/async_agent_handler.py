@@ -0,0 +1,217 @@
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .agent_handler import AgentHandler
+from .llm_cache import REFRESH
+from .tracing import span
+from . import cancellation
+from .async_client import create_async_client
+
+
+class AsyncAgentHandler(AgentHandler):
+    """asyncio counterpart of AgentHandler.
+
+    All agents and the formatter share one pooled AsyncOpenAI client, so in-flight LLM
+    calls cost a coroutine each instead of a thread. Session, event and formatting-result
+    handling is inherited unchanged; formatting tasks are asyncio Tasks, which expose the
+    same done()/result()/cancel() interface as the thread pool futures. Blocking work
+    stays off the event loop: SQLite writes of run events go to one writer thread, in
+    order, and context compaction, similar-concept lookups and searches run in threads.
+    """
+
+    def __init__(self, client=None):
+        print("\nasync_agent_handler.py: Initializing AsyncAgentHandler...")
+        self._init_components(client or create_async_client(), asynchronous=True)
+        self.formatting_slots = asyncio.Semaphore(int(os.getenv('FORMAT_CONCURRENCY', 32)))
+        self.background_runs = set()
+        self.writes = ThreadPoolExecutor(max_workers=1)
+        self.loop = None  # The event loop serving requests, once blocking() has been called on it
+
+    async def process_request(self, step, data):
+        print(f"\nasync_agent_handler.py: Processing step: {step}")
+
+        if step not in self.agents:
+            return {"error": f"Unknown step: {step}"}
+
+        context = self._context_for(data)
+        if data.get('rerun'):
+            context.similar_match = False
+            context.regenerate.add(step)
+        else:
+            await self._await_run(step, context)
+            if step in context:
+                print(f"async_agent_handler.py: Returning precomputed {step} result")
+                return self._precomputed(step, context)
+
+        raw_result = await self._run_step(step, context)
+
+        return {
+            "status": "processing",
+            "raw_result": raw_result,
+            "step": step
+        }
+
+    def start_run(self, data):
+        """Start processing all steps as a background task and return the run id to follow"""
+        context = self.contexts.get(data.get('session_id'))  # Reject bad session ids before starting
+        self._prepare_run(context, data)
+        run_id = self._open_run(context, self.scheduler.select(data.get('profile'), data.get('steps')))
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Started from a blocking() thread: the run's task belongs on the loop
+            self.loop.call_soon_threadsafe(self._launch, data, run_id, context=contextvars.copy_context())
+        else:
+            self._launch(data, run_id)
+        print(f"async_agent_handler.py: Started run {run_id}")
+        return run_id
+
+    async def blocking(self, func, *args):
+        """Call func in a thread, for run store and concept index work requested on the event loop"""
+        self.loop = asyncio.get_running_loop()
+        return await asyncio.to_thread(func, *args)
+
+    def _launch(self, data, run_id):
+        # Hold a reference so the task is not garbage collected while it runs
+        task = asyncio.create_task(self.process_all(data, run_id))
+        self.background_runs.add(task)
+        task.add_done_callback(self.background_runs.discard)
+
+    async def _await_run(self, step, context):
+        if step in context or not context.run_id:
+            return
+        async for event in self.events.asubscribe(context.run_id):
+            if event and event['data'].get('step') in (step, None) and event['event'] in ('raw_ready', 'error'):
+                return
+
+    async def process_all(self, data, run_id=None):
+        """Run every agent, starting each one as soon as the steps it depends on are done"""
+        print(f"\nasync_agent_handler.py: Processing all steps")
+        context = self._context_for(data)
+
+        def on_complete(step, result, error):
+            if error:
+                self._publish(run_id, 'error', {'step': step, 'error': error})
+
+        steps = self.scheduler.select(data.get('profile'), data.get('steps'))
+        cancelled = self.cancellations.open(run_id)
+        try:
+            with cancellation.scope(cancelled), self.tracer.span('run', run_id, lane='run', steps=len(steps)) as traced:
+                results, errors = await self.scheduler.arun(
+                    lambda step: self._run_step(step, context, run_id),
+                    steps=steps,
+                    on_complete=on_complete
+                )
+
+                # Reused results come with an already finished concurrent.futures.Future; cancelling
+                # the run cancels the formatting tasks, so this returns promptly then too
+                tasks = [task for step, task in list(context.formatting_tasks.items()) if step in results and not task.done()]
+                if tasks:
+                    await asyncio.wait(tasks)
+                traced.set(errors=len(errors), cancelled=cancelled.reason)
+            self._finish_run(run_id, cancelled, results, errors)
+        except Exception as e:
+            print(f"async_agent_handler.py: Error processing all steps: {e}")
+            self._publish(run_id, 'error', {'step': None, 'error': str(e)})
+            raise
+        finally:
+            if run_id:
+                self.cancellations.close(run_id)
+                # After the writer has published the run's last events
+                await asyncio.wrap_future(self.writes.submit(self.events.close, run_id))
+
+        return {
+            "status": "processing",
+            "raw_results": results,
+            "errors": errors
+        }
+
+    async def stream_request(self, step, data):
+        """Yield the agent's output as it is generated, then store and format the full text"""
+        print(f"\nasync_agent_handler.py: Streaming step: {step}")
+        context = self._context_for(data)
+
+        chunks = []
+        async for chunk in self.agents[step].astream(await asyncio.to_thread(self.agent_context, step, context)):
+            chunks.append(chunk)
+            yield chunk
+
+        self._store_result(step, ''.join(chunks), context)
+
+    async def _run_step(self, step, context, run_id=None):
+        cancellation.check()
+        self._publish(run_id, 'step_started', {'step': step})
+        with span('step', lane=step, step=step) as traced:
+            fingerprint = self._input_hash(step, context)
+            unchanged = self._unchanged_result(step, context, fingerprint, run_id)
+            if unchanged:
+                traced.set(source='unchanged')
+                return self._store_result(step, unchanged['raw_result'], context, run_id, fingerprint, unchanged['formatted_result'])
+            raw_result = await asyncio.to_thread(self._reused_result, step, context, run_id)
+            traced.set(source='agent' if raw_result is None else 'similar')
+            if raw_result is None:
+                refresh = REFRESH.set(step in context.regenerate)
+                try:
+                    filtered = await asyncio.to_thread(self.agent_context, step, context, run_id)
+                    raw_result = await self.agents[step].aprocess(filtered)
+                finally:
+                    REFRESH.reset(refresh)
+            traced.set(raw_bytes=len(raw_result))
+            return self._store_result(step, raw_result, context, run_id, fingerprint)
+
+    async def ask(self, run_id, question, k=None):
+        found = await asyncio.to_thread(self._ask_sources, run_id, question, k)
+        if found is None:
+            return None
+        self.tracer.bind(run_id)
+        sources, search_ms = found
+        return {'answer': await self.answer(question, sources), 'sources': sources, 'search_ms': round(search_ms, 2)}
+
+    async def answer(self, question, sources):
+        return await self.qa.aprocess({'question': question, 'sources': sources})
+
+    async def ingest_document(self, text, name=''):
+        return await self.documents.aingest(text, name)
+
+    def _publish(self, run_id, event, data):
+        if event == 'run_started':
+            # Written with the run itself, so its steps can be read as soon as start_run returns
+            return super()._publish(run_id, event, data)
+        # Later events are published once stored, so clients that read the store after one see it there
+        if run_id and not cancellation.current().cancelled:
+            self.writes.submit(self._write, run_id, event, data)
+
+    def _write(self, run_id, event, data):
+        self._persist(run_id, event, data)
+        self.events.publish(run_id, event, data)
+
+    def _start_formatting(self, step, raw_result, run_id=None):
+        task = asyncio.create_task(self._format(step, raw_result, run_id))
+        # Cancelling the task drops it from the semaphore queue or aborts its LLM call
+        cancellation.current().on_cancel(task.cancel, asyncio.get_running_loop())
+        return task
+
+    async def _format(self, step, raw_result, run_id=None):
+        formatter = self._formatter_for(step)
+        queued_at = time.monotonic()
+        async with self.formatting_slots:
+            start = time.monotonic()
+            try:
+                with self._format_span(step, formatter, raw_result, start - queued_at) as traced:
+                    formatted = await self.formatter.aformat_step(raw_result, formatter, self._section_publisher(step, run_id))
+                    traced.set(sections=len(formatted.get('sections', [])) if isinstance(formatted, dict) else None)
+            except Exception as e:
+                self._publish_formatted(run_id, step, error=e)
+                raise
+            finally:
+                self.metrics.observe_format(step, formatter, time.monotonic() - start)
+        self._publish_formatted(run_id, step, formatted)
+        return formatted
+
+    def __del__(self):
+        if getattr(self, 'writes', None):
+            self.writes.shutdown(wait=False)
+        super().__del__()
@@ -0,0 +1,31 @@
+import os
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+
+def create_async_client():
+    """One AsyncOpenAI client whose connection pool is shared by every in-flight call.
+
+    Keep-alive connections are reused across requests so concurrent LLM calls skip the
+    TCP/TLS handshake, and max_connections bounds how many run at once.
+    """
+    api_key = os.getenv('OPENAI_API_KEY')
+    if not api_key:
+        raise ValueError("OpenAI API key not found in environment variables")
+
+    limits = httpx.Limits(
+        max_connections=int(os.getenv('OPENAI_MAX_CONNECTIONS', 200)),
+        max_keepalive_connections=int(os.getenv('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 50)),
+        keepalive_expiry=float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 30))
+    )
+    # LLM calls are slow to finish but should connect quickly
+    timeout = httpx.Timeout(float(os.getenv('OPENAI_TIMEOUT', 120)), connect=10.0)
+
+    print(f"async_client.py: Creating AsyncOpenAI client with pool limits {limits}")
+    return AsyncOpenAI(
+        api_key=api_key,
+        organization=os.getenv('OPENAI_ORGANIZATION_ID'),
+        max_retries=0,  # AsyncRateLimitedClient retries with shared backoff
+        http_client=DefaultAsyncHttpxClient(limits=limits, timeout=timeout)
+    )
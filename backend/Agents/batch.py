@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from .metrics import usage
+
+
+class BatchStore:
+    """SQLite checkpoint of finished steps, so an interrupted batch resumes where it stopped"""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS steps (
+                concept_id TEXT,
+                step TEXT,
+                raw_result TEXT,
+                formatted_result TEXT,
+                prompt_tokens INTEGER,
+                completion_tokens INTEGER,
+                seconds REAL,
+                completed_at REAL,
+                PRIMARY KEY (concept_id, step)
+            )
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS concepts (
+                concept_id TEXT PRIMARY KEY,
+                concept TEXT,
+                status TEXT,
+                errors TEXT,
+                seconds REAL,
+                completed_at REAL
+            )
+        """)
+        self.db.commit()
+
+    def finished_steps(self, concept_id):
+        rows = self.db.execute(
+            "SELECT step, raw_result, formatted_result, prompt_tokens, completion_tokens, seconds "
+            "FROM steps WHERE concept_id = ?", (concept_id,)
+        ).fetchall()
+        return {
+            step: {
+                'raw_result': raw,
+                'formatted_result': json.loads(formatted),
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'seconds': seconds,
+                'resumed': True
+            }
+            for step, raw, formatted, prompt_tokens, completion_tokens, seconds in rows
+        }
+
+    def save_step(self, concept_id, step, result):
+        self.db.execute(
+            "INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (concept_id, step, result['raw_result'], json.dumps(result['formatted_result']),
+             result['prompt_tokens'], result['completion_tokens'], result['seconds'], time.time())
+        )
+        self.db.commit()
+
+    def is_complete(self, concept_id):
+        row = self.db.execute("SELECT status FROM concepts WHERE concept_id = ?", (concept_id,)).fetchone()
+        return row is not None and row[0] == 'complete'
+
+    def save_concept(self, concept_id, concept, errors, seconds):
+        self.db.execute(
+            "INSERT OR REPLACE INTO concepts VALUES (?, ?, ?, ?, ?, ?)",
+            (concept_id, concept, 'failed' if errors else 'complete', json.dumps(errors), seconds, time.time())
+        )
+        self.db.commit()
+
+
+class BatchRunner:
+    """Runs many business concepts through the agents with a global limit on concurrent LLM calls.
+
+    Every step is checkpointed to the store as it finishes and every concept is appended to
+    the JSONL output when it is done. Steps already in the store are not run again.
+    """
+
+    def __init__(self, handler, store, output, concurrency=8):
+        self.handler = handler
+        self.store = store
+        self.output = output
+        self.concurrency = concurrency
+        self.summaries = []
+
+    async def run(self, concepts):
+        self.slots = asyncio.Semaphore(self.concurrency)
+        queue = asyncio.Queue()
+        for item in concepts:
+            queue.put_nowait(item)
+
+        async def worker():
+            while not queue.empty():
+                await self.run_concept(queue.get_nowait())
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, queue.qsize()) or 1)))
+        return self.summaries
+
+    async def run_concept(self, item):
+        concept_id, concept = item['id'], item['concept']
+        if self.store.is_complete(concept_id):
+            print(f"batch.py: Skipping {concept_id}, already complete")
+            return
+
+        start = time.monotonic()
+        context = {'custom_context': concept}
+        steps = self.store.finished_steps(concept_id)
+        for step, result in steps.items():
+            context[step] = result['raw_result']
+
+        async def run_step(step):
+            if step in steps:
+                return steps[step]
+            result = await self._run_step(step, context)
+            context[step] = result['raw_result']
+            steps[step] = result
+            self.store.save_step(concept_id, step, result)
+            return result
+
+        _, errors = await self.handler.scheduler.arun(run_step, steps=list(self.handler.agents.keys()))
+        seconds = time.monotonic() - start
+        self.store.save_concept(concept_id, concept, errors, seconds)
+
+        summary = self._summary(concept_id, steps, errors, seconds)
+        self.summaries.append(summary)
+        self.output.write(json.dumps({
+            'id': concept_id,
+            'concept': concept,
+            'results': {step: {key: result[key] for key in ('raw_result', 'formatted_result')}
+                        for step, result in steps.items()},
+            'errors': errors,
+            'summary': summary
+        }) + '\n')
+        self.output.flush()
+        print(f"batch.py: Finished {concept_id} in {seconds:.1f}s with {len(errors)} errors")
+
+    async def _run_step(self, step, context):
+        agent = self.handler.agents[step]
+        # Compaction tokenizes every upstream analysis, so it runs off the event loop
+        agent_context = await asyncio.to_thread(self.handler.agent_context, step, context)
+
+        async with self.slots:
+            start = time.monotonic()
+            # Tokens as the provider reported them; answers from the response cache cost nothing
+            with usage() as spent:
+                raw_result = await agent.aprocess(agent_context)
+            formatted = await self.handler.formatter.aformat_step(raw_result, self.handler._formatter_for(step))
+            seconds = time.monotonic() - start
+
+        return {
+            'raw_result': raw_result,
+            'formatted_result': formatted,
+            'prompt_tokens': spent['prompt_tokens'],
+            'completion_tokens': spent['completion_tokens'],
+            'seconds': seconds,
+            'resumed': False,
+            'cached': spent['cached_calls'] > 0
+        }
+
+    @staticmethod
+    def _summary(concept_id, steps, errors, seconds):
+        return {
+            'id': concept_id,
+            'status': 'failed' if errors else 'complete',
+            'seconds': round(seconds, 3),
+            'prompt_tokens': sum(result['prompt_tokens'] for result in steps.values()),
+            'completion_tokens': sum(result['completion_tokens'] for result in steps.values()),
+            'resumed_steps': sorted(step for step, result in steps.items() if result['resumed']),
+            'cached_steps': sorted(step for step, result in steps.items() if result.get('cached')),
+            'steps': {step: {'seconds': round(result['seconds'], 3),
+                             'prompt_tokens': result['prompt_tokens'],
+                             'completion_tokens': result['completion_tokens']}
+                      for step, result in steps.items()}
+        }
+
+
+def read_concepts(lines):
+    """Parse JSONL lines of {"id": ..., "concept": ...}; ids default to a hash of the concept"""
+    concepts = []
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        concept = item.get('concept') or item.get('custom_context')
+        if not concept:
+            raise ValueError(f"Line {number} has no concept")
+        concept_id = str(item.get('id') or hashlib.sha256(concept.encode('utf-8')).hexdigest()[:16])
+        concepts.append({'id': concept_id, 'concept': concept})
+    return concepts
+
+
+def write_summary(path, summaries):
+    totals = {
+        'concepts': len(summaries),
+        'failed': sum(1 for summary in summaries if summary['status'] == 'failed'),
+        'prompt_tokens': sum(summary['prompt_tokens'] for summary in summaries),
+        'completion_tokens': sum(summary['completion_tokens'] for summary in summaries),
+        'seconds': round(sum(summary['seconds'] for summary in summaries), 3)
+    }
+    with open(path, 'w') as f:
+        json.dump({'totals': totals, 'concepts': summaries}, f, indent=2)
+    return totals
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from .async_agent_handler import AsyncAgentHandler
+
+    parser = argparse.ArgumentParser(description="Run every agent over a JSONL file of business concepts")
+    parser.add_argument('concepts', help="JSONL file with one {\"id\": ..., \"concept\": ...} object per line")
+    parser.add_argument('--out', default='batch_results.jsonl', help="JSONL file results are appended to")
+    parser.add_argument('--db', default='batch_results.sqlite3', help="SQLite checkpoint used to resume")
+    parser.add_argument('--summary', default='batch_summary.json', help="Per-concept timing and token summary")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('BATCH_CONCURRENCY', 8)),
+                        help="Maximum LLM calls in flight across all concepts")
+    args = parser.parse_args()
+
+    load_dotenv()
+    with open(args.concepts) as f:
+        concepts = read_concepts(f)
+
+    async def main():
+        with open(args.out, 'a') as output:
+            runner = BatchRunner(AsyncAgentHandler(), BatchStore(args.db), output, args.concurrency)
+            return await runner.run(concepts)
+
+    totals = write_summary(args.summary, asyncio.run(main()))
+    print(f"batch.py: {totals['concepts']} concepts, {totals['failed']} failed, "
+          f"{totals['prompt_tokens']} prompt / {totals['completion_tokens']} completion tokens, "
+          f"summary in {args.summary}")
+    sys.exit(1 if totals['failed'] else 0)
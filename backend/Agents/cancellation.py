@@ -0,0 +1,211 @@
+import contextvars
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, InvalidStateError, wait
+from contextlib import contextmanager
+
+
+class RunCancelled(Exception):
+    """Raised at a checkpoint inside a run that has been cancelled"""
+
+
+class Cancellation:
+    """Cancellation of one run, checked cooperatively by everything working on it.
+
+    `stopped` resolves with the reason as soon as cancel() is called, so threads waiting on
+    futures can include it in their wait, and callbacks fire at once, e.g. to cancel queued
+    formatting jobs or asyncio tasks. With a loop, on_cancel runs the callback in that
+    loop's thread, since cancel() may be called from any thread.
+    """
+
+    def __init__(self):
+        self.stopped = Future()
+
+    @property
+    def cancelled(self):
+        return self.stopped.done()
+
+    @property
+    def reason(self):
+        return self.stopped.result() if self.cancelled else None
+
+    def cancel(self, reason="Cancelled"):
+        """Cancel the run; False when it was already cancelled"""
+        try:
+            self.stopped.set_result(reason)
+        except InvalidStateError:
+            return False
+        return True
+
+    def on_cancel(self, callback, loop=None):
+        if loop is not None:
+            callback = _soon(loop, callback)
+        self.stopped.add_done_callback(lambda _: callback())
+
+    def check(self):
+        if self.cancelled:
+            raise RunCancelled(self.reason)
+
+    def sleep(self, seconds):
+        """time.sleep that raises RunCancelled as soon as the run is cancelled"""
+        if seconds > 0 and wait([self.stopped], timeout=seconds).done:
+            self.check()
+
+    def wait(self, futures):
+        """Wait for every future, returning early if the run is cancelled"""
+        pending = set(futures)
+        while pending and not self.cancelled:
+            _, pending = wait(pending | {self.stopped}, return_when=FIRST_COMPLETED)
+            pending.discard(self.stopped)
+
+
+class _Never(Cancellation):
+    """The state of code that is not part of a run, which nothing can cancel"""
+
+    def cancel(self, reason="Cancelled"):
+        return False
+
+    def on_cancel(self, callback, loop=None):
+        pass  # It would never be called, so do not keep it
+
+
+def _soon(loop, callback):
+    def call():
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(callback)
+    return call
+
+
+# The cancellation of the run the current code works for; copied into threads along with the trace span
+CURRENT = contextvars.ContextVar('run_cancellation', default=None)
+_NEVER = _Never()
+
+
+def current():
+    return CURRENT.get() or _NEVER
+
+
+def check():
+    """Raise RunCancelled if the current run was cancelled"""
+    current().check()
+
+
+@contextmanager
+def scope(cancellation):
+    token = CURRENT.set(cancellation)
+    try:
+        yield cancellation
+    finally:
+        CURRENT.reset(token)
+
+
+class RunCancellations:
+    """Cancellations of the runs in progress in this process, by run id.
+
+    A session works on one analysis at a time: opening a run for a session cancels the
+    run it started before, whose results nobody will look at any more.
+    """
+
+    def __init__(self):
+        self.runs = {}
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def open(self, run_id, session_id=None):
+        """The run's Cancellation, created on first use; an unregistered one without a run id"""
+        if run_id is None:
+            return Cancellation()
+        with self.lock:
+            cancellation = self.runs.setdefault(run_id, Cancellation())
+            superseded = self.runs.get(self.sessions.get(session_id)) if session_id else None
+            if session_id:
+                self.sessions[session_id] = run_id
+        if superseded is not None and superseded is not cancellation:
+            superseded.cancel(f"Superseded by run {run_id}")
+        return cancellation
+
+    def cancel(self, run_id, reason="Cancelled"):
+        """Cancel a run in progress here; False when there is none or it was cancelled already"""
+        with self.lock:
+            cancellation = self.runs.get(run_id)
+        if cancellation is None or not cancellation.cancel(reason):
+            return False
+        print(f"cancellation.py: Cancelled run {run_id}: {reason}")
+        return True
+
+    def close(self, run_id):
+        with self.lock:
+            self.runs.pop(run_id, None)
+            for session_id in [s for s, r in self.sessions.items() if r == run_id]:
+                del self.sessions[session_id]
+
+
+class RunFollowers:
+    """Counts the event-stream clients following each run and cancels runs they abandon.
+
+    When the last client of a run disconnects before the run ends and none reconnects
+    within `grace` seconds, cancel(run_id, reason) is called. Runs nobody followed
+    through /runs/<run_id>/events are never cancelled this way, since clients may poll.
+    """
+
+    def __init__(self, events, cancel, grace=30):
+        self.events = events
+        self.cancel = cancel
+        self.grace = grace
+        self.clients = {}
+        self.timers = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, events, cancel):
+        """Grace period from RUN_ABANDON_SECONDS; 0 keeps abandoned runs going"""
+        return cls(events, cancel, grace=float(os.getenv('RUN_ABANDON_SECONDS', 30)))
+
+    def subscribe(self, run_id, last_event_id=0):
+        """events.subscribe, counting the caller as a client of the run until it stops reading"""
+        self._join(run_id)
+        ended = False
+        try:
+            yield from self.events.subscribe(run_id, last_event_id)
+            ended = True
+        finally:
+            self._leave(run_id, ended)
+
+    async def asubscribe(self, run_id, last_event_id=0):
+        self._join(run_id)
+        ended = False
+        try:
+            async for event in self.events.asubscribe(run_id, last_event_id):
+                yield event
+            ended = True
+        finally:
+            self._leave(run_id, ended)
+
+    def _join(self, run_id):
+        with self.lock:
+            self.clients[run_id] = self.clients.get(run_id, 0) + 1
+            timer = self.timers.pop(run_id, None)
+        if timer:
+            timer.cancel()
+
+    def _leave(self, run_id, ended):
+        with self.lock:
+            self.clients[run_id] -= 1
+            if self.clients[run_id]:
+                return
+            del self.clients[run_id]
+            if ended or not self.grace:
+                return
+            timer = self.timers[run_id] = threading.Timer(self.grace, self._abandoned, (run_id,))
+        timer.daemon = True
+        timer.start()
+
+    def _abandoned(self, run_id):
+        with self.lock:
+            if self.timers.pop(run_id, None) is None:
+                return
+        print(f"cancellation.py: Every client of run {run_id} left")
+        try:
+            self.cancel(run_id, "Abandoned: its clients disconnected")
+        except ValueError:
+            pass  # It finished in the meantime
@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+WORD = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'of', 'to', 'in', 'for', 'on', 'with', 'by', 'as', 'at',
+    'is', 'are', 'be', 'our', 'we', 'that', 'this', 'which', 'who'
+}
+
+
+class ConceptIndex:
+    """Local similarity search over the concepts of completed runs in the RunStore.
+
+    Concepts are vectorised offline as TF-IDF over hashed character n-grams of each word,
+    so rewordings such as "overlanders" and "overlanding" share most of their features.
+    A lookup scoring at least `threshold` (cosine) lets a run reuse that earlier run's
+    outputs for the steps marked `reuse_similar` in AI_CONFIG. Every lookup is audited in
+    the run store with its best match and score.
+    """
+
+    def __init__(self, runs, threshold=0.8, dimensions=2048, ngrams=(3, 4, 5), max_entries=2000, metrics=None):
+        self.runs = runs
+        self.threshold = threshold
+        self.dimensions = dimensions
+        self.ngrams = ngrams
+        self.max_entries = max_entries
+        self.metrics = metrics
+        self.run_ids = []
+        self.concepts = []
+        self.counts = np.zeros((0, dimensions), dtype=np.float32)
+        self.loaded_until = 0.0
+        self.lookups = 0
+        self.hits = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, runs, metrics=None):
+        """Build the index from SIMILAR_CONCEPT_* settings, or None unless a threshold is set, e.g. 0.8.
+
+        Reuse is opt-in since a reused step answers for a concept the user did not type. It
+        also needs the run store.
+        """
+        threshold = float(os.getenv('SIMILAR_CONCEPT_THRESHOLD', 0))
+        if runs is None or not threshold:
+            return None
+        return cls(runs, threshold, max_entries=int(os.getenv('SIMILAR_CONCEPT_MAX_ENTRIES', 2000)), metrics=metrics)
+
+    def vectorize(self, text):
+        """Hashed counts of the n-grams of every word, with word boundaries marked"""
+        counts = np.zeros(self.dimensions, dtype=np.float32)
+        for word in WORD.findall(text.lower()):
+            if word in STOPWORDS:
+                continue
+            word = f"<{word}>"
+            for n in self.ngrams:
+                for i in range(len(word) - n + 1):
+                    counts[zlib.crc32(word[i:i + n].encode('utf-8')) % self.dimensions] += 1
+        return counts
+
+    def refresh(self):
+        """Add runs that completed since the last refresh, keeping the newest max_entries"""
+        # Read and applied under the lock, so concurrent searches never add the same runs twice
+        with self.lock:
+            rows = self.runs.completed_since(self.loaded_until, self.max_entries)
+            if not rows:
+                return
+            self.run_ids.extend(run_id for run_id, _, _ in rows)
+            self.concepts.extend(concept for _, concept, _ in rows)
+            self.counts = np.vstack([self.counts, np.array([self.vectorize(concept) for _, concept, _ in rows])])
+            self.loaded_until = rows[-1][2]
+            if len(self.run_ids) > self.max_entries:
+                del self.run_ids[:-self.max_entries]
+                del self.concepts[:-self.max_entries]
+                self.counts = self.counts[-self.max_entries:]
+
+    def search(self, concept):
+        """The most similar indexed concept as (run_id, concept, score), or None for an empty index"""
+        self.refresh()
+        with self.lock:
+            if not self.run_ids:
+                return None
+            counts = np.vstack([self.counts, self.vectorize(concept)])
+            run_ids, concepts = list(self.run_ids), list(self.concepts)
+
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log((1 + len(counts)) / (1 + document_frequency)) + 1.0
+        matrix = np.log1p(counts) * idf
+        norms = np.linalg.norm(matrix, axis=1)
+        norms[norms == 0] = 1.0
+        matrix /= norms[:, None]
+
+        scores = matrix[:-1] @ matrix[-1]
+        best = int(np.argmax(scores))
+        return run_ids[best], concepts[best], float(scores[best])
+
+    def match(self, concept, run_id=None):
+        """Search for concept, audit the lookup and return the match if it clears the threshold"""
+        match = self.search(concept)
+        reused = match is not None and match[2] >= self.threshold
+        with self.lock:
+            self.lookups += 1
+            self.hits += reused
+        self.runs.record_similar(run_id, concept, match, reused)
+        if self.metrics:
+            self.metrics.observe_similar(match[2] if match else None, reused)
+        if match:
+            print(f"concept_index.py: Closest concept scored {match[2]:.2f} ({'reused' if reused else 'not reused'})")
+        return match if reused else None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.run_ids),
+                'threshold': self.threshold,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0
+            }
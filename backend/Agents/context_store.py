@@ -0,0 +1,243 @@
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+DEFAULT_SESSION = 'default'
+_MISSING = object()
+
+
+def check_session_id(session_id=None):
+    """The session id to use for session_id, raising ValueError when it is malformed"""
+    session_id = session_id or DEFAULT_SESSION
+    if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', session_id):
+        raise ValueError(f"Invalid session id: {session_id}")
+    return session_id
+
+
+class _Spilled:
+    """Marker for a value that was compressed to disk to free memory"""
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+
+
+class SessionContext:
+    """Dict-like view of one session's analysis context, handed to the agents"""
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.session_id = session_id
+        self.values = {}
+        self.memory_bytes = 0
+        self.formatting_tasks = {}
+        self.run_id = None  # The server-side run filling in this context, if any
+        self.similar_match = None  # Near-duplicate concept lookup: None until done, False for no match
+        self.base_run = None  # Stored run whose steps are reused when their inputs have not changed
+        self.regenerate = set()  # Steps to call the agent for again even if their inputs have not changed
+        self.last_access = time.monotonic()
+
+    def get(self, key, default=None):
+        return self.store._read(self, key, default)
+
+    def __getitem__(self, key):
+        value = self.store._read(self, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.store._write(self, key, value)
+
+    def __delitem__(self, key):
+        self.store._delete(self, key)
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def keys(self):
+        return list(self.values.keys())
+
+
+class ContextStore:
+    """Session-keyed contexts with LRU and TTL eviction, a memory cap and optional disk spill.
+
+    When the in-memory total exceeds max_bytes, large text values of the least recently
+    used sessions are first compressed to spill_dir (if set), then whole sessions are
+    evicted oldest first. The session being written is never evicted.
+    """
+
+    def __init__(self, max_sessions=100, ttl=3600, max_bytes=64 * 1024 * 1024,
+                 spill_dir=None, spill_threshold=32 * 1024):
+        self.sessions = OrderedDict()
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.spill_threshold = spill_threshold
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_sessions=int(os.getenv('CONTEXT_MAX_SESSIONS', 100)),
+            ttl=int(os.getenv('CONTEXT_TTL_SECONDS', 3600)),
+            max_bytes=int(os.getenv('CONTEXT_MAX_MB', 64)) * 1024 * 1024,
+            spill_dir=os.getenv('CONTEXT_SPILL_DIR')
+        )
+
+    def get(self, session_id=None):
+        """Return the context for session_id, creating it if needed"""
+        session_id = check_session_id(session_id)
+        with self.lock:
+            self._expire()
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = SessionContext(self, session_id)
+                self.sessions[session_id] = session
+                print(f"context_store.py: Created session {session_id}")
+            self._touch(session)
+            self._enforce_limits(session)
+            return session
+
+    def discard(self, session_id):
+        with self.lock:
+            if session_id in self.sessions:
+                self._evict(session_id)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'sessions': len(self.sessions),
+                'memory_bytes': self.memory_bytes,
+                'spilled_bytes': self.spilled_bytes
+            }
+
+    def _read(self, session, key, default):
+        with self.lock:
+            value = session.values.get(key, _MISSING)
+            if value is _MISSING:
+                return default
+            self._touch(session)
+            if isinstance(value, _Spilled):
+                with open(value.path, 'rb') as f:
+                    return zlib.decompress(f.read()).decode('utf-8')
+            return value
+
+    def _write(self, session, key, value):
+        with self.lock:
+            self._remove_value(session, key)
+            size = self._size(value)
+            session.values[key] = value
+            session.memory_bytes += size
+            if not self._attached(session):
+                # A run can outlive its evicted session; its writes no longer count against the store
+                return
+            self.memory_bytes += size
+            self._touch(session)
+            self._enforce_limits(session)
+
+    def _delete(self, session, key):
+        with self.lock:
+            if key not in session.values:
+                raise KeyError(key)
+            self._remove_value(session, key)
+
+    def _attached(self, session):
+        return self.sessions.get(session.session_id) is session
+
+    def _touch(self, session):
+        session.last_access = time.monotonic()
+        if session.session_id in self.sessions:
+            self.sessions.move_to_end(session.session_id)
+
+    def _expire(self):
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if now - session.last_access > self.ttl:
+                print(f"context_store.py: Session {session_id} expired")
+                self._evict(session_id)
+
+    def _enforce_limits(self, current):
+        for session_id in list(self.sessions):
+            if len(self.sessions) <= self.max_sessions:
+                break
+            if session_id != current.session_id:
+                self._evict(session_id)
+
+        if self.memory_bytes <= self.max_bytes:
+            return
+
+        # Least recently used sessions first, the current one last
+        if self.spill_dir:
+            for session in list(self.sessions.values()):
+                for key, value in list(session.values.items()):
+                    if isinstance(value, str) and self._size(value) >= self.spill_threshold:
+                        self._spill(session, key, value)
+                        if self.memory_bytes <= self.max_bytes:
+                            return
+
+        for session_id in list(self.sessions):
+            if self.memory_bytes <= self.max_bytes:
+                return
+            if session_id != current.session_id:
+                print(f"context_store.py: Memory cap reached, evicting session {session_id}")
+                self._evict(session_id)
+
+    def _spill(self, session, key, value):
+        session_dir = os.path.join(self.spill_dir, session.session_id)
+        os.makedirs(session_dir, exist_ok=True)
+        path = os.path.join(session_dir, f"{key}.z")
+        data = zlib.compress(value.encode('utf-8'))
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        size = self._size(value)
+        session.values[key] = _Spilled(path, len(data))
+        session.memory_bytes -= size
+        self.memory_bytes -= size
+        self.spilled_bytes += len(data)
+        print(f"context_store.py: Spilled {key} of session {session.session_id} to disk ({size} -> {len(data)} bytes)")
+
+    def _remove_value(self, session, key):
+        value = session.values.pop(key, _MISSING)
+        if value is _MISSING:
+            return
+        attached = self._attached(session)
+        if isinstance(value, _Spilled):
+            if attached:
+                self.spilled_bytes -= value.size
+            if os.path.exists(value.path):
+                os.remove(value.path)
+        else:
+            size = self._size(value)
+            session.memory_bytes -= size
+            if attached:
+                self.memory_bytes -= size
+
+    def _evict(self, session_id):
+        session = self.sessions[session_id]
+        for key in list(session.values):
+            self._remove_value(session, key)
+        del self.sessions[session_id]
+
+        # Formatting nobody will collect is dropped with the session
+        for future in session.formatting_tasks.values():
+            future.cancel()
+        session.formatting_tasks.clear()
+
+        if self.spill_dir:
+            shutil.rmtree(os.path.join(self.spill_dir, session_id), ignore_errors=True)
+        print(f"context_store.py: Evicted session {session_id}")
+
+    @staticmethod
+    def _size(value):
+        if isinstance(value, str):
+            return len(value.encode('utf-8'))
+        return len(repr(value).encode('utf-8'))
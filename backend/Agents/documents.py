@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .agents.context_filter_agent import ContextFilterAgent
+from .tokens import count_tokens
+
+# Chunks break between paragraphs if they can, then between lines, sentences and words
+SEPARATORS = [
+    (re.compile(r"\n\s*\n"), '\n\n'),
+    (re.compile(r"\n"), '\n'),
+    (re.compile(r"(?<=[.!?;])\s+"), ' '),
+    (re.compile(r"\s+"), ' ')
+]
+
+
+def document_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def chunk_document(text, chunk_tokens, model='gpt-3.5-turbo', level=0):
+    """Split text into chunks of about chunk_tokens at most, at the coarsest break that fits"""
+    separator, joiner = SEPARATORS[level]
+    chunks, current, used = [], [], 0
+    for piece in separator.split(text):
+        piece = piece.strip()
+        if not piece:
+            continue
+        tokens = count_tokens(piece, model)
+        if tokens > chunk_tokens and level + 1 < len(SEPARATORS):
+            parts = [(part, count_tokens(part, model)) for part in chunk_document(piece, chunk_tokens, model, level + 1)]
+        else:
+            parts = [(piece, tokens)]  # A single word longer than a chunk stays whole
+        for part, size in parts:
+            if current and used + size > chunk_tokens:
+                chunks.append(joiner.join(current))
+                current, used = [], 0
+            current.append(part)
+            used += size
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+def with_brief(concept, document):
+    """The concept the agents see: the submitted text followed by the document's brief"""
+    title = f"Brief of the submitted document {document['name']}" if document['name'] else "Brief of the submitted document"
+    brief = f"{title}:\n{document['brief']}"
+    return f"{concept.strip()}\n\n{brief}" if concept and concept.strip() else brief
+
+
+class DocumentIngestor:
+    """Map-reduce summary of long documents into a compact brief the agents read instead.
+
+    The document is chunked by token count and each chunk is trimmed locally with the
+    context filter's extractive ranking, which keeps numeric facts first. The model then
+    summarises the chunks, at most `concurrency` at a time across all ingestions, and
+    reduces the summaries into one brief, in rounds when they do not fit in one call.
+    Briefs are stored by the hash of the document text, so a document is only summarised
+    once and its brief costs the same prompt tokens however long the document was.
+    """
+
+    def __init__(self, summarizer, config, runs=None, max_cached=32):
+        self.summarizer = summarizer
+        self.config = config
+        self.model = config.get('model', 'gpt-3.5-turbo')
+        self.settings = json.dumps(config, sort_keys=True)
+        self.extractor = ContextFilterAgent({})
+        self.runs = runs
+        # Briefs are kept in memory when there is no run store to share them through
+        self.memory = OrderedDict()
+        self.max_cached = max_cached
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=config.get('concurrency', 4))
+        self.slots = asyncio.Semaphore(config.get('concurrency', 4))
+
+    def get(self, document_id):
+        """The stored brief of a document, or None"""
+        if self.runs:
+            return self.runs.brief(document_id)
+        with self.lock:
+            return self.memory.get(document_id)
+
+    def cached(self, text):
+        """The stored brief of this document as ingest returns it, or None"""
+        start = time.monotonic()
+        _, _, stored = self._lookup(text)
+        return self._result(stored, True, start) if stored else None
+
+    def ingest(self, text, name=''):
+        """Summarise the document into a brief, or return its stored brief"""
+        start = time.monotonic()
+        document_id, tokens, cached = self._lookup(text)
+        if cached:
+            return self._result(cached, True, start)
+        chunks = self.plan(text)
+        summaries = chunks if len(chunks) == 1 else list(self.pool.map(
+            lambda part: self.summarizer.process({'text': chunks[part], 'part': part + 1, 'parts': len(chunks), 'name': name}),
+            range(len(chunks))
+        ))
+        while len(summaries) > 1 and self._tokens(summaries) > self.config.get('reduce_tokens', 6000):
+            summaries = list(self.pool.map(lambda group: self.summarizer.process({'summaries': group, 'name': name}),
+                                           self._groups(summaries)))
+        brief = self.summarizer.process({'summaries': summaries, 'name': name})
+        return self._result(self._save(document_id, name, brief, tokens, len(chunks)), False, start)
+
+    async def aingest(self, text, name=''):
+        """Same as ingest, for an ingestor built with an AsyncOpenAI client"""
+        start = time.monotonic()
+        # Hashing, counting and ranking a long document would hold up the event loop
+        document_id, tokens, cached = await asyncio.to_thread(self._lookup, text)
+        if cached:
+            return self._result(cached, True, start)
+        chunks = await asyncio.to_thread(self.plan, text)
+        summaries = chunks if len(chunks) == 1 else await asyncio.gather(*[
+            self._asummarize({'text': chunk, 'part': part, 'parts': len(chunks), 'name': name})
+            for part, chunk in enumerate(chunks, 1)
+        ])
+        while len(summaries) > 1 and self._tokens(summaries) > self.config.get('reduce_tokens', 6000):
+            summaries = await asyncio.gather(*[
+                self._asummarize({'summaries': group, 'name': name}) for group in self._groups(summaries)
+            ])
+        brief = await self._asummarize({'summaries': list(summaries), 'name': name})
+        return self._result(self._save(document_id, name, brief, tokens, len(chunks)), False, start)
+
+    def plan(self, text):
+        """The document's chunks, each cut down to extract_tokens by the local extractive pass"""
+        chunks = chunk_document(text, self.config.get('chunk_tokens', 3000), self.model)
+        budget = self.config.get('extract_tokens')
+        if not budget:
+            return chunks
+        return [self.extractor.compact(chunk, budget, model=self.model) if count_tokens(chunk, self.model) > budget
+                else chunk for chunk in chunks]
+
+    async def _asummarize(self, context):
+        async with self.slots:
+            return await self.summarizer.aprocess(context)
+
+    def _lookup(self, text):
+        """(document_id, tokens, stored brief made with the current settings or None)"""
+        if not text or not text.strip():
+            raise ValueError("Document is empty")
+        tokens = count_tokens(text, self.model)
+        if tokens > self.config.get('max_tokens', 250000):
+            raise ValueError(f"Document is too long: {tokens} tokens, at most {self.config['max_tokens']}")
+        document_id = document_hash(text)
+        stored = self.get(document_id)
+        return document_id, tokens, stored if stored and stored['settings'] == self.settings else None
+
+    def _groups(self, summaries):
+        """Consecutive summaries in groups of at least two that each fit in one reduce call"""
+        limit = self.config.get('reduce_tokens', 6000)
+        groups, current, used = [], [], 0
+        for summary in summaries:
+            size = count_tokens(summary, self.model)
+            if len(current) >= 2 and used + size > limit:
+                groups.append(current)
+                current, used = [], 0
+            current.append(summary)
+            used += size
+        if len(current) == 1 and groups:
+            groups[-1].append(current[0])
+        elif current:
+            groups.append(current)
+        return groups
+
+    def _tokens(self, texts):
+        return sum(count_tokens(text, self.model) for text in texts)
+
+    def _save(self, document_id, name, brief, tokens, chunks):
+        print(f"documents.py: Reduced document {document_id[:12]} of {tokens} tokens in {chunks} chunks to a brief")
+        if self.runs:
+            self.runs.save_brief(document_id, name, self.settings, brief, tokens, chunks)
+            return self.runs.brief(document_id)
+        stored = {'document_id': document_id, 'name': name, 'settings': self.settings, 'brief': brief,
+                  'tokens': tokens, 'chunks': chunks, 'created_at': time.time()}
+        with self.lock:
+            self.memory[document_id] = stored
+            while len(self.memory) > self.max_cached:
+                self.memory.popitem(last=False)
+        return stored
+
+    def _result(self, stored, cached, start):
+        return {
+            'document_id': stored['document_id'],
+            'name': stored['name'],
+            'brief': stored['brief'],
+            'tokens': stored['tokens'],
+            'brief_tokens': count_tokens(stored['brief'], self.model),
+            'chunks': stored['chunks'],
+            'cached': cached,
+            'seconds': round(time.monotonic() - start, 3)
+        }
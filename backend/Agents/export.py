@@ -0,0 +1,216 @@
+import html
+import io
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from .pdf_writer import PDFDocument
+from .pptx_writer import Presentation
+
+FORMATS = ('html', 'txt', 'pdf', 'pptx')
+STEP_TITLES = {
+    'strategy': 'Strategic Analysis',
+    'competitors': 'Competitor Analysis',
+    'revenue': 'Revenue Analysis',
+    'cost': 'Cost Analysis',
+    'roi': 'ROI Analysis',
+    'justification': 'Business Justification',
+    'deck': 'Investor Deck'
+}
+BULLETS_PER_SLIDE = 7
+CHUNK_SIZE = 64 * 1024
+
+
+def step_title(step):
+    return STEP_TITLES.get(step, f"{step.capitalize()} Analysis")
+
+
+def _sections(formatted):
+    return (formatted or {}).get('sections') or []
+
+
+def _metric(metric):
+    return f"{metric['label']}: {metric['value']}{' ' + metric['unit'] if metric.get('unit') else ''}"
+
+
+def render_html(step, formatted):
+    parts = [f"<h1>{html.escape(step_title(step))}</h1>"]
+    for section in _sections(formatted):
+        parts.append('<div class="analysis-section">')
+        if section.get('title'):
+            parts.append(f"<h2>{html.escape(section['title'])}</h2>")
+        parts.extend(f"<p>{html.escape(paragraph)}</p>" for paragraph in section.get('content', []))
+        for items in (section.get('key_points', []), [_metric(m) for m in section.get('metrics', [])]):
+            if items:
+                parts.append('<ul>' + ''.join(f"<li>{html.escape(item)}</li>" for item in items) + '</ul>')
+        parts.append('</div>')
+    return (
+        '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{html.escape(step_title(step))}</title>\n"
+        '<style>body { font-family: Arial, sans-serif; line-height: 1.6; padding: 20px; } '
+        'h2 { color: #333; } .analysis-section { margin-bottom: 20px; }</style>\n'
+        '</head>\n<body>\n' + '\n'.join(parts) + '\n</body>\n</html>\n'
+    ).encode('utf-8')
+
+
+def render_txt(step, formatted):
+    lines = [step_title(step).upper(), '']
+    for section in _sections(formatted):
+        if section.get('title'):
+            lines += [section['title'].upper(), '=' * len(section['title'])]
+        lines += section.get('content', [])
+        lines += [f"- {point}" for point in section.get('key_points', [])]
+        lines += [f"- {_metric(metric)}" for metric in section.get('metrics', [])]
+        lines.append('')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def render_pdf(step, formatted):
+    document = PDFDocument()
+    document.heading(step_title(step), size=20)
+    for section in _sections(formatted):
+        if section.get('title'):
+            document.heading(section['title'], size=14)
+        for paragraph in section.get('content', []):
+            document.paragraph(paragraph)
+        for point in section.get('key_points', []):
+            document.bullet(point)
+        for metric in section.get('metrics', []):
+            document.bullet(_metric(metric))
+    return document.render()
+
+
+def render_pptx(step, formatted):
+    """A title slide, then each section as slides of at most BULLETS_PER_SLIDE bullets"""
+    presentation = Presentation()
+    presentation.add_slide(step_title(step), subtitle='Business Analysis')
+    for section in _sections(formatted):
+        bullets = (section.get('key_points', []) + [_metric(m) for m in section.get('metrics', [])]
+                   or section.get('content', []))
+        title = section.get('title') or step_title(step)
+        for start in range(0, max(len(bullets), 1), BULLETS_PER_SLIDE):
+            presentation.add_slide(title if start == 0 else f"{title} (cont.)",
+                                   bullets[start:start + BULLETS_PER_SLIDE])
+    return presentation.render()
+
+
+RENDERERS = {'html': render_html, 'txt': render_txt, 'pdf': render_pdf, 'pptx': render_pptx}
+
+
+def render(fmt, step, formatted):
+    """Render one step in one format; module level so worker processes can run it"""
+    return RENDERERS[fmt](step, formatted)
+
+
+class Exporter:
+    """Renders a stored run's formatted steps into a ZIP bundle, in parallel worker processes.
+
+    Bundles are cached on disk per run and format, so repeat downloads only stream the file,
+    and concurrent requests for the same bundle wait for a single build. The worker processes
+    are spawned with the first build, never forked: the servers calling this are threaded and
+    hold SQLite connections and locks that a forked child could inherit mid-use.
+    """
+
+    def __init__(self, runs, directory, workers=None, max_files=200):
+        self.runs = runs
+        self.directory = directory
+        self.max_files = max_files
+        self.workers = workers
+        self.pool = None
+        self.lock = threading.Lock()
+        self.building = {}
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls, runs):
+        """Build the exporter from EXPORT_* settings; exports need the run store"""
+        if runs is None:
+            return None
+        directory = os.getenv('EXPORT_CACHE_PATH', os.path.join(os.path.dirname(__file__), '..', 'cache', 'exports'))
+        workers = int(os.getenv('EXPORT_WORKERS', 0)) or None
+        return cls(runs, directory, workers, max_files=int(os.getenv('EXPORT_CACHE_MAX_FILES', 200)))
+
+    def bundle(self, run_id, fmt='all'):
+        """Path of the run's ZIP bundle in fmt ('all' or one of FORMATS), or None for an unknown run"""
+        if fmt != 'all' and fmt not in FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        path = os.path.join(self.directory, f"{run_id}-{fmt}.zip")
+        if os.path.exists(path):
+            os.utime(path)  # Recently downloaded bundles are evicted last
+            return path
+
+        with self.lock:
+            future = self.building.get(path)
+            owner = future is None
+            if owner:
+                future = self.building[path] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            stored = self.runs.get(run_id)
+            if stored is not None and stored['status'] == 'running':
+                raise ValueError("Run has not finished yet")
+            result = self._build(stored, fmt, path) if stored is not None else None
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.building.pop(path, None)
+
+    @staticmethod
+    def stream(path):
+        """Yield the bundle in chunks, so it is sent with chunked transfer encoding"""
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+
+    def _pool(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+            return self.pool
+
+    def _build(self, stored, fmt, path):
+        start = time.monotonic()
+        formats = FORMATS if fmt == 'all' else (fmt,)
+        pool = self._pool()
+        jobs = {
+            f"{step}/{step}_analysis.{ext}": pool.submit(render, ext, step, result['formatted_result'])
+            for step, result in stored['steps'].items() if result['formatted_result'] is not None
+            for ext in formats
+        }
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as bundle:
+            for name, job in sorted(jobs.items()):
+                bundle.writestr(name, job.result())
+
+        # Write then rename, so a concurrent download never sees a partial file
+        partial = f"{path}.{os.getpid()}.{threading.get_ident()}.partial"
+        with open(partial, 'wb') as f:
+            f.write(buffer.getvalue())
+        os.replace(partial, path)
+        print(f"export.py: Built {fmt} bundle for run {stored['run_id']} with {len(jobs)} files "
+              f"in {time.monotonic() - start:.2f}s")
+        self._evict()
+        return path
+
+    def _evict(self):
+        bundles = sorted((entry for entry in os.scandir(self.directory) if entry.name.endswith('.zip')),
+                         key=lambda entry: entry.stat().st_mtime)
+        for entry in bundles[:max(0, len(bundles) - self.max_files)]:
+            os.remove(entry.path)
@@ -0,0 +1,201 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+
+import numpy as np
+
+from .rate_limiter import SENT
+from .tracing import current, span
+
+
+class HedgePolicy:
+    """When to fire a duplicate of a slow LLM call.
+
+    A call that has not answered by the step's observed `quantile` latency gets a hedge,
+    once the step has `min_samples` latencies to judge by. Hedges are capped at
+    `max_ratio` of all calls, so a slow provider does not double the load on itself.
+    """
+
+    def __init__(self, enabled=True, quantile=0.95, min_samples=20, max_ratio=0.1, window=200):
+        self.enabled = enabled
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.window = window
+
+    @classmethod
+    def from_env(cls):
+        """Build the policy from LLM_HEDGE (0 disables), LLM_HEDGE_QUANTILE and LLM_HEDGE_MAX_RATIO"""
+        return cls(
+            enabled=os.getenv('LLM_HEDGE', '1') != '0',
+            quantile=float(os.getenv('LLM_HEDGE_QUANTILE', 0.95)),
+            min_samples=int(os.getenv('LLM_HEDGE_MIN_SAMPLES', 20)),
+            max_ratio=float(os.getenv('LLM_HEDGE_MAX_RATIO', 0.1))
+        )
+
+
+class HedgedClient:
+    """Wraps the shared client for one step, hedging non-streaming chat completions.
+
+    The first good response wins. A hedge goes to the step's `fallback_model` from AI_CONFIG
+    when one is set, otherwise it repeats the same request. The winning response names the
+    model that answered in `answered_by`, so the layers above neither cache a fallback
+    answer as the primary model's nor price it at the primary model's rates. A losing
+    call that has not started is cancelled; one already in flight cannot be interrupted
+    on a sync client, so its response is discarded when it arrives.
+
+    With the shared `limiter` below it, latencies and the hedge delay count from when a call
+    leaves the limiter, so time spent queued or backing off never triggers a hedge, and
+    nothing is hedged while the limiter is throttling.
+    """
+
+    def __init__(self, client, metrics, step, policy, fallback_model=None, limiter=None):
+        self.client = client
+        self.metrics = metrics
+        self.step = step
+        self.policy = policy
+        self.fallback_model = fallback_model
+        self.limiter = limiter
+        self.latencies = deque(maxlen=policy.window)
+        self.calls = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+        self.pool = None
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def threshold(self):
+        """Seconds to wait before hedging the next call, or None when it should not be hedged"""
+        if not self.policy.enabled:
+            return None
+        with self.lock:
+            self.calls += 1
+            if len(self.latencies) < self.policy.min_samples or self.hedges >= self.policy.max_ratio * self.calls:
+                return None
+            return float(np.quantile(self.latencies, self.policy.quantile))
+
+    def create(self, **kwargs):
+        delay = None if kwargs.get('stream') else self.threshold()
+        if delay is None:
+            return self._timed(kwargs)
+
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix=f"hedge-{self.step}")
+        # Copy the context so the metrics layer above still sees the rate limiter's waits,
+        # and keep it to see when the primary call was sent
+        context = contextvars.copy_context()
+        primary = self.pool.submit(context.run, self._timed, kwargs)
+        timeout = delay
+        while timeout > 0:
+            if wait([primary], timeout=timeout).done:
+                return primary.result()
+            timeout = self._hedge_in(context, delay)
+
+        hedge_request = self._hedge_request(kwargs)
+        hedge = self.pool.submit(contextvars.copy_context().run, self._hedged, hedge_request)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for loser in pending:
+                        loser.cancel()
+                    return self._won(future.result(), *((hedge_request, 'hedge') if future is hedge else (kwargs, 'primary')))
+                error = future.exception()
+        self._observe_hedge(kwargs, 'failed')
+        raise error
+
+    def _hedge_in(self, context, delay):
+        """Seconds until a call started in context has been with the provider for delay; 0 to hedge now"""
+        if self.limiter is None:
+            return 0
+        sent = context.get(SENT)
+        if sent is None or self.limiter.throttling():
+            return delay  # Still queued, or hedging would only add to the load; look again later
+        return max(0, sent + delay - time.monotonic())
+
+    def _hedge_request(self, request):
+        with self.lock:
+            self.hedges += 1
+        print(f"hedging.py: Hedging slow {self.step} call")
+        return dict(request, model=self.fallback_model) if self.fallback_model else request
+
+    def _hedged(self, request):
+        # Its own lane, as it overlaps the primary call
+        with span('hedge', lane=f"{current().lane} hedge", model=request.get('model')):
+            return self._timed(request)
+
+    def _timed(self, request):
+        start = time.monotonic()
+        SENT.set(None)
+        response = self.client.chat.completions.create(**request)
+        self._observe(request, time.monotonic() - max(start, SENT.get() or start))
+        return response
+
+    def _observe(self, request, seconds):
+        if not request.get('stream'):
+            with self.lock:
+                self.latencies.append(seconds)
+
+    def _won(self, response, request, winner):
+        response.answered_by = request.get('model')
+        self._observe_hedge(request, winner)
+        return response
+
+    def _observe_hedge(self, request, winner):
+        self.metrics.observe_hedge(self.step, request.get('model'), winner)
+
+
+class AsyncHedgedClient(HedgedClient):
+    """HedgedClient for an AsyncOpenAI client; the losing call is cancelled outright"""
+
+    async def create(self, **kwargs):
+        delay = None if kwargs.get('stream') else self.threshold()
+        if delay is None:
+            return await self._atimed(kwargs)
+
+        context = contextvars.copy_context()
+        primary = asyncio.get_running_loop().create_task(self._atimed(kwargs), context=context)
+        pending = {primary}
+        try:
+            timeout = delay
+            while timeout > 0:
+                done, _ = await asyncio.wait(pending, timeout=timeout)
+                if done:
+                    return primary.result()
+                timeout = self._hedge_in(context, delay)
+
+            hedge_request = self._hedge_request(kwargs)
+            hedge = asyncio.ensure_future(self._ahedged(hedge_request))
+            pending.add(hedge)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return self._won(task.result(), *((hedge_request, 'hedge') if task is hedge else (kwargs, 'primary')))
+                    error = task.exception()
+            self._observe_hedge(kwargs, 'failed')
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _ahedged(self, request):
+        with span('hedge', lane=f"{current().lane} hedge", model=request.get('model')):
+            return await self._atimed(request)
+
+    async def _atimed(self, request):
+        start = time.monotonic()
+        SENT.set(None)
+        response = await self.client.chat.completions.create(**request)
+        self._observe(request, time.monotonic() - max(start, SENT.get() or start))
+        return response
@@ -0,0 +1,171 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+
+class JobFailed(RuntimeError):
+    """A job that a web process was waiting for failed on its worker"""
+
+
+class JobQueue:
+    """SQLite-backed job broker shared by web servers and worker processes.
+
+    A worker claims a job with a lease and renews it with heartbeats while it works.
+    When a worker dies its lease runs out and the next claim picks the job up again,
+    counting it as another attempt. Any number of processes on a host, or on hosts
+    sharing the file, can enqueue and claim; claims are serialised by SQLite's write lock.
+    """
+
+    def __init__(self, path, max_attempts=3, retention_days=7):
+        self.max_attempts = max_attempts
+        self.retention = retention_days * 86400
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Autocommit, so claims can take the write lock up front with BEGIN IMMEDIATE
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT,
+                payload TEXT,
+                status TEXT,
+                attempts INTEGER DEFAULT 0,
+                max_attempts INTEGER,
+                lease_owner TEXT,
+                lease_expires REAL,
+                heartbeat_at REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL,
+                updated_at REAL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, created_at)")
+
+    @classmethod
+    def from_env(cls):
+        """Build the queue from JOB_QUEUE_* settings, or None when JOB_QUEUE_PATH is not set"""
+        path = os.getenv('JOB_QUEUE_PATH')
+        if not path:
+            return None
+        print(f"job_queue.py: Using job queue {path}")
+        queue = cls(
+            path,
+            max_attempts=int(os.getenv('JOB_MAX_ATTEMPTS', 3)),
+            retention_days=int(os.getenv('JOB_RETENTION_DAYS', 7))
+        )
+        queue.compact()
+        return queue
+
+    def enqueue(self, kind, payload):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO jobs (job_id, kind, payload, status, max_attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, json.dumps(payload), self.max_attempts, now, now)
+            )
+        print(f"job_queue.py: Enqueued {kind} job {job_id}")
+        return job_id
+
+    def claim(self, worker_id, lease=60):
+        """Lease the oldest queued job, or one whose lease expired, to worker_id; None when there is none"""
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.db.execute(
+                    "SELECT job_id FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row:
+                    self.db.execute(
+                        "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_owner = ?, "
+                        "lease_expires = ?, heartbeat_at = ?, updated_at = ? WHERE job_id = ?",
+                        (worker_id, now + lease, now, now, row[0])
+                    )
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row else None
+
+    def heartbeat(self, job_id, worker_id, lease=60):
+        """Extend the lease; False when the worker no longer holds it"""
+        now = time.time()
+        with self.lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET lease_expires = ?, heartbeat_at = ? "
+                "WHERE job_id = ? AND lease_owner = ? AND status = 'running'",
+                (now + lease, now, job_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result=None):
+        with self.lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET status = 'done', result = ?, lease_owner = NULL, updated_at = ? "
+                "WHERE job_id = ? AND lease_owner = ? AND status = 'running'",
+                (json.dumps(result), time.time(), job_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id, worker_id, error):
+        """Requeue the job if it has attempts left, otherwise fail it; returns the new status or None"""
+        with self.lock:
+            cursor = self.db.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                "error = ?, lease_owner = NULL, updated_at = ? "
+                "WHERE job_id = ? AND lease_owner = ? AND status = 'running'",
+                (error, time.time(), job_id, worker_id)
+            )
+            if cursor.rowcount != 1:
+                return None
+            return self.db.execute("SELECT status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()[0]
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT job_id, kind, payload, status, attempts, max_attempts, lease_owner, lease_expires, "
+                "result, error, created_at, updated_at FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, payload, status, attempts, max_attempts, owner, expires, result, error, created, updated = row
+        return {
+            'job_id': job_id,
+            'kind': kind,
+            'payload': json.loads(payload),
+            'status': status,
+            'attempts': attempts,
+            'max_attempts': max_attempts,
+            'lease_owner': owner,
+            'lease_expires': expires,
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'created_at': created,
+            'updated_at': updated
+        }
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ('queued', 'running', 'done', 'failed')}
+
+    def compact(self):
+        """Delete finished jobs older than the retention period"""
+        with self.lock:
+            cursor = self.db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - self.retention,)
+            )
+        if cursor.rowcount:
+            print(f"job_queue.py: Deleted {cursor.rowcount} finished jobs")
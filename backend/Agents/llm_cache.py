@@ -0,0 +1,269 @@
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+
+# Sample outputs in backend/data, in dependency order, keyed by pipeline step
+SEED_FILES = {
+    'strategy': 'strategy',
+    'competitors': 'competitor',
+    'cost': 'cost',
+    'revenue': 'revenue',
+    'roi': 'roi',
+    'justification': 'justification'
+}
+
+
+# Set while regenerating a step, so the call gets a fresh answer that then replaces the cached one
+REFRESH = contextvars.ContextVar('llm_cache_refresh', default=False)
+
+
+class ResponseCache:
+    """SQLite-backed store of completion texts keyed by a hash of the request"""
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                content TEXT,
+                size INTEGER,
+                created_at REAL,
+                last_access REAL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.db.commit()
+
+    @classmethod
+    def from_env(cls):
+        """Build the cache from LLM_CACHE_* settings, or None when LLM_CACHE_PATH is empty"""
+        path = os.getenv('LLM_CACHE_PATH', os.path.join(os.path.dirname(__file__), '..', 'cache', 'llm_responses.sqlite3'))
+        if not path:
+            return None
+        print(f"llm_cache.py: Caching LLM responses in {path}")
+        return cls(
+            path,
+            max_bytes=int(os.getenv('LLM_CACHE_MAX_MB', 256)) * 1024 * 1024,
+            ttl=int(os.getenv('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+        )
+
+    @staticmethod
+    def make_key(**request):
+        """Hash the model, temperature, messages and any other request options"""
+        request.pop('stream', None)
+        payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl:
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.db.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, content):
+        if content is None:
+            return  # e.g. a refusal or tool call; there is no text to answer a later request with
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, len(content.encode('utf-8')), now, now)
+            )
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes"""
+        self.db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        print(f"llm_cache.py: Evicted entries, cache now {total} bytes")
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class CachedClient:
+    """Wraps an OpenAI client so identical chat completions are answered from the cache"""
+
+    def __init__(self, client, cache):
+        self.client = client
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def create(self, **kwargs):
+        key = self.cache.make_key(**kwargs)
+        content = None if REFRESH.get() else self.cache.get(key)
+        model = kwargs.get('model')
+
+        if content is not None:
+            print(f"llm_cache.py: Cache hit for {model} ({key[:12]})")
+            if kwargs.get('stream'):
+                return iter([_chunk(content)])
+            return _completion(content, model)
+
+        response = self.client.chat.completions.create(**kwargs)
+        if kwargs.get('stream'):
+            return self._record_stream(response, key, model)
+
+        if _answered_by(response, model) == model:
+            self.cache.put(key, model, response.choices[0].message.content)
+        return response
+
+    def _record_stream(self, response, key, model):
+        """Pass a stream through unchanged and store the full text once it has ended"""
+        pieces = []
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+            yield chunk
+        self.cache.put(key, model, ''.join(pieces))
+
+
+class AsyncCachedClient(CachedClient):
+    """CachedClient for an AsyncOpenAI client"""
+
+    async def create(self, **kwargs):
+        # The cache is SQLite, so lookups and writes run in a thread to keep the event loop free
+        key = self.cache.make_key(**kwargs)
+        content = None if REFRESH.get() else await asyncio.to_thread(self.cache.get, key)
+        model = kwargs.get('model')
+
+        if content is not None:
+            print(f"llm_cache.py: Cache hit for {model} ({key[:12]})")
+            if kwargs.get('stream'):
+                return _async_iter([_chunk(content)])
+            return _completion(content, model)
+
+        response = await self.client.chat.completions.create(**kwargs)
+        if kwargs.get('stream'):
+            return self._arecord_stream(response, key, model)
+
+        if _answered_by(response, model) == model:
+            await asyncio.to_thread(self.cache.put, key, model, response.choices[0].message.content)
+        return response
+
+    async def _arecord_stream(self, response, key, model):
+        pieces = []
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+            yield chunk
+        await asyncio.to_thread(self.cache.put, key, model, ''.join(pieces))
+
+
+def _answered_by(response, model):
+    # A hedge that went to a fallback model must not answer later requests for the primary one
+    return getattr(response, 'answered_by', None) or model
+
+
+async def _async_iter(items):
+    for item in items:
+        yield item
+
+
+def _completion(content, model):
+    message = SimpleNamespace(role='assistant', content=content)
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')],
+        usage=None,
+        cached=True
+    )
+
+
+def _chunk(content):
+    delta = SimpleNamespace(role='assistant', content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason='stop')], usage=None, cached=True)
+
+
+def seed_cache(cache, agents, context_filter, custom_context, data_dir):
+    """Store the sample outputs in data_dir as the answers for custom_context.
+
+    Steps are seeded in dependency order with earlier samples as their context, passed
+    through the context filter as in a run, so the keys match exactly what a real run of
+    the same concept will look up.
+    """
+    context = {'custom_context': custom_context}
+    seeded = []
+    for step, filename in SEED_FILES.items():
+        path = os.path.join(data_dir, filename)
+        if step not in agents or not os.path.exists(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            content = f.read()
+
+        agent = agents[step]
+        filtered, _ = context_filter.process(context, step, agent.system_role)
+        key = cache.make_key(model=agent.model, messages=agent.build_messages(filtered), temperature=agent.temperature)
+        cache.put(key, agent.model, content)
+        context[step] = content
+        seeded.append(step)
+    print(f"llm_cache.py: Seeded {seeded} for concept: {custom_context}")
+    return seeded
+
+
+if __name__ == '__main__':
+    from .agent_handler import AgentHandler
+
+    parser = argparse.ArgumentParser(description="Seed the LLM response cache from sample outputs")
+    parser.add_argument('--concept', required=True, help="Business concept the sample outputs were generated for")
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(__file__), '..', 'data'))
+    args = parser.parse_args()
+
+    handler = AgentHandler()
+    if not handler.cache:
+        raise SystemExit("LLM cache is disabled, set LLM_CACHE_PATH")
+    seed_cache(handler.cache, handler.agents, handler.context_filter, args.concept, args.data_dir)
@@ -0,0 +1,310 @@
+import asyncio
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from .cancellation import RunCancelled
+from .tokens import count_message_tokens, count_tokens
+from .tracing import activate, current
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+SIMILARITY_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+# A run being cancelled, not a failed call, so these are kept out of llm_errors_total
+CANCELLED = (RunCancelled, asyncio.CancelledError)
+# USD per 1K prompt and completion tokens
+PRICES = {
+    'gpt-3.5-turbo': (0.0005, 0.0015),
+    'gpt-3.5-turbo-16k': (0.003, 0.004),
+    'gpt-4': (0.03, 0.06),
+    'gpt-4o': (0.005, 0.015),
+    'gpt-4o-mini': (0.00015, 0.0006)
+}
+
+# Per-call scratch space, so layers below the metrics wrapper can report what they did
+_call = contextvars.ContextVar('metrics_call', default=None)
+
+
+# Token totals of the calls made inside usage(), for callers that report their own spend
+_usage = contextvars.ContextVar('metrics_usage', default=None)
+
+
+@contextmanager
+def usage():
+    """Add up the tokens of the metered calls made inside the block; cache hits cost nothing"""
+    totals = {'prompt_tokens': 0, 'completion_tokens': 0, 'cached_calls': 0}
+    token = _usage.set(totals)
+    try:
+        yield totals
+    finally:
+        _usage.reset(token)
+
+
+def record_wait(seconds):
+    """Called by the rate limiter with the time a call spent waiting for a slot or budget"""
+    call = _call.get()
+    if call is not None:
+        call['wait'] += seconds
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(zip(self.labelnames, key))} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        series = self.series.setdefault(key, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series['counts'][i] += 1
+        series['sum'] += value
+        series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series.items()):
+            pairs = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, series['counts']):
+                lines.append(f"{self.name}_bucket{_labels(pairs + [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', '+Inf')])} {series['count']}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {series['sum']}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {series['count']}")
+        return lines
+
+
+class Metrics:
+    """Per-step LLM latency, token, cost, cache and error metrics in Prometheus text format"""
+
+    CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        labels = ('step', 'model')
+        self.queue_wait = Histogram('llm_queue_wait_seconds', "Time calls waited for the rate limiter", labels)
+        self.latency = Histogram('llm_latency_seconds', "LLM call latency, excluding queue wait", labels)
+        self.tokens = Counter('llm_tokens_total', "Prompt and completion tokens used", labels + ('kind',))
+        self.cost = Counter('llm_cost_usd_total', "Estimated spend in USD", labels)
+        self.calls = Counter('llm_calls_total', "LLM calls, including those answered from cache", labels)
+        self.cache_hits = Counter('llm_cache_hits_total', "LLM calls answered from the response cache", labels)
+        self.errors = Counter('llm_errors_total', "LLM calls that raised", labels)
+        self.hedges = Counter('llm_hedges_total', "Duplicate requests fired for slow calls, by which call won",
+                              labels + ('winner',))
+        self.formatting = Histogram('format_seconds', "Time to format a step's result", ('step', 'formatter'))
+        self.similar_lookups = Counter('similar_concept_lookups_total', "Near-duplicate concept lookups", ('result',))
+        self.similarity = Histogram('similar_concept_score', "Best cosine similarity found for a new concept", (),
+                                    buckets=SIMILARITY_BUCKETS)
+        self.gauges = {}
+
+    def gauge(self, name, help, read):
+        """Report the current value of read() when metrics are rendered"""
+        self.gauges[name] = (help, read)
+
+    def observe_call(self, step, model, wait, latency, prompt_tokens, completion_tokens, cached, failed=False):
+        labels = {'step': step, 'model': model}
+        with self.lock:
+            self.calls.inc(**labels)
+            if failed:
+                self.errors.inc(**labels)
+            self.queue_wait.observe(wait, **labels)
+            if cached:
+                self.cache_hits.inc(**labels)
+                return
+            self.latency.observe(latency, **labels)
+            self.tokens.inc(prompt_tokens, kind='prompt', **labels)
+            self.tokens.inc(completion_tokens, kind='completion', **labels)
+            prompt_price, completion_price = PRICES.get(model, (0.0, 0.0))
+            self.cost.inc((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000, **labels)
+
+    def observe_error(self, step, model):
+        with self.lock:
+            self.calls.inc(step=step, model=model)
+            self.errors.inc(step=step, model=model)
+
+    def observe_hedge(self, step, model, winner):
+        with self.lock:
+            self.hedges.inc(step=step, model=model, winner=winner)
+
+    def observe_similar(self, score, reused):
+        with self.lock:
+            self.similar_lookups.inc(result='hit' if reused else 'miss')
+            if score is not None:
+                self.similarity.observe(score)
+
+    def observe_format(self, step, formatter, seconds):
+        with self.lock:
+            self.formatting.observe(seconds, step=step, formatter=formatter)
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in (self.queue_wait, self.latency, self.tokens, self.cost,
+                           self.calls, self.cache_hits, self.errors, self.hedges, self.formatting,
+                           self.similar_lookups, self.similarity):
+                lines.extend(metric.render())
+        for name, (help, read) in self.gauges.items():
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {read()}"])
+        return '\n'.join(lines) + '\n'
+
+
+class MeteredClient:
+    """Wraps the shared client for one step, recording every chat completion in Metrics"""
+
+    def __init__(self, client, metrics, step):
+        self.client = client
+        self.metrics = metrics
+        self.step = step
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def create(self, **kwargs):
+        call = {'wait': 0.0}
+        token = _call.set(call)
+        span = self._span(kwargs)
+        start = time.monotonic()
+        try:
+            with activate(span):
+                response = self.client.chat.completions.create(**kwargs)
+        except CANCELLED:
+            span.end(cancelled=True)
+            raise
+        except Exception as e:
+            self.metrics.observe_error(self.step, kwargs.get('model'))
+            span.end(error=str(e))
+            raise
+        finally:
+            _call.reset(token)
+
+        if kwargs.get('stream'):
+            return self._stream(response, kwargs, call, start, span)
+        self._observe(kwargs, call, start, response, response.choices[0].message.content, span)
+        return response
+
+    def _span(self, request):
+        """The trace span of one call, ended once its whole answer has arrived"""
+        return current().child('llm', step=self.step, model=request.get('model'), stream=bool(request.get('stream')),
+                               request_bytes=len(json.dumps(request.get('messages', []))))
+
+    def _stream(self, response, request, call, start, span):
+        """Pass the stream through, recording what arrived even when it is abandoned or fails part way"""
+        pieces = []
+        chunk = None
+        ended = {}
+        try:
+            for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    pieces.append(chunk.choices[0].delta.content)
+                yield chunk
+        except CANCELLED + (GeneratorExit,):
+            ended = {'cancelled': True}
+            raise
+        except Exception as e:
+            ended = {'error': str(e)}
+            raise
+        finally:
+            self._observe(request, call, start, chunk, ''.join(pieces), span, **ended)
+
+    def _observe(self, request, call, start, response, text, span, **ended):
+        # A hedged call may have been answered by the step's fallback model
+        model = getattr(response, 'answered_by', None) or request.get('model')
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        else:
+            # Streams and cache hits carry no usage
+            prompt_tokens = count_message_tokens(request.get('messages', []), model)
+            completion_tokens = count_tokens(text, model)
+        cached = getattr(response, 'cached', False)
+        totals = _usage.get()
+        if totals is not None:
+            if cached:
+                totals['cached_calls'] += 1
+            else:
+                totals['prompt_tokens'] += prompt_tokens
+                totals['completion_tokens'] += completion_tokens
+        self.metrics.observe_call(
+            self.step, model, call['wait'], time.monotonic() - start - call['wait'],
+            prompt_tokens, completion_tokens, cached, failed='error' in ended
+        )
+        span.end(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, response_bytes=len(text or ''),
+                 wait_seconds=round(call['wait'], 6), cached=bool(cached), answered_by=model, **ended)
+
+
+class AsyncMeteredClient(MeteredClient):
+    """MeteredClient for an AsyncOpenAI client"""
+
+    async def create(self, **kwargs):
+        call = {'wait': 0.0}
+        token = _call.set(call)
+        span = self._span(kwargs)
+        start = time.monotonic()
+        try:
+            with activate(span):
+                response = await self.client.chat.completions.create(**kwargs)
+        except CANCELLED:
+            span.end(cancelled=True)
+            raise
+        except Exception as e:
+            self.metrics.observe_error(self.step, kwargs.get('model'))
+            span.end(error=str(e))
+            raise
+        finally:
+            _call.reset(token)
+
+        if kwargs.get('stream'):
+            return self._astream(response, kwargs, call, start, span)
+        self._observe(kwargs, call, start, response, response.choices[0].message.content, span)
+        return response
+
+    async def _astream(self, response, request, call, start, span):
+        pieces = []
+        chunk = None
+        ended = {}
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    pieces.append(chunk.choices[0].delta.content)
+                yield chunk
+        except CANCELLED + (GeneratorExit,):
+            ended = {'cancelled': True}
+            raise
+        except Exception as e:
+            ended = {'error': str(e)}
+            raise
+        finally:
+            self._observe(request, call, start, chunk, ''.join(pieces), span, **ended)
@@ -0,0 +1,76 @@
+import textwrap
+
+PAGE_WIDTH, PAGE_HEIGHT = 612, 792  # US Letter, in points
+MARGIN = 56
+FONTS = {'regular': 'F1', 'bold': 'F2'}
+
+
+class PDFDocument:
+    """Minimal text-only PDF writer using the standard Helvetica fonts, so no PDF library is needed.
+
+    Lines are wrapped on an average glyph width, which keeps text inside the margins
+    without embedding font metrics.
+    """
+
+    def __init__(self):
+        self.pages = [[]]
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def heading(self, text, size=18):
+        self._paragraph(text, size, 'bold', space_before=size * 0.8)
+
+    def paragraph(self, text, size=11, indent=0):
+        self._paragraph(text, size, 'regular', space_before=size * 0.5, indent=indent)
+
+    def bullet(self, text, size=11):
+        self._paragraph(f"• {text}", size, 'regular', space_before=size * 0.3, indent=12)
+
+    def render(self):
+        """Serialise the document to PDF bytes"""
+        objects = [
+            b"<< /Type /Catalog /Pages 2 0 R >>",
+            None,  # The page tree, once the page object numbers are known
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"
+        ]
+        page_refs = []
+        for page in self.pages:
+            stream = '\n'.join(page).encode('cp1252', errors='replace')
+            objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+            objects.append(
+                b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+                b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>"
+                % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+            )
+            page_refs.append(b"%d 0 R" % len(objects))
+        objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b' '.join(page_refs), len(page_refs))
+
+        output = bytearray(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+        xref = len(output)
+        output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        output += b''.join(b"%010d 00000 n \n" % offset for offset in offsets)
+        output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+        return bytes(output)
+
+    def _paragraph(self, text, size, font, space_before, indent=0):
+        leading = size * 1.35
+        # Helvetica averages about half an em per glyph
+        width = int((PAGE_WIDTH - 2 * MARGIN - indent) / (size * 0.5))
+        lines = textwrap.wrap(' '.join(str(text).split()), width) or ['']
+        self.y -= space_before
+        for line in lines:
+            if self.y - leading < MARGIN:
+                self.pages.append([])
+                self.y = PAGE_HEIGHT - MARGIN
+            self.y -= leading
+            self.pages[-1].append(
+                f"BT /{FONTS[font]} {size} Tf {MARGIN + indent} {self.y:.1f} Td ({_escape(line)}) Tj ET"
+            )
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
@@ -0,0 +1,155 @@
+import io
+import zipfile
+from xml.sax.saxutils import escape
+
+NAMESPACES = (
+    'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" '
+    'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main"'
+)
+REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+CONTENT = 'application/vnd.openxmlformats-officedocument.'
+SLIDE_WIDTH, SLIDE_HEIGHT = 12192000, 6858000  # 16:9, in EMU
+INSET = 457200  # Half an inch
+
+THEME = f"""<a:theme xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" name="Analysis">
+<a:themeElements>
+<a:clrScheme name="Analysis">
+<a:dk1><a:srgbClr val="1F2933"/></a:dk1><a:lt1><a:srgbClr val="FFFFFF"/></a:lt1>
+<a:dk2><a:srgbClr val="243B53"/></a:dk2><a:lt2><a:srgbClr val="F0F4F8"/></a:lt2>
+<a:accent1><a:srgbClr val="2F80ED"/></a:accent1><a:accent2><a:srgbClr val="27AE60"/></a:accent2>
+<a:accent3><a:srgbClr val="F2994A"/></a:accent3><a:accent4><a:srgbClr val="9B51E0"/></a:accent4>
+<a:accent5><a:srgbClr val="EB5757"/></a:accent5><a:accent6><a:srgbClr val="56CCF2"/></a:accent6>
+<a:hlink><a:srgbClr val="2F80ED"/></a:hlink><a:folHlink><a:srgbClr val="9B51E0"/></a:folHlink>
+</a:clrScheme>
+<a:fontScheme name="Analysis">
+<a:majorFont><a:latin typeface="Calibri"/><a:ea typeface=""/><a:cs typeface=""/></a:majorFont>
+<a:minorFont><a:latin typeface="Calibri"/><a:ea typeface=""/><a:cs typeface=""/></a:minorFont>
+</a:fontScheme>
+<a:fmtScheme name="Analysis">
+<a:fillStyleLst>{'<a:solidFill><a:schemeClr val="phClr"/></a:solidFill>' * 3}</a:fillStyleLst>
+<a:lnStyleLst>{'<a:ln w="9525"><a:solidFill><a:schemeClr val="phClr"/></a:solidFill></a:ln>' * 3}</a:lnStyleLst>
+<a:effectStyleLst>{'<a:effectStyle><a:effectLst/></a:effectStyle>' * 3}</a:effectStyleLst>
+<a:bgFillStyleLst>{'<a:solidFill><a:schemeClr val="phClr"/></a:solidFill>' * 3}</a:bgFillStyleLst>
+</a:fmtScheme>
+</a:themeElements>
+</a:theme>"""
+
+EMPTY_TREE = ('<p:nvGrpSpPr><p:cNvPr id="1" name=""/><p:cNvGrpSpPr/><p:nvPr/></p:nvGrpSpPr>'
+              '<p:grpSpPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="0" cy="0"/>'
+              '<a:chOff x="0" y="0"/><a:chExt cx="0" cy="0"/></a:xfrm></p:grpSpPr>')
+
+MASTER = f"""<p:sldMaster {NAMESPACES}>
+<p:cSld><p:bg><p:bgRef idx="1001"><a:schemeClr val="bg1"/></p:bgRef></p:bg><p:spTree>{EMPTY_TREE}</p:spTree></p:cSld>
+<p:clrMap bg1="lt1" tx1="dk1" bg2="lt2" tx2="dk2" accent1="accent1" accent2="accent2" accent3="accent3"
+ accent4="accent4" accent5="accent5" accent6="accent6" hlink="hlink" folHlink="folHlink"/>
+<p:sldLayoutIdLst><p:sldLayoutId id="2147483649" r:id="rId1"/></p:sldLayoutIdLst>
+</p:sldMaster>"""
+
+LAYOUT = f"""<p:sldLayout {NAMESPACES} type="blank" preserve="1">
+<p:cSld name="Blank"><p:spTree>{EMPTY_TREE}</p:spTree></p:cSld>
+<p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr>
+</p:sldLayout>"""
+
+
+class Presentation:
+    """Minimal PowerPoint writer: slides with a title and bulleted body text on a blank layout"""
+
+    def __init__(self):
+        self.slides = []
+
+    def add_slide(self, title, bullets=(), subtitle=None):
+        self.slides.append((title, list(bullets), subtitle))
+
+    def render(self):
+        """Serialise the presentation to .pptx bytes"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+            package.writestr('[Content_Types].xml', self._content_types())
+            package.writestr('_rels/.rels', _rels([('rId1', 'officeDocument', 'ppt/presentation.xml')]))
+            package.writestr('ppt/presentation.xml', self._presentation())
+            package.writestr('ppt/_rels/presentation.xml.rels', _rels(
+                [('rId1', 'slideMaster', 'slideMasters/slideMaster1.xml'), ('rId2', 'theme', 'theme/theme1.xml')] +
+                [(f'rId{i + 3}', 'slide', f'slides/slide{i + 1}.xml') for i in range(len(self.slides))]
+            ))
+            package.writestr('ppt/theme/theme1.xml', THEME)
+            package.writestr('ppt/slideMasters/slideMaster1.xml', MASTER)
+            package.writestr('ppt/slideMasters/_rels/slideMaster1.xml.rels', _rels(
+                [('rId1', 'slideLayout', '../slideLayouts/slideLayout1.xml'), ('rId2', 'theme', '../theme/theme1.xml')]
+            ))
+            package.writestr('ppt/slideLayouts/slideLayout1.xml', LAYOUT)
+            package.writestr('ppt/slideLayouts/_rels/slideLayout1.xml.rels', _rels(
+                [('rId1', 'slideMaster', '../slideMasters/slideMaster1.xml')]
+            ))
+            for i, slide in enumerate(self.slides, start=1):
+                package.writestr(f'ppt/slides/slide{i}.xml', _slide(*slide))
+                package.writestr(f'ppt/slides/_rels/slide{i}.xml.rels', _rels(
+                    [('rId1', 'slideLayout', '../slideLayouts/slideLayout1.xml')]
+                ))
+        return buffer.getvalue()
+
+    def _content_types(self):
+        overrides = [
+            ('/ppt/presentation.xml', 'presentationml.presentation.main+xml'),
+            ('/ppt/theme/theme1.xml', 'theme+xml'),
+            ('/ppt/slideMasters/slideMaster1.xml', 'presentationml.slideMaster+xml'),
+            ('/ppt/slideLayouts/slideLayout1.xml', 'presentationml.slideLayout+xml')
+        ] + [(f'/ppt/slides/slide{i}.xml', 'presentationml.slide+xml') for i in range(1, len(self.slides) + 1)]
+        return (
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            + ''.join(f'<Override PartName="{name}" ContentType="{CONTENT}{kind}"/>' for name, kind in overrides)
+            + '</Types>'
+        )
+
+    def _presentation(self):
+        slide_ids = ''.join(f'<p:sldId id="{255 + i}" r:id="rId{i + 2}"/>' for i in range(1, len(self.slides) + 1))
+        return (
+            f'<p:presentation {NAMESPACES}>'
+            '<p:sldMasterIdLst><p:sldMasterId id="2147483648" r:id="rId1"/></p:sldMasterIdLst>'
+            f'<p:sldIdLst>{slide_ids}</p:sldIdLst>'
+            f'<p:sldSz cx="{SLIDE_WIDTH}" cy="{SLIDE_HEIGHT}"/><p:notesSz cx="6858000" cy="9144000"/>'
+            '</p:presentation>'
+        )
+
+
+def _rels(relationships):
+    return (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        + ''.join(f'<Relationship Id="{rid}" Type="{REL}/{kind}" Target="{target}"/>'
+                  for rid, kind, target in relationships)
+        + '</Relationships>'
+    )
+
+
+def _slide(title, bullets, subtitle):
+    shapes = [_textbox(2, 'Title', INSET, INSET, 1143000, [_run_paragraph(title, 3200, bold=True)])]
+    if subtitle:
+        shapes.append(_textbox(3, 'Subtitle', INSET, 1828800, 914400, [_run_paragraph(subtitle, 2000)]))
+    if bullets:
+        body_top = INSET + 1143000 + 182880
+        shapes.append(_textbox(4, 'Body', INSET, body_top, SLIDE_HEIGHT - body_top - INSET,
+                               [_run_paragraph(bullet, 1800, bulleted=True) for bullet in bullets]))
+    return (
+        f'<p:sld {NAMESPACES}><p:cSld><p:spTree>{EMPTY_TREE}{"".join(shapes)}</p:spTree></p:cSld>'
+        '<p:clrMapOvr><a:masterClrMapping/></p:clrMapOvr></p:sld>'
+    )
+
+
+def _textbox(shape_id, name, x, y, height, paragraphs):
+    return (
+        f'<p:sp><p:nvSpPr><p:cNvPr id="{shape_id}" name="{name}"/><p:cNvSpPr txBox="1"/><p:nvPr/></p:nvSpPr>'
+        f'<p:spPr><a:xfrm><a:off x="{x}" y="{y}"/><a:ext cx="{SLIDE_WIDTH - 2 * x}" cy="{height}"/></a:xfrm>'
+        '<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></p:spPr>'
+        f'<p:txBody><a:bodyPr wrap="square"><a:normAutofit/></a:bodyPr><a:lstStyle/>{"".join(paragraphs)}</p:txBody>'
+        '</p:sp>'
+    )
+
+
+def _run_paragraph(text, size, bold=False, bulleted=False):
+    properties = '<a:pPr marL="285750" indent="-285750"><a:buChar char="•"/></a:pPr>' if bulleted else ''
+    return (
+        f'<a:p>{properties}<a:r><a:rPr lang="en-US" sz="{size}" b="{int(bold)}" dirty="0"/>'
+        f'<a:t>{escape(str(text))}</a:t></a:r></a:p>'
+    )
@@ -0,0 +1,271 @@
+import asyncio
+import os
+import time
+import uuid
+from .context_store import check_session_id
+from .job_queue import JobFailed
+from .run_events import StoredRunEvents
+from .run_store import RunStore
+from .export import Exporter
+from .concept_index import ConceptIndex
+from .metrics import Metrics
+from .run_index import RunIndexes
+from .documents import DocumentIngestor
+from .tracing import Tracer
+from .cancellation import RunFollowers
+from .scheduler import DependencyScheduler
+from config.ai_models import AI_CONFIG, ANALYSIS_PROFILES, DOCUMENT_CONFIG, QA_CONFIG
+
+
+class QueuedAgentHandler:
+    """Stateless stand-in for AgentHandler in web processes, used when JOB_QUEUE_PATH is set.
+
+    Runs are enqueued for `python -m Agents.worker` processes instead of calling the agents
+    here, and sessions, results and events are all read from the shared RunStore. Any web
+    process can therefore answer any request, however many there are and wherever the
+    workers run. /process/<step> waits for the step from the session's run, starting a
+    run of every step when the session has none.
+    """
+
+    def __init__(self, queue):
+        print("\nqueued_handler.py: Initializing QueuedAgentHandler...")
+        self.queue = queue
+        self.runs = RunStore.from_env()
+        if not self.runs:
+            raise ValueError("The job queue needs the run store: set RUN_STORE_PATH to a file shared with the workers")
+        self.agents = list(AI_CONFIG)
+        self.scheduler = DependencyScheduler(AI_CONFIG, profiles=ANALYSIS_PROFILES)
+        self.events = StoredRunEvents(self.runs)
+        self.followers = RunFollowers.from_env(self.events, self.cancel_run)
+        self.tracer = Tracer(self.runs)
+        self.cache = None  # The LLM cache lives with the workers
+        self.metrics = Metrics()
+        self.metrics.gauge('job_queue_depth', "Jobs waiting for a worker", lambda: self.queue.stats()['queued'])
+        self.exporter = Exporter.from_env(self.runs)
+        self.similar = ConceptIndex.from_env(self.runs, self.metrics)
+        self.indexes = RunIndexes(self.runs)
+        self.documents = DocumentIngestor(None, DOCUMENT_CONFIG, self.runs)  # Looks up briefs the workers stored
+        self.answer_timeout = float(os.getenv('JOB_ANSWER_TIMEOUT_SECONDS', 120))
+
+    def check_session(self, session_id):
+        check_session_id(session_id)
+
+    def submit_context(self, session_id, custom_context):
+        session_id = check_session_id(session_id)
+        session = self.runs.session(session_id)
+        # Keep following the session's run while the concept is unchanged
+        run_id = session['run_id'] if session and session['concept'] == custom_context else None
+        self.runs.save_session(session_id, custom_context, run_id)
+        return session_id
+
+    def start_run(self, data):
+        """Record a run and enqueue it for the workers, returning the run id to follow"""
+        session_id = check_session_id(data.get('session_id'))
+        if data.get('custom_context'):
+            self.submit_context(session_id, data['custom_context'])
+        session = self.runs.session(session_id)
+        if not session or not session['concept']:
+            raise ValueError("No business concept submitted for this session")
+
+        steps = self.scheduler.select(data.get('profile'), data.get('steps'))
+        run_id = uuid.uuid4().hex
+        # A session works on one analysis at a time; its workers drop the runs it started before
+        for superseded in self.runs.running(session_id):
+            self.cancel_run(superseded, f"Superseded by run {run_id}")
+        self.runs.start(run_id, session_id, session['concept'])
+        self.runs.record(run_id, 'run_started', {'steps': steps})
+        self.runs.save_session(session_id, session['concept'], run_id)
+        self.queue.enqueue('run', {
+            'run_id': run_id,
+            'session_id': session_id,
+            'concept': session['concept'],
+            'rerun': bool(data.get('rerun')),
+            'base_run_id': data.get('base_run_id'),
+            'regenerate': list(data.get('regenerate') or []),
+            'steps': steps
+        })
+        self.tracer.bind(run_id)
+        print(f"queued_handler.py: Queued run {run_id}")
+        return run_id
+
+    def cancel_run(self, run_id, reason="Cancelled by the client"):
+        """Mark a run cancelled; a worker running it stops within a second, a queued one is skipped"""
+        if self.runs.record(run_id, 'run_cancelled', {'reason': reason}):
+            print(f"queued_handler.py: Cancelled run {run_id}: {reason}")
+            return True
+        if self.runs.get(run_id) is None:
+            return None
+        raise ValueError("Run has already finished")
+
+    def restore_run(self, run_id, session_id=None):
+        stored = self.runs.get(run_id)
+        if stored is None or stored['status'] != 'complete':
+            return None
+        session_id = check_session_id(session_id)
+        self.runs.save_session(session_id, stored['concept'], run_id)
+        return session_id
+
+    def process_request(self, step, data):
+        if step not in self.agents:
+            return {"error": f"Unknown step: {step}"}
+        run_id = self._run_for(data)
+        for event in self.events.subscribe(run_id):
+            if self._step_done(step, event):
+                break
+        return self._step_result(step, run_id)
+
+    def stream_request(self, step, data):
+        """The step's whole text as a one-chunk stream, once a worker has it; workers do not stream tokens back.
+
+        Raises ValueError when the step has no result, before the response is started.
+        """
+        result = self.process_request(step, data)
+        if 'error' in result:
+            raise ValueError(result['error'])
+        return iter([result['raw_result']])
+
+    def ask(self, run_id, question, k=None):
+        """Find the relevant sections here and have a worker write the answer"""
+        found = self._ask_sources(run_id, question, k)
+        if found is None:
+            return None
+        self.tracer.bind(run_id)
+        sources, search_ms = found
+        job_id = self.queue.enqueue('answer', {'question': question, 'sources': sources})
+        deadline = time.monotonic() + self.answer_timeout
+        while (job := self.queue.get(job_id))['status'] not in ('done', 'failed') and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return self._answered(job, sources, search_ms)
+
+    def _ask_sources(self, run_id, question, k=None):
+        return self.indexes.search(run_id, question, k or QA_CONFIG.get('top_k', 5))
+
+    def ingest_document(self, text, name=''):
+        """Return the stored brief, or queue the document for a worker to summarise and return its job"""
+        cached = self.documents.cached(text)
+        if cached:
+            return cached
+        return self._document_queued(self.queue.enqueue('document', {'text': text, 'name': name}))
+
+    def document_job(self, job_id):
+        """The brief a document job produced, its job while still queued or running, or None for an unknown job"""
+        job = self.queue.get(job_id)
+        if job is None or job['kind'] != 'document':
+            return None
+        if job['status'] == 'failed':
+            raise JobFailed(f"Summarising the document failed: {job['error']}")
+        if job['status'] != 'done':
+            return self._document_queued(job_id)
+        return job['result']
+
+    @staticmethod
+    def _document_queued(job_id):
+        return {'status': 'processing', 'job_id': job_id}
+
+    @staticmethod
+    def _answered(job, sources, search_ms):
+        if job['status'] == 'failed':
+            raise JobFailed(f"Answering failed: {job['error']}")
+        if job['status'] != 'done':
+            raise TimeoutError("No worker answered in time")
+        return {'answer': job['result']['answer'], 'sources': sources, 'search_ms': round(search_ms, 2)}
+
+    def get_formatted_result(self, step, session_id=None):
+        session = self.runs.session(check_session_id(session_id))
+        stored = self.runs.get(session['run_id']) if session and session['run_id'] else None
+        result = stored['steps'].get(step) if stored else None
+        if result is None:
+            if stored and stored['status'] == 'running':
+                return {"status": "processing"}
+            return {"error": "No formatting task found for this step"}
+        if result['formatted_result'] is not None:
+            return {"status": "complete", "formatted_result": result['formatted_result']}
+        if result['status'] == 'failed' or stored['status'] != 'running':
+            return {"error": f"Formatting failed: {result['error'] or 'the run ended first'}"}
+        return {"status": "processing"}
+
+    def _run_for(self, data):
+        """The run to take the session's results from, starting one if needed"""
+        session_id = check_session_id(data.get('session_id'))
+        if data.get('custom_context'):
+            self.submit_context(session_id, data['custom_context'])
+        session = self.runs.session(session_id)
+        if data.get('rerun') or not session or not session['run_id']:
+            return self.start_run({'session_id': session_id, 'rerun': data.get('rerun')})
+        return session['run_id']
+
+    @staticmethod
+    def _step_done(step, event):
+        return event and event['data'].get('step') in (step, None) and event['event'] in ('raw_ready', 'error')
+
+    def _step_result(self, step, run_id):
+        stored = self.runs.get(run_id)
+        result = stored['steps'].get(step) if stored else None
+        if result is None or result['raw_result'] is None:
+            error = (result or {}).get('error') or (stored or {}).get('errors', {}).get('run') or "Run ended without this step"
+            return {"error": error}
+        return {
+            "status": "processing",
+            "raw_result": result['raw_result'],
+            "step": step,
+            "precomputed": True
+        }
+
+    def __del__(self):
+        if getattr(self, 'exporter', None):
+            try:
+                self.exporter.close()
+            except OSError:
+                pass  # Collected in the same GC pass as its pool, which closed its pipes already
+        if getattr(self, 'documents', None):
+            self.documents.pool.shutdown(wait=False)
+
+
+class AsyncQueuedAgentHandler(QueuedAgentHandler):
+    """QueuedAgentHandler for asgi_app.py, waiting for workers without blocking the event loop"""
+
+    async def process_request(self, step, data):
+        if step not in self.agents:
+            return {"error": f"Unknown step: {step}"}
+        run_id = await asyncio.to_thread(self._run_for, data)
+        async for event in self.events.asubscribe(run_id):
+            if self._step_done(step, event):
+                break
+        return await asyncio.to_thread(self._step_result, step, run_id)
+
+    async def ask(self, run_id, question, k=None):
+        found = await asyncio.to_thread(self._ask_sources, run_id, question, k)
+        if found is None:
+            return None
+        self.tracer.bind(run_id)
+        sources, search_ms = found
+        job_id = await asyncio.to_thread(self.queue.enqueue, 'answer', {'question': question, 'sources': sources})
+        deadline = time.monotonic() + self.answer_timeout
+        job = await asyncio.to_thread(self.queue.get, job_id)
+        while job['status'] not in ('done', 'failed') and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+            job = await asyncio.to_thread(self.queue.get, job_id)
+        return self._answered(job, sources, search_ms)
+
+    async def ingest_document(self, text, name=''):
+        # Hashing and counting the tokens of a long document would hold up the event loop
+        cached = await asyncio.to_thread(self.documents.cached, text)
+        if cached:
+            return cached
+        job_id = await asyncio.to_thread(self.queue.enqueue, 'document', {'text': text, 'name': name})
+        return self._document_queued(job_id)
+
+    async def blocking(self, func, *args):
+        """Call func in a thread, for run store and concept index work requested on the event loop"""
+        return await asyncio.to_thread(func, *args)
+
+    async def stream_request(self, step, data):
+        result = await self.process_request(step, data)
+        if 'error' in result:
+            raise ValueError(result['error'])
+        return _chunks([result['raw_result']])
+
+
+async def _chunks(chunks):
+    for chunk in chunks:
+        yield chunk
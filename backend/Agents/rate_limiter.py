@@ -0,0 +1,326 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from openai import APIConnectionError
+
+from . import cancellation
+from .metrics import record_wait
+from .tokens import count_message_tokens, count_tokens
+from .tracing import span
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+# When the current call's latest attempt left the limiter, so layers above can time the provider alone
+SENT = contextvars.ContextVar('llm_sent_at', default=None)
+
+
+class TokenBucket:
+    """Refills continuously at rate_per_minute up to one minute's worth of capacity"""
+
+    def __init__(self, rate_per_minute):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, amount):
+        """Take amount now, returning how long to wait before the bucket could afford it"""
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        # Never reserve more than a full bucket, or a huge prompt would wait forever
+        self.level -= min(amount, self.capacity)
+        return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount):
+        """Correct an earlier reservation once the real usage is known"""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """Shared requests/tokens-per-minute limits, retries and adaptive concurrency for LLM calls.
+
+    Each call reserves one request and its estimated tokens up front, then settles the
+    difference when response.usage (or the streamed text) shows what it really used.
+    Throttled calls are retried with jittered exponential backoff that honours Retry-After,
+    and the concurrency limit is halved on every throttle and grows back by one per
+    window of successful calls (AIMD). Failed and cancelled calls leave it as it is.
+    """
+
+    def __init__(self, rpm=3500, tpm=90000, max_concurrency=32, min_concurrency=1,
+                 max_retries=5, base_delay=1.0, max_delay=60.0, completion_estimate=500):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.completion_estimate = completion_estimate
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.throttled = 0
+        self.retries = 0
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+        self.async_waiters = []  # (loop, future) of coroutines waiting for a slot
+
+    @classmethod
+    def from_env(cls):
+        """Build the limiter from OPENAI_RPM, OPENAI_TPM and OPENAI_MAX_CONCURRENCY; 0 disables a limit"""
+        return cls(
+            rpm=int(os.getenv('OPENAI_RPM', 3500)),
+            tpm=int(os.getenv('OPENAI_TPM', 90000)),
+            max_concurrency=int(os.getenv('OPENAI_MAX_CONCURRENCY', 32)),
+            max_retries=int(os.getenv('OPENAI_MAX_RETRIES', 5))
+        )
+
+    def estimate(self, request):
+        """Tokens a request will use: its prompt plus max_tokens or a typical completion"""
+        model = request.get('model', 'gpt-3.5-turbo')
+        completion = request.get('max_tokens') or self.completion_estimate
+        return count_message_tokens(request.get('messages', []), model) + completion
+
+    def acquire(self, estimate):
+        """Block until a concurrency slot is free and the budgets allow the call.
+
+        Raises RunCancelled, without sending the call, if its run is cancelled meanwhile.
+        """
+        with self.released:
+            while not self._try_slot():
+                self.released.wait(0.1)
+                cancellation.check()
+        try:
+            cancellation.current().sleep(self._reserve(estimate))
+        except cancellation.RunCancelled:
+            self.release(estimate)
+            raise
+
+    async def aacquire(self, estimate):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.lock:
+                if self._try_slot():
+                    break
+                waiter = loop.create_future()
+                self.async_waiters.append((loop, waiter))
+            await waiter
+        try:
+            await asyncio.sleep(self._reserve(estimate))
+        except asyncio.CancelledError:
+            self.release(estimate)  # A cancelled caller, e.g. a hedged call that lost
+            raise
+
+    def release(self, estimate, used=None, throttled=False, succeeded=False):
+        """Free the call's slot; only a successful call widens the window, and a throttled one halves it"""
+        with self.released:
+            self.in_flight -= 1
+            if used is not None and self.tokens:
+                self.tokens.adjust(used - estimate)
+            if throttled:
+                self.throttled += 1
+                self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            elif succeeded:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            self.released.notify_all()
+            for loop, waiter in self.async_waiters:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(_wake, waiter)
+            self.async_waiters.clear()
+
+    def backoff(self, attempt, error):
+        """Seconds to wait before retrying error, or None when it should not be retried"""
+        if attempt >= self.max_retries or not self.is_retryable(error):
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = self.retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+            # Everyone waits, not just this call, since the limit is account-wide
+            with self.lock:
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        with self.lock:
+            self.retries += 1
+        return delay
+
+    @staticmethod
+    def is_retryable(error):
+        status = getattr(error, 'status_code', None)
+        if status is not None:
+            return status in RETRYABLE_STATUS or status >= 500
+        return isinstance(error, (APIConnectionError, TimeoutError, ConnectionError))
+
+    @staticmethod
+    def is_throttle(error):
+        return getattr(error, 'status_code', None) == 429
+
+    @staticmethod
+    def retry_after(error):
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        try:
+            if headers.get('retry-after-ms'):
+                return float(headers['retry-after-ms']) / 1000
+            if headers.get('retry-after'):
+                return float(headers['retry-after'])
+        except ValueError:
+            pass  # An HTTP date; fall back to exponential backoff
+        return None
+
+    def throttling(self):
+        """Whether the limiter is backing off: paused by Retry-After or below its full concurrency"""
+        with self.lock:
+            return self.paused_until > time.monotonic() or self.concurrency < self.max_concurrency
+
+    def stats(self):
+        with self.lock:
+            return {
+                'concurrency_limit': int(self.concurrency),
+                'in_flight': self.in_flight,
+                'throttled': self.throttled,
+                'retries': self.retries
+            }
+
+    def _try_slot(self):
+        if self.in_flight >= max(self.min_concurrency, int(self.concurrency)):
+            return False
+        self.in_flight += 1
+        return True
+
+    def _reserve(self, estimate):
+        with self.lock:
+            wait = max(0.0, self.paused_until - time.monotonic())
+            if self.requests:
+                wait = max(wait, self.requests.reserve(1))
+            if self.tokens:
+                wait = max(wait, self.tokens.reserve(estimate))
+            return wait
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _usage(response):
+    usage = getattr(response, 'usage', None)
+    return getattr(usage, 'total_tokens', None)
+
+
+def _delta_text(chunk):
+    choices = getattr(chunk, 'choices', None)
+    return (choices[0].delta.content or '') if choices else ''
+
+
+class RateLimitedClient:
+    """Wraps an OpenAI client so every chat completion goes through the shared RateLimiter"""
+
+    def __init__(self, client, limiter):
+        self.client = client
+        self.limiter = limiter
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def create(self, **kwargs):
+        estimate = self.limiter.estimate(kwargs)
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            with span('queue_wait', estimated_tokens=estimate):
+                self.limiter.acquire(estimate)
+            record_wait(time.monotonic() - start)
+            try:
+                SENT.set(time.monotonic())
+                with span('attempt', number=attempt + 1):
+                    response = self.client.chat.completions.create(**kwargs)
+            except Exception as e:
+                self.limiter.release(estimate, throttled=self.limiter.is_throttle(e))
+                delay = self.limiter.backoff(attempt, e)
+                if delay is None:
+                    raise
+                print(f"rate_limiter.py: Retrying after {delay:.1f}s ({e})")
+                with span('backoff', seconds=round(delay, 3)):
+                    cancellation.current().sleep(delay)
+                record_wait(delay)
+                attempt += 1
+                continue
+
+            if kwargs.get('stream'):
+                return self._stream(response, kwargs, estimate)
+            self.limiter.release(estimate, _usage(response), succeeded=True)
+            return response
+
+    def _stream(self, response, request, estimate):
+        # The slot is held until the stream is consumed; usage is counted from the streamed text
+        text = []
+        completed = False
+        try:
+            for chunk in response:
+                text.append(_delta_text(chunk))
+                yield chunk
+            completed = True
+        finally:
+            # Closing a stream the reader abandoned, e.g. for a disconnected client, aborts the request
+            if hasattr(response, 'close'):
+                response.close()
+            model = request.get('model', 'gpt-3.5-turbo')
+            used = count_message_tokens(request.get('messages', []), model) + count_tokens(''.join(text), model)
+            self.limiter.release(estimate, used, succeeded=completed)
+
+
+class AsyncRateLimitedClient(RateLimitedClient):
+    """RateLimitedClient for an AsyncOpenAI client"""
+
+    async def create(self, **kwargs):
+        estimate = self.limiter.estimate(kwargs)
+        attempt = 0
+        while True:
+            start = time.monotonic()
+            with span('queue_wait', estimated_tokens=estimate):
+                await self.limiter.aacquire(estimate)
+            record_wait(time.monotonic() - start)
+            try:
+                SENT.set(time.monotonic())
+                with span('attempt', number=attempt + 1):
+                    response = await self.client.chat.completions.create(**kwargs)
+            except asyncio.CancelledError:
+                self.limiter.release(estimate)
+                raise
+            except Exception as e:
+                self.limiter.release(estimate, throttled=self.limiter.is_throttle(e))
+                delay = self.limiter.backoff(attempt, e)
+                if delay is None:
+                    raise
+                print(f"rate_limiter.py: Retrying after {delay:.1f}s ({e})")
+                with span('backoff', seconds=round(delay, 3)):
+                    await asyncio.sleep(delay)
+                record_wait(delay)
+                attempt += 1
+                continue
+
+            if kwargs.get('stream'):
+                return self._astream(response, kwargs, estimate)
+            self.limiter.release(estimate, _usage(response), succeeded=True)
+            return response
+
+    async def _astream(self, response, request, estimate):
+        text = []
+        completed = False
+        try:
+            async for chunk in response:
+                text.append(_delta_text(chunk))
+                yield chunk
+            completed = True
+        finally:
+            if hasattr(response, 'close'):
+                await response.close()
+            model = request.get('model', 'gpt-3.5-turbo')
+            used = count_message_tokens(request.get('messages', []), model) + count_tokens(''.join(text), model)
+            self.limiter.release(estimate, used, succeeded=completed)
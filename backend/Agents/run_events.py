@@ -0,0 +1,200 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class RunEvents:
+    """In-memory event log per run that Server-Sent Events clients can replay and follow"""
+
+    def __init__(self, max_runs=100, heartbeat=15):
+        self.runs = OrderedDict()
+        self.max_runs = max_runs
+        self.heartbeat = heartbeat
+        self.condition = threading.Condition()
+        self.async_waiters = []
+
+    def open(self, run_id):
+        with self.condition:
+            self.runs[run_id] = {'events': [], 'closed': False}
+            # Forget the oldest runs so the log does not grow forever
+            while len(self.runs) > self.max_runs:
+                self.runs.popitem(last=False)
+
+    def exists(self, run_id):
+        with self.condition:
+            return run_id in self.runs
+
+    def history(self, run_id):
+        """Copy of a run's events so far and whether it has closed, or None for an unknown run"""
+        with self.condition:
+            run = self.runs.get(run_id)
+            if run is None:
+                return None
+            return {'events': list(run['events']), 'closed': run['closed']}
+
+    def publish(self, run_id, event, data):
+        with self.condition:
+            run = self.runs.get(run_id)
+            if run is None or run['closed']:
+                return
+            run['events'].append({
+                'id': len(run['events']) + 1,
+                'event': event,
+                'data': data
+            })
+            self._notify()
+
+    def close(self, run_id):
+        with self.condition:
+            if run_id in self.runs:
+                self.runs[run_id]['closed'] = True
+                self._notify()
+
+    def subscribe(self, run_id, last_event_id=0):
+        """Yield every event after last_event_id until the run closes.
+
+        Yields None when nothing happened for `heartbeat` seconds so the caller can
+        keep the connection alive.
+        """
+        position = last_event_id
+        while True:
+            with self.condition:
+                run = self.runs.get(run_id)
+                if run is not None and position >= len(run['events']) and not run['closed']:
+                    self.condition.wait(timeout=self.heartbeat)
+                    run = self.runs.get(run_id)
+                if run is None:
+                    return
+                new_events = run['events'][position:]
+                closed = run['closed']
+
+            if not new_events:
+                if closed:
+                    return
+                yield None
+                continue
+
+            for event in new_events:
+                yield event
+            position += len(new_events)
+
+    async def asubscribe(self, run_id, last_event_id=0):
+        """Async counterpart of subscribe that waits without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        position = last_event_id
+        while True:
+            waiter = None
+            with self.condition:
+                run = self.runs.get(run_id)
+                if run is None:
+                    return
+                new_events = run['events'][position:]
+                closed = run['closed']
+                if not new_events and not closed:
+                    waiter = loop.create_future()
+                    self.async_waiters.append((loop, waiter))
+
+            for event in new_events:
+                yield event
+            position += len(new_events)
+
+            if waiter is None:
+                if closed and not new_events:
+                    return
+                continue
+            try:
+                await asyncio.wait_for(waiter, timeout=self.heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+    def _notify(self):
+        """Wake blocking and async subscribers, called with the condition held"""
+        self.condition.notify_all()
+        for loop, waiter in self.async_waiters:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_wake, waiter)
+        self.async_waiters.clear()
+
+    @staticmethod
+    def last_event_id(header):
+        """The id of the last event a reconnecting client saw, replaying everything for a missing or malformed header"""
+        try:
+            return max(int(header or 0), 0)
+        except ValueError:
+            return 0
+
+    @staticmethod
+    def format_sse(event):
+        if event is None:
+            return ": keep-alive\n\n"
+        return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+class StoredRunEvents:
+    """Read-only RunEvents over the RunStore's event log, for web processes that queue runs.
+
+    Workers in other processes record every event in the shared store; subscribers poll it
+    every `poll` seconds. A run counts as closed once its stored status is no longer running.
+    """
+
+    def __init__(self, runs, poll=0.25, heartbeat=15):
+        self.runs = runs
+        self.poll = poll
+        self.heartbeat = heartbeat
+
+    def exists(self, run_id):
+        return self.runs.events_after(run_id)[0] is not None
+
+    def history(self, run_id):
+        events, closed = self.runs.events_after(run_id)
+        if events is None:
+            return None
+        return {'events': events, 'closed': closed}
+
+    def subscribe(self, run_id, last_event_id=0):
+        position, idle = last_event_id, 0.0
+        while True:
+            events, closed = self.runs.events_after(run_id, position)
+            if events is None:
+                return
+            for event in events:
+                yield event
+            if events:
+                position, idle = events[-1]['id'], 0.0
+                continue
+            if closed:
+                return
+            if idle >= self.heartbeat:
+                idle = 0.0
+                yield None
+            time.sleep(self.poll)
+            idle += self.poll
+
+    async def asubscribe(self, run_id, last_event_id=0):
+        position, idle = last_event_id, 0.0
+        while True:
+            # Reading the store in a thread keeps every other request on the event loop moving
+            events, closed = await asyncio.to_thread(self.runs.events_after, run_id, position)
+            if events is None:
+                return
+            for event in events:
+                yield event
+            if events:
+                position, idle = events[-1]['id'], 0.0
+                continue
+            if closed:
+                return
+            if idle >= self.heartbeat:
+                idle = 0.0
+                yield None
+            await asyncio.sleep(self.poll)
+            idle += self.poll
+
+    format_sse = RunEvents.format_sse
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
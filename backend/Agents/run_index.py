@@ -0,0 +1,169 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from .export import step_title
+
+WORD = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+STOPWORDS = {
+    'the', 'a', 'an', 'and', 'or', 'of', 'to', 'in', 'for', 'on', 'with', 'by', 'as', 'at', 'is', 'are',
+    'be', 'this', 'that', 'it', 'its', 'from', 'will', 'can', 'their', 'what', 'how', 'does', 'do', 'we', 'our'
+}
+
+
+def tokenize(text):
+    """Lowercase words and numbers without stopwords, with a plural s dropped"""
+    tokens = []
+    for word in WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def section_chunks(step, formatted, max_words=120):
+    """Split a step's formatted sections into chunks of at most max_words, keeping the section title"""
+    chunks = []
+    for section in (formatted or {}).get('sections') or []:
+        title = section.get('title') or step_title(step)
+        lines = list(section.get('content', []))
+        lines += [f"- {point}" for point in section.get('key_points', [])]
+        lines += [f"- {m['label']}: {m['value']}{' ' + m['unit'] if m.get('unit') else ''}"
+                  for m in section.get('metrics', [])]
+        current, words = [], 0
+        for line in lines:
+            if current and words + len(line.split()) > max_words:
+                chunks.append({'step': step, 'title': title, 'text': '\n'.join(current)})
+                current, words = [], 0
+            current.append(line)
+            words += len(line.split())
+        if current:
+            chunks.append({'step': step, 'title': title, 'text': '\n'.join(current)})
+    return chunks
+
+
+class RunIndex:
+    """BM25 index over one run's formatted sections, growing as its steps finish"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.chunks = []
+        self.terms = []  # Term counts per chunk
+        self.lengths = []
+        self.postings = {}  # term -> chunk indexes
+        self.total_length = 0
+        self.complete = False
+        self.lock = threading.Lock()
+
+    @property
+    def steps(self):
+        return {chunk['step'] for chunk in self.chunks}
+
+    def add(self, step, formatted):
+        """Index a step's sections, replacing what was indexed for it before"""
+        chunks = section_chunks(step, formatted)
+        with self.lock:
+            if any(chunk['step'] == step for chunk in self.chunks):
+                kept = [i for i, chunk in enumerate(self.chunks) if chunk['step'] != step]
+                self.chunks = [self.chunks[i] for i in kept]
+                self.terms = [self.terms[i] for i in kept]
+                self._rebuild()
+            for chunk in chunks:
+                # Titles and the step name are searchable too
+                terms = Counter(tokenize(f"{step_title(step)} {chunk['title']} {chunk['text']}"))
+                self._append(chunk, terms)
+
+    def search(self, query, k=5):
+        """The k best chunks for query, each with its BM25 score, best first"""
+        with self.lock:
+            count = len(self.chunks)
+            if not count:
+                return []
+            average = self.total_length / count
+            scores = Counter()
+            for term in set(tokenize(query)):
+                matches = self.postings.get(term, ())
+                if not matches:
+                    continue
+                idf = math.log(1 + (count - len(matches) + 0.5) / (len(matches) + 0.5))
+                for i in matches:
+                    tf = self.terms[i][term]
+                    norm = 1 - self.b + self.b * self.lengths[i] / average
+                    scores[i] += idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+            return [dict(self.chunks[i], score=round(score, 4)) for i, score in scores.most_common(k)]
+
+    def _append(self, chunk, terms):
+        index = len(self.chunks)
+        self.chunks.append(chunk)
+        self.terms.append(terms)
+        self.lengths.append(sum(terms.values()))
+        self.total_length += self.lengths[-1]
+        for term in terms:
+            self.postings.setdefault(term, []).append(index)
+
+    def _rebuild(self):
+        chunks, terms = self.chunks, self.terms
+        self.chunks, self.terms, self.lengths, self.postings, self.total_length = [], [], [], {}, 0
+        for chunk, counts in zip(chunks, terms):
+            self._append(chunk, counts)
+
+
+class RunIndexes:
+    """RunIndex per run, kept for the most recently queried runs.
+
+    The process running a run adds each step as it is formatted. Other processes, and runs
+    evicted from memory, are indexed from the RunStore on their next query, re-reading it
+    only while the run is still going.
+    """
+
+    def __init__(self, runs, max_runs=50):
+        self.runs = runs
+        self.max_runs = max_runs
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, run_id, step, formatted):
+        self._index(run_id).add(step, formatted)
+
+    def get(self, run_id):
+        """The run's index, brought up to date from the store if needed, or None for an unknown run"""
+        with self.lock:
+            index = self.indexes.get(run_id)
+        if index is None or not index.complete:
+            stored = self.runs.get(run_id)
+            if stored is None:
+                return None
+            index = self._index(run_id)
+            indexed = index.steps
+            for step, result in stored['steps'].items():
+                if result['formatted_result'] is not None and step not in indexed:
+                    index.add(step, result['formatted_result'])
+            index.complete = stored['status'] != 'running'
+        return index
+
+    def search(self, run_id, query, k=5):
+        """(chunks, milliseconds spent) for the query, or None for an unknown run"""
+        if not query or not query.strip():
+            raise ValueError("question is required")
+        if not isinstance(k, int) or not 1 <= k <= 20:
+            raise ValueError("k must be a number from 1 to 20")
+        start = time.perf_counter()
+        index = self.get(run_id)
+        if index is None:
+            return None
+        return index.search(query, k), (time.perf_counter() - start) * 1000
+
+    def _index(self, run_id):
+        with self.lock:
+            index = self.indexes.get(run_id)
+            if index is None:
+                index = self.indexes[run_id] = RunIndex()
+                while len(self.indexes) > self.max_runs:
+                    self.indexes.popitem(last=False)
+            self.indexes.move_to_end(run_id)
+            return index
@@ -0,0 +1,425 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def concept_hash(concept):
+    """Hash of a business concept, ignoring surrounding whitespace and case"""
+    return hashlib.sha256(' '.join(concept.split()).lower().encode('utf-8')).hexdigest()
+
+
+def input_hash(step, config, concept, upstream):
+    """Fingerprint of everything a step's agent reads: its config, the concept and its dependencies' outputs"""
+    inputs = {
+        'step': step,
+        'config': config,
+        'concept': ' '.join(concept.split()),
+        'upstream': {dep: hashlib.sha256(text.encode('utf-8')).hexdigest() for dep, text in upstream.items()}
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class RunStore:
+    """SQLite record of every run's concept, per-step outputs, timings, status and events.
+
+    Runs outlive the process and the in-memory session contexts, so past analyses can be
+    listed, fetched and reused by any worker without calling the agents again. Each
+    lookup is a single read on the run id, concept hash or creation time index. Several
+    processes can share one store; WAL lets web servers read while workers write.
+    """
+
+    def __init__(self, path, retention_days=30, max_runs=1000):
+        self.path = path
+        self.retention = retention_days * 24 * 3600
+        self.max_runs = max_runs
+        self.started = 0
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY,
+                session_id TEXT,
+                concept TEXT,
+                concept_hash TEXT,
+                status TEXT,
+                errors TEXT,
+                created_at REAL,
+                finished_at REAL
+            )
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS run_steps (
+                run_id TEXT,
+                step TEXT,
+                status TEXT,
+                raw_result TEXT,
+                formatted_result TEXT,
+                error TEXT,
+                started_at REAL,
+                raw_at REAL,
+                formatted_at REAL,
+                input_hash TEXT,
+                PRIMARY KEY (run_id, step)
+            )
+        """)
+        if 'input_hash' not in [column[1] for column in self.db.execute("PRAGMA table_info(run_steps)")]:
+            self.db.execute("ALTER TABLE run_steps ADD COLUMN input_hash TEXT")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_concept ON runs (concept_hash, created_at)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS runs_finished ON runs (status, finished_at)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS run_events (
+                run_id TEXT,
+                seq INTEGER,
+                event TEXT,
+                data TEXT,
+                PRIMARY KEY (run_id, seq)
+            )
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                concept TEXT,
+                run_id TEXT,
+                updated_at REAL
+            )
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS similar_lookups (
+                run_id TEXT,
+                concept TEXT,
+                match_run_id TEXT,
+                match_concept TEXT,
+                score REAL,
+                reused INTEGER,
+                created_at REAL
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS similar_lookups_created ON similar_lookups (created_at)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS run_spans (
+                run_id TEXT,
+                span_id TEXT,
+                parent_id TEXT,
+                name TEXT,
+                lane TEXT,
+                start REAL,
+                duration REAL,
+                attrs TEXT
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS run_spans_run ON run_spans (run_id)")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS document_briefs (
+                document_id TEXT PRIMARY KEY,
+                name TEXT,
+                settings TEXT,
+                brief TEXT,
+                tokens INTEGER,
+                chunks INTEGER,
+                created_at REAL
+            )
+        """)
+        self.db.commit()
+
+    @classmethod
+    def from_env(cls):
+        """Build the store from RUN_STORE_* settings, or None when RUN_STORE_PATH is empty"""
+        path = os.getenv('RUN_STORE_PATH', os.path.join(os.path.dirname(__file__), '..', 'cache', 'runs.sqlite3'))
+        if not path:
+            return None
+        print(f"run_store.py: Recording runs in {path}")
+        store = cls(
+            path,
+            retention_days=int(os.getenv('RUN_RETENTION_DAYS', 30)),
+            max_runs=int(os.getenv('RUN_MAX_COUNT', 1000))
+        )
+        store.compact()
+        return store
+
+    def start(self, run_id, session_id, concept):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, 'running', '{}', ?, NULL)",
+                (run_id, session_id, concept, concept_hash(concept), time.time())
+            )
+            self.db.commit()
+            self.started += 1
+        if self.started % 100 == 0:
+            self.compact()
+
+    def restart(self, run_id, session_id, concept):
+        """Start a run over, e.g. when a worker retries it, dropping the steps and events of the earlier attempt.
+
+        The event log is replaced by a run_restarted event that keeps its sequence number
+        going, so clients following the log from where they were see the new attempt.
+        """
+        with self.lock:
+            self.db.execute("DELETE FROM run_steps WHERE run_id = ?", (run_id,))
+            seq = self.db.execute("SELECT COALESCE(MAX(seq), 0) FROM run_events WHERE run_id = ?", (run_id,)).fetchone()[0]
+            self.db.execute("DELETE FROM run_events WHERE run_id = ?", (run_id,))
+            self.db.execute("INSERT INTO run_events VALUES (?, ?, 'run_restarted', '{}')", (run_id, seq + 1))
+            self.db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, 'running', '{}', ?, NULL)",
+                (run_id, session_id, concept, concept_hash(concept), time.time())
+            )
+            self.db.commit()
+
+    def record(self, run_id, event, data):
+        """Append a run event to the run's log and apply it to the stored run and steps.
+
+        Returns False, logging nothing, for a run_cancelled event of a run that is no longer
+        running, so the web process and the worker can both report the same cancellation.
+        """
+        now = time.time()
+        step = data.get('step')
+        if event == 'step_started':
+            sql, params = ("INSERT OR REPLACE INTO run_steps (run_id, step, status, started_at) VALUES (?, ?, 'running', ?)",
+                           (run_id, step, now))
+        elif event == 'raw_ready':
+            sql, params = ("INSERT INTO run_steps (run_id, step, status, raw_result, raw_at, input_hash) "
+                           "VALUES (?, ?, 'formatting', ?, ?, ?) "
+                           "ON CONFLICT (run_id, step) DO UPDATE SET status = excluded.status, "
+                           "raw_result = excluded.raw_result, raw_at = excluded.raw_at, input_hash = excluded.input_hash",
+                           (run_id, step, data['raw_result'], now, data.get('input_hash')))
+        elif event == 'formatted_ready':
+            sql, params = ("UPDATE run_steps SET status = 'complete', formatted_result = ?, formatted_at = ? "
+                           "WHERE run_id = ? AND step = ?",
+                           (json.dumps(data['formatted_result']), now, run_id, step))
+        elif event == 'error' and step:
+            sql, params = ("INSERT INTO run_steps (run_id, step, status, error) VALUES (?, ?, 'failed', ?) "
+                           "ON CONFLICT (run_id, step) DO UPDATE SET status = 'failed', error = excluded.error",
+                           (run_id, step, data['error']))
+        elif event == 'error':
+            sql, params = ("UPDATE runs SET status = 'failed', errors = ?, finished_at = ? WHERE run_id = ?",
+                           (json.dumps({'run': data['error']}), now, run_id))
+        elif event == 'run_cancelled':
+            sql, params = ("UPDATE runs SET status = 'cancelled', errors = ?, finished_at = ? "
+                           "WHERE run_id = ? AND status = 'running'",
+                           (json.dumps({'run': data['reason']}), now, run_id))
+        elif event == 'run_complete':
+            sql, params = ("UPDATE runs SET status = ?, errors = ?, finished_at = ? WHERE run_id = ?",
+                           ('failed' if data['errors'] else 'complete', json.dumps(data['errors']), now, run_id))
+        else:
+            sql, params = None, None
+        with self.lock:
+            if sql and self.db.execute(sql, params).rowcount == 0 and event == 'run_cancelled':
+                return False
+            self.db.execute(
+                "INSERT INTO run_events SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM run_events WHERE run_id = ?",
+                (run_id, event, json.dumps(data), run_id)
+            )
+            self.db.commit()
+        return True
+
+    def events_after(self, run_id, seq=0):
+        """The run's logged events after seq, shaped like RunEvents entries, and whether the run has ended"""
+        with self.lock:
+            status = self.db.execute("SELECT status FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if status is None:
+                return None, True
+            rows = self.db.execute(
+                "SELECT seq, event, data FROM run_events WHERE run_id = ? AND seq > ? ORDER BY seq", (run_id, seq)
+            ).fetchall()
+        events = [{'id': seq, 'event': event, 'data': json.loads(data)} for seq, event, data in rows]
+        return events, status[0] != 'running'
+
+    def running(self, session_id):
+        """Ids of the session's runs that are still running"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT run_id FROM runs WHERE session_id = ? AND status = 'running'", (session_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def cancelled(self, run_ids):
+        """{run_id: reason} for the given runs that have been cancelled"""
+        run_ids = list(run_ids)
+        if not run_ids:
+            return {}
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT run_id, errors FROM runs WHERE status = 'cancelled' AND run_id IN ({', '.join('?' * len(run_ids))})",
+                run_ids
+            ).fetchall()
+        return {run_id: json.loads(errors).get('run') for run_id, errors in rows}
+
+    def save_session(self, session_id, concept, run_id=None):
+        """Remember a session's concept and current run, for web processes that keep no session state"""
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?)", (session_id, concept, run_id, time.time()))
+            self.db.commit()
+
+    def session(self, session_id):
+        """{'concept', 'run_id'} saved for the session, or None"""
+        with self.lock:
+            row = self.db.execute("SELECT concept, run_id FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return {'concept': row[0], 'run_id': row[1]} if row else None
+
+    def get(self, run_id):
+        """The run with every step's outputs and timings, or None"""
+        with self.lock:
+            run = self.db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if run is None:
+                return None
+            steps = self.db.execute(
+                "SELECT step, status, raw_result, formatted_result, error, started_at, raw_at, formatted_at, input_hash "
+                "FROM run_steps WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        result = self._run(run)
+        result['steps'] = {
+            step: {
+                'status': status,
+                'raw_result': raw,
+                'formatted_result': json.loads(formatted) if formatted else None,
+                'error': error,
+                'seconds': raw_at - started_at if raw_at and started_at else None,
+                'format_seconds': formatted_at - raw_at if formatted_at and raw_at else None,
+                'input_hash': fingerprint
+            }
+            for step, status, raw, formatted, error, started_at, raw_at, formatted_at, fingerprint in steps
+        }
+        return result
+
+    def latest_complete(self, concept, steps=None):
+        """Id of the newest complete run for this concept that completed all of steps, or None"""
+        steps = list(steps or [])
+        with self.lock:
+            row = self.db.execute(
+                "SELECT run_id FROM runs WHERE concept_hash = ? AND status = 'complete' AND "
+                "(SELECT COUNT(*) FROM run_steps WHERE run_steps.run_id = runs.run_id AND run_steps.status = 'complete' "
+                f"AND step IN ({', '.join('?' * len(steps)) or 'NULL'})) = ? "
+                "ORDER BY created_at DESC LIMIT 1", (concept_hash(concept), *steps, len(steps))
+            ).fetchone()
+        return row[0] if row else None
+
+    def completed_since(self, finished_at=0.0, limit=1000):
+        """(run_id, concept, finished_at) of the newest complete runs that finished after finished_at, oldest first"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT run_id, concept, finished_at FROM runs WHERE status = 'complete' AND finished_at > ? "
+                "ORDER BY finished_at DESC LIMIT ?", (finished_at, limit)
+            ).fetchall()
+        return rows[::-1]
+
+    def step_result(self, run_id, step):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT raw_result FROM run_steps WHERE run_id = ? AND step = ?", (run_id, step)
+            ).fetchone()
+        return row[0] if row else None
+
+    def record_span(self, run_id, span):
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO run_spans VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (run_id, span['span_id'], span['parent_id'], span['name'], span['lane'], span['start'],
+                 span['duration'], json.dumps(span['attrs'], default=str))
+            )
+            self.db.commit()
+
+    def spans(self, run_id):
+        """The run's recorded trace spans, in the order they ended"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT span_id, parent_id, name, lane, start, duration, attrs FROM run_spans WHERE run_id = ? ORDER BY rowid",
+                (run_id,)
+            ).fetchall()
+        keys = ('span_id', 'parent_id', 'name', 'lane', 'start', 'duration')
+        return [dict(zip(keys, row), attrs=json.loads(row[6])) for row in rows]
+
+    def record_similar(self, run_id, concept, match, reused):
+        """Audit a near-duplicate concept lookup; match is (run_id, concept, score) or None"""
+        match_run_id, match_concept, score = match or (None, None, None)
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO similar_lookups VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (run_id, concept, match_run_id, match_concept, score, int(reused), time.time())
+            )
+            self.db.commit()
+
+    def similar_lookups(self, limit=50):
+        """Most recent near-duplicate lookups, newest first"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT run_id, concept, match_run_id, match_concept, score, reused, created_at "
+                "FROM similar_lookups ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        keys = ('run_id', 'concept', 'match_run_id', 'match_concept', 'score', 'reused', 'created_at')
+        return [dict(zip(keys, row), reused=bool(row[5])) for row in rows]
+
+    def save_brief(self, document_id, name, settings, brief, tokens, chunks):
+        """Store the brief of an ingested document, keyed by the hash of its text"""
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO document_briefs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (document_id, name, settings, brief, tokens, chunks, time.time())
+            )
+            self.db.commit()
+
+    def brief(self, document_id):
+        """{'document_id', 'name', 'settings', 'brief', 'tokens', 'chunks', 'created_at'} or None"""
+        with self.lock:
+            row = self.db.execute("SELECT * FROM document_briefs WHERE document_id = ?", (document_id,)).fetchone()
+        keys = ('document_id', 'name', 'settings', 'brief', 'tokens', 'chunks', 'created_at')
+        return dict(zip(keys, row)) if row else None
+
+    def list(self, limit=20, before=None, concept=None):
+        """Newest runs first, without step outputs; page with the last run's created_at as `before`"""
+        where, params = [], []
+        if before is not None:
+            where.append("created_at < ?")
+            params.append(before)
+        if concept:
+            where.append("concept_hash = ?")
+            params.append(concept_hash(concept))
+        sql = "SELECT * FROM runs"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        with self.lock:
+            rows = self.db.execute(sql + " ORDER BY created_at DESC LIMIT ?", params + [limit]).fetchall()
+        return [self._run(row) for row in rows]
+
+    def compact(self):
+        """Drop finished runs past the retention period or beyond max_runs, then shrink the WAL"""
+        with self.lock:
+            cutoff = time.time() - self.retention
+            kept = self.db.execute(
+                "SELECT created_at FROM runs ORDER BY created_at DESC LIMIT 1 OFFSET ?", (self.max_runs - 1,)
+            ).fetchone()
+            if kept:
+                cutoff = max(cutoff, kept[0])
+            removed = self.db.execute("DELETE FROM runs WHERE created_at < ? AND status != 'running'", (cutoff,)).rowcount
+            self.db.execute("DELETE FROM run_steps WHERE run_id NOT IN (SELECT run_id FROM runs)")
+            self.db.execute("DELETE FROM run_events WHERE run_id NOT IN (SELECT run_id FROM runs)")
+            self.db.execute("DELETE FROM run_spans WHERE run_id NOT IN (SELECT run_id FROM runs)")
+            self.db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.retention,))
+            self.db.execute("DELETE FROM similar_lookups WHERE created_at < ?", (time.time() - self.retention,))
+            self.db.execute("DELETE FROM document_briefs WHERE created_at < ?", (time.time() - self.retention,))
+            self.db.commit()
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        if removed:
+            print(f"run_store.py: Removed {removed} old runs")
+        return removed
+
+    @staticmethod
+    def _run(row):
+        run_id, session_id, concept, _, status, errors, created_at, finished_at = row
+        return {
+            'run_id': run_id,
+            'session_id': session_id,
+            'concept': concept,
+            'status': status,
+            'errors': json.loads(errors or '{}'),
+            'created_at': created_at,
+            'finished_at': finished_at
+        }
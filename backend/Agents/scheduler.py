@@ -0,0 +1,180 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from . import cancellation
+
+
+class DependencyScheduler:
+    """Runs pipeline steps concurrently as soon as their declared dependencies have finished"""
+
+    def __init__(self, config, max_workers=4, profiles=None):
+        self.config = config
+        self.max_workers = max_workers
+        self.profiles = profiles or {}
+
+    def dependencies(self, step):
+        return list(self.config.get(step, {}).get('dependencies', []))
+
+    def closure(self, steps):
+        """The given steps and everything they transitively depend on, in config order"""
+        needed = set()
+        pending = list(steps)
+        while pending:
+            step = pending.pop()
+            if step not in needed:
+                needed.add(step)
+                pending.extend(self.dependencies(step))
+        return [step for step in self.config if step in needed]
+
+    def select(self, profile=None, steps=None):
+        """Steps for a run: a named profile's or the given steps, with their dependencies; all steps by default"""
+        if profile and profile not in self.profiles:
+            raise ValueError(f"Unknown profile: {profile}")
+        requested = list(steps or []) + list(self.profiles.get(profile, []))
+        unknown = [step for step in requested if step not in self.config]
+        if unknown:
+            raise ValueError(f"Unknown steps: {unknown}")
+        return self.closure(requested) if requested else list(self.config)
+
+    def dependents(self, steps):
+        """The given steps and every step that transitively depends on one of them, in config order"""
+        affected = set(steps)
+        for step in self.topological_order({step: self.dependencies(step) for step in self.config}):
+            if any(dep in affected for dep in self.dependencies(step)):
+                affected.add(step)
+        return [step for step in self.config if step in affected]
+
+    def build_graph(self, steps=None):
+        """Map each step to its dependencies, rejecting unknown steps and cycles"""
+        steps = list(steps) if steps is not None else list(self.config.keys())
+        graph = {}
+        for step in steps:
+            missing = [dep for dep in self.dependencies(step) if dep not in steps]
+            if missing:
+                raise ValueError(f"Step '{step}' depends on steps that are not scheduled: {missing}")
+            graph[step] = self.dependencies(step)
+        self.topological_order(graph)
+        return graph
+
+    def topological_order(self, graph):
+        """Order steps so every step comes after its dependencies, keeping declaration order for ties"""
+        order = []
+        remaining = dict(graph)
+        while remaining:
+            ready = [step for step, deps in remaining.items() if all(dep in order for dep in deps)]
+            if not ready:
+                raise ValueError(f"Dependency cycle between steps: {list(remaining.keys())}")
+            for step in ready:
+                order.append(step)
+                del remaining[step]
+        return order
+
+    def run(self, run_step, steps=None, on_complete=None):
+        """Call run_step(step) for every step, starting each one once its inputs are ready.
+
+        Returns (results, errors). A failed step's dependents are never started and are
+        reported in errors as skipped. on_complete(step, result, error) is called for
+        every step as it finishes, fails or is skipped. When the current run is cancelled,
+        no further steps start and the run returns without waiting for the running ones.
+        """
+        graph = self.build_graph(steps)
+        pending = self.topological_order(graph)
+        results = {}
+        errors = {}
+        running = {}
+        cancelled = cancellation.current()
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or running:
+                if cancelled.cancelled:
+                    self._cancel(pending + list(running.values()), cancelled.reason, errors, on_complete)
+                    break
+
+                for step in self._ready_steps(graph, pending, results, errors, on_complete):
+                    # Each step runs in a copy of the caller's context, so it traces under the run
+                    running[executor.submit(contextvars.copy_context().run, run_step, step)] = step
+
+                if not running:
+                    break
+
+                done, _ = wait([*running, cancelled.stopped], return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in running:
+                        self._finish(running.pop(future), future, results, errors, on_complete)
+        finally:
+            # A sync LLM call cannot be interrupted; its thread finds the run cancelled when it returns
+            executor.shutdown(wait=not cancelled.cancelled, cancel_futures=True)
+
+        return results, errors
+
+    async def arun(self, run_step, steps=None, on_complete=None):
+        """Async counterpart of run, where run_step(step) is a coroutine function.
+
+        Cancelling the run cancels the running steps' tasks, aborting their LLM requests.
+        """
+        graph = self.build_graph(steps)
+        pending = self.topological_order(graph)
+        results = {}
+        errors = {}
+        running = {}
+        cancelled = cancellation.current()
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+        cancelled.on_cancel(lambda: stopped.done() or stopped.set_result(None), loop)
+
+        while pending or running:
+            if cancelled.cancelled:
+                for task in running:
+                    task.cancel()
+                await asyncio.gather(*running, return_exceptions=True)
+                self._cancel(pending + list(running.values()), cancelled.reason, errors, on_complete)
+                break
+
+            for step in self._ready_steps(graph, pending, results, errors, on_complete):
+                running[asyncio.ensure_future(run_step(step))] = step
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait([*running, stopped], return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task in running:
+                    self._finish(running.pop(task), task, results, errors, on_complete)
+
+        return results, errors
+
+    def _ready_steps(self, graph, pending, results, errors, on_complete):
+        """Remove and return the pending steps whose dependencies all succeeded"""
+        ready = []
+        for step in list(pending):
+            failed = [dep for dep in graph[step] if dep in errors]
+            if failed:
+                errors[step] = f"Skipped: dependency failed ({', '.join(failed)})"
+                pending.remove(step)
+                print(f"scheduler.py: Skipping {step}, failed dependencies: {failed}")
+                if on_complete:
+                    on_complete(step, None, errors[step])
+            elif all(dep in results for dep in graph[step]):
+                print(f"scheduler.py: Starting {step}")
+                pending.remove(step)
+                ready.append(step)
+        return ready
+
+    def _finish(self, step, future, results, errors, on_complete):
+        try:
+            results[step] = future.result()
+            print(f"scheduler.py: Finished {step}")
+        except Exception as e:
+            errors[step] = str(e)
+            print(f"scheduler.py: Error in {step}: {e}")
+        if on_complete:
+            on_complete(step, results.get(step), errors.get(step))
+
+    @staticmethod
+    def _cancel(steps, reason, errors, on_complete):
+        for step in steps:
+            errors[step] = f"Cancelled: {reason}"
+            print(f"scheduler.py: Cancelled {step}")
+            if on_complete:
+                on_complete(step, None, errors[step])
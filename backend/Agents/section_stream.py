@@ -0,0 +1,160 @@
+import json
+import re
+from typing import List, Union
+
+from pydantic import BaseModel, ValidationError, field_validator
+
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+class Metric(BaseModel):
+    label: str
+    value: str
+    unit: str = ''
+
+    @field_validator('value', 'unit', mode='before')
+    @classmethod
+    def _text(cls, value):
+        return '' if value is None else str(value)
+
+
+class Section(BaseModel):
+    title: str = ''
+    content: List[str] = []
+    key_points: List[str] = []
+    metrics: List[Metric] = []
+
+    @field_validator('content', 'key_points', mode='before')
+    @classmethod
+    def _paragraphs(cls, value: Union[str, list, None]):
+        # Models sometimes return a single string where the schema asks for a list
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [value]
+        return [str(item) for item in value]
+
+    @field_validator('metrics', mode='before')
+    @classmethod
+    def _drop_bad_metrics(cls, value):
+        return [metric for metric in value or [] if isinstance(metric, dict) and metric.get('label')]
+
+
+class SectionStreamParser:
+    """Incremental parser for {"sections": [...]} JSON arriving a few tokens at a time.
+
+    feed() returns each sections[i] object as soon as its closing brace arrives, validated
+    against Section. A fragment that does not parse is repaired if possible and otherwise
+    skipped, so one bad section does not lose the others.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.position = 0
+        self.in_array = False
+        self.done = False
+        self.depth = 0
+        self.start = None
+        self.in_string = False
+        self.escaped = False
+        self.skipped = 0
+
+    def feed(self, text: str) -> List[dict]:
+        self.buffer += text
+        sections = []
+        while not self.done and self.position < len(self.buffer):
+            if not self.in_array:
+                match = re.search(r'"sections"\s*:\s*\[', self.buffer[self.position:])
+                if not match:
+                    # Keep enough of the tail to match a key split across chunks
+                    self.position = max(self.position, len(self.buffer) - 16)
+                    break
+                self.position += match.end()
+                self.in_array = True
+                continue
+
+            char = self.buffer[self.position]
+            self.position += 1
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                if self.depth == 0 and char == '{':
+                    self.start = self.position - 1
+                self.depth += 1
+            elif char in '}]':
+                if self.depth == 0 and char == ']':
+                    self.done = True
+                    break
+                self.depth -= 1
+                if self.depth == 0 and self.start is not None:
+                    section = self._section(self.buffer[self.start:self.position])
+                    if section:
+                        sections.append(section)
+                    self.start = None
+        return sections
+
+    def finish(self) -> List[dict]:
+        """Salvage a section the stream cut off before it closed"""
+        if self.start is None:
+            return []
+        fragment = self.buffer[self.start:]
+        self.start = None
+
+        # Close the fragment as it stands, then at each earlier comma to drop a half-written value
+        cuts = [len(fragment)] + [i for i in range(len(fragment) - 1, 0, -1) if fragment[i] == ','][:20]
+        for cut in cuts:
+            section = self._load(self._close(fragment[:cut]))
+            if section:
+                return [section]
+        print(f"section_stream.py: Skipping truncated section: {fragment[:100]}...")
+        self.skipped += 1
+        return []
+
+    def _section(self, fragment: str):
+        section = self._load(fragment) or self._load(TRAILING_COMMA.sub(r'\1', fragment))
+        if section is None:
+            print(f"section_stream.py: Skipping malformed section: {fragment[:100]}...")
+            self.skipped += 1
+        return section
+
+    @staticmethod
+    def _load(fragment: str):
+        try:
+            return Section.model_validate(json.loads(fragment)).model_dump()
+        except (json.JSONDecodeError, ValidationError, TypeError):
+            return None
+
+    @staticmethod
+    def _close(fragment: str) -> str:
+        """Append the quote and brackets needed to close whatever is still open in fragment"""
+        stack = []
+        in_string = escaped = False
+        for char in fragment:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char in '{[':
+                stack.append('}' if char == '{' else ']')
+            elif char in '}]' and stack:
+                stack.pop()
+        return fragment + ('"' if in_string else '') + ''.join(reversed(stack))
+
+
+def parse_sections(text: str) -> dict:
+    """Parse a complete reply with the same repair rules as the streaming parser"""
+    parser = SectionStreamParser()
+    sections = parser.feed(text) + parser.finish()
+    return {"sections": sections}
@@ -0,0 +1,38 @@
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding('cl100k_base')
+    except Exception as e:
+        # tiktoken downloads its BPE tables on first use, which fails offline
+        print(f"tokens.py: WARNING - tiktoken unavailable for {model}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text, model='gpt-3.5-turbo'):
+    """Exact token count with tiktoken, or a close estimate when it is not available"""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly one token per word or punctuation mark, plus one per 8 characters of long words
+    pieces = re.findall(r"\w+|[^\w\s]", text)
+    return sum(1 + len(piece) // 8 for piece in pieces)
+
+
+def count_message_tokens(messages, model='gpt-3.5-turbo'):
+    """Tokens a chat request's messages use, including the per-message overhead"""
+    return sum(4 + count_tokens(message.get('content') or '', model) for message in messages) + 3
@@ -0,0 +1,187 @@
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# The span that work started from here belongs to; copied into threads at every executor boundary
+CURRENT = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    """One timed piece of a run, such as a step, an LLM call or a formatting task"""
+
+    def __init__(self, tracer, name, parent=None, run_id=None, lane=None, attrs=None):
+        self.tracer = tracer
+        self.name = name
+        self.parent = parent
+        self.run_id = run_id
+        self.lane = lane or (parent.lane if parent else 'main')
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attrs = dict(attrs or {})
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.ended = False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def child(self, name, lane=None, **attrs):
+        return Span(self.tracer, name, self, None, lane, attrs)
+
+    def end(self, **attrs):
+        """Record the span with its run, or drop it when it never became part of one"""
+        if self.ended:
+            return
+        self.ended = True
+        self.attrs.update(attrs)
+        duration = time.perf_counter() - self.started
+        run_id = self.resolve_run_id()
+        if run_id:
+            self.tracer.record(run_id, {
+                'span_id': self.span_id,
+                'parent_id': self.parent.span_id if self.parent else None,
+                'name': self.name,
+                'lane': self.lane,
+                'start': self.start,
+                'duration': duration,
+                'attrs': self.attrs
+            })
+
+    def resolve_run_id(self):
+        span = self
+        while span is not None:
+            if span.run_id:
+                return span.run_id
+            span = span.parent
+        return None
+
+
+class _NullSpan:
+    """Stands in for the current span when nothing is being traced"""
+
+    lane = 'main'
+
+    def set(self, **attrs):
+        pass
+
+    def child(self, name, lane=None, **attrs):
+        return self
+
+    def end(self, **attrs):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+def current():
+    return CURRENT.get() or NULL_SPAN
+
+
+@contextmanager
+def activate(span):
+    """Make span the parent of the spans started inside the block"""
+    token = CURRENT.set(span) if span is not NULL_SPAN else None
+    try:
+        yield span
+    finally:
+        if token is not None:
+            CURRENT.reset(token)
+
+
+@contextmanager
+def timed(started):
+    """Activate a started span for the block and end it afterwards, noting any error"""
+    with activate(started):
+        try:
+            yield started
+        except BaseException as e:
+            started.set(error=str(e) or type(e).__name__)
+            raise
+        finally:
+            started.end()
+
+
+def span(name, lane=None, **attrs):
+    """Time the block as a child of the current span; a no-op outside a traced run or request"""
+    return timed(current().child(name, lane, **attrs))
+
+
+class Tracer:
+    """Collects each run's spans into a tree and exports it in Chrome trace-event format.
+
+    Roots are started here, for an HTTP request or a run; everything below them, down to
+    LLM attempts and formatting, uses span() and finds its parent through CURRENT. A
+    request's spans are kept only once bind() ties the request to a run. Spans go to the
+    RunStore when there is one, so a run traced in a worker can be served by any web
+    process, and otherwise stay in memory for the latest max_runs runs.
+    """
+
+    def __init__(self, runs=None, max_runs=100):
+        self.runs = runs
+        self.max_runs = max_runs
+        self.traces = OrderedDict()
+        self.lock = threading.Lock()
+
+    def start(self, name, run_id=None, lane=None, **attrs):
+        """Start a span under the current one, or a root when there is none, without activating it"""
+        parent = CURRENT.get()
+        return Span(self, name, parent, run_id, lane, attrs)
+
+    def span(self, name, run_id=None, lane=None, **attrs):
+        return timed(self.start(name, run_id, lane, **attrs))
+
+    def bind(self, run_id):
+        """Tie the current request's spans to the run it started or asked about"""
+        span = CURRENT.get()
+        while span is not None:
+            if span.run_id is None:
+                span.run_id = run_id
+            span = span.parent
+
+    def record(self, run_id, data):
+        if self.runs:
+            self.runs.record_span(run_id, data)
+            return
+        with self.lock:
+            self.traces.setdefault(run_id, []).append(data)
+            self.traces.move_to_end(run_id)
+            while len(self.traces) > self.max_runs:
+                self.traces.popitem(last=False)
+
+    def spans(self, run_id):
+        if self.runs:
+            return self.runs.spans(run_id)
+        with self.lock:
+            return list(self.traces.get(run_id, []))
+
+    def chrome_trace(self, run_id):
+        """The run's spans as a Chrome trace-event JSON object, or None when none were recorded.
+
+        Open it in chrome://tracing or ui.perfetto.dev. Each lane, such as a step or its
+        formatting, is drawn as its own thread.
+        """
+        spans = sorted(self.spans(run_id), key=lambda s: s['start'])
+        if not spans:
+            return None
+        lanes = {}
+        events = []
+        for s in spans:
+            tid = lanes.setdefault(s['lane'], len(lanes) + 1)
+            events.append({
+                'name': s['name'],
+                'cat': s['name'].split(' ')[0],
+                'ph': 'X',
+                'ts': round(s['start'] * 1e6),
+                'dur': round(s['duration'] * 1e6),
+                'pid': 1,
+                'tid': tid,
+                'args': dict(s['attrs'], span_id=s['span_id'], parent_id=s['parent_id'])
+            })
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': 1, 'args': {'name': f"run {run_id}"}})
+        for lane, tid in lanes.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': lane}})
+            events.append({'name': 'thread_sort_index', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'sort_index': tid}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'run_id': run_id}}
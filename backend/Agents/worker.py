@@ -0,0 +1,159 @@
+import argparse
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+
+class Worker:
+    """Claims jobs from the JobQueue and runs them on an AgentHandler.
+
+    Up to `concurrency` jobs run at once, each on its own thread, while a heartbeat thread
+    renews their leases every lease/3 seconds. Every event a run publishes goes to the
+    shared RunStore, which is where web processes read results and progress from, and
+    where they cancel runs: a watcher checks the runs in progress every `poll` seconds.
+    """
+
+    def __init__(self, handler, queue, worker_id=None, concurrency=2, lease=60, poll=1.0):
+        if not handler.runs:
+            raise ValueError("Workers need the run store to publish results")
+        self.handler = handler
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.concurrency = concurrency
+        self.lease = lease
+        self.poll = poll
+        self.active = {}  # job_id: run_id, or None for other jobs
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+
+    def run(self):
+        """Work until stop() or Ctrl-C, then finish the jobs in progress"""
+        print(f"worker.py: Worker {self.worker_id} started with {self.concurrency} slots")
+        threading.Thread(target=self._heartbeat, daemon=True).start()
+        threading.Thread(target=self._watch_cancellations, daemon=True).start()
+        threads = [threading.Thread(target=self._loop, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            print(f"worker.py: Stopping, finishing {len(self.active)} jobs (Ctrl-C again to abandon them)")
+            self.stop()
+            for thread in threads:
+                thread.join()
+        print(f"worker.py: Worker {self.worker_id} stopped")
+
+    def stop(self):
+        self.stopping.set()
+
+    def run_once(self):
+        """Claim and run one job; False when the queue was empty"""
+        job = self.queue.claim(self.worker_id, self.lease)
+        if job is None:
+            return False
+        with self.lock:
+            self.active[job['job_id']] = job['payload'].get('run_id') if job['kind'] == 'run' else None
+        try:
+            self._execute(job)
+        finally:
+            with self.lock:
+                self.active.pop(job['job_id'], None)
+        return True
+
+    def _loop(self):
+        while not self.stopping.is_set():
+            if not self.run_once():
+                self.stopping.wait(self.poll)
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.lease / 3)
+            with self.lock:
+                active = list(self.active)
+            for job_id in active:
+                if not self.queue.heartbeat(job_id, self.worker_id, self.lease):
+                    print(f"worker.py: Lost the lease on job {job_id}")
+
+    def _watch_cancellations(self):
+        while True:
+            time.sleep(self.poll)
+            with self.lock:
+                run_ids = [run_id for run_id in self.active.values() if run_id]
+            for run_id, reason in self.handler.runs.cancelled(run_ids).items():
+                self.handler.cancellations.cancel(run_id, reason)
+
+    def _execute(self, job):
+        print(f"worker.py: Running {job['kind']} job {job['job_id']} (attempt {job['attempts']})")
+        if job['attempts'] > job['max_attempts']:
+            # Its workers kept dying, most likely on this job
+            self._give_up(job, "Job lease expired too many times")
+            return
+        try:
+            if job['kind'] == 'run':
+                # The run's trace starts with the time its job spent queued
+                with self.handler.tracer.span('job', job['payload']['run_id'], lane='worker', worker=self.worker_id,
+                                              attempt=job['attempts'],
+                                              queue_seconds=round(job['updated_at'] - job['created_at'], 6)):
+                    result = self._run(job['payload'], retry=job['attempts'] > 1)
+            elif job['kind'] == 'answer':
+                result = {'answer': self.handler.answer(job['payload']['question'], job['payload']['sources'])}
+            elif job['kind'] == 'document':
+                result = self.handler.ingest_document(job['payload']['text'], job['payload'].get('name', ''))
+            else:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+        except Exception as e:
+            traceback.print_exc()
+            if self.queue.fail(job['job_id'], self.worker_id, str(e)) == 'failed':
+                self._fail_run(job['payload'], str(e))
+            return
+        self.queue.complete(job['job_id'], self.worker_id, result)
+
+    def _run(self, payload, retry=False):
+        """Run every step for the payload's concept, publishing to the run the web process created"""
+        run_id = payload['run_id']
+        if self.handler.runs.cancelled([run_id]):
+            print(f"worker.py: Skipping run {run_id}, it was cancelled while queued")
+            return {'steps': [], 'errors': {}, 'cancelled': True}
+        if retry:
+            self.handler.runs.restart(run_id, payload['session_id'], payload['concept'])
+        try:
+            self.handler.prepare_run(run_id, payload)
+            result = self.handler.process_all({'session_id': run_id, 'steps': payload.get('steps')}, run_id)
+            return {'steps': list(result['raw_results']), 'errors': result['errors']}
+        finally:
+            self.handler.contexts.discard(run_id)
+
+    def _give_up(self, job, error):
+        self.queue.fail(job['job_id'], self.worker_id, error)
+        self._fail_run(job['payload'], error)
+
+    def _fail_run(self, payload, error):
+        if 'run_id' in payload:
+            self.handler.runs.record(payload['run_id'], 'run_complete', {'steps': [], 'errors': {'run': error}})
+
+
+def main():
+    from dotenv import load_dotenv
+    from .agent_handler import AgentHandler
+    from .job_queue import JobQueue
+
+    parser = argparse.ArgumentParser(description="Run queued analysis jobs")
+    parser.add_argument('--concurrency', type=int, default=int(os.getenv('WORKER_CONCURRENCY', 2)))
+    parser.add_argument('--lease', type=float, default=float(os.getenv('JOB_LEASE_SECONDS', 60)))
+    parser.add_argument('--poll', type=float, default=1.0)
+    args = parser.parse_args()
+
+    load_dotenv()
+    queue = JobQueue.from_env()
+    if queue is None:
+        raise SystemExit("worker.py: Set JOB_QUEUE_PATH to the queue shared with the web servers")
+    worker = Worker(AgentHandler(), queue, concurrency=args.concurrency, lease=args.lease, poll=args.poll)
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
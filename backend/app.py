@@ -1,7 +1,12 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from Agents.agent_handler import AgentHandler
+from Agents.agents.agent_chain import AgentChain
+from Agents.job_queue import JobFailed, JobQueue
+from Agents.queued_handler import QueuedAgentHandler
+from Agents.run_events import RunEvents
 from dotenv import load_dotenv
+from contextlib import ExitStack
 import os
 
 print("\napp.py: Loading environment variables...")
@@ -22,24 +27,47 @@ for key, value in env_vars.items():
         print(f"app.py: WARNING - {key} not found")
 
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('DOCUMENT_MAX_MB', 20)) * 1024 * 1024
 CORS(app, origins=["http://127.0.0.1:8000", "http://localhost:8000"])
 
-agent_handler = AgentHandler()
-stored_context = {}
+# With a job queue the agents run in `python -m Agents.worker` processes and this one keeps no state
+job_queue = JobQueue.from_env()
+agent_handler = QueuedAgentHandler(job_queue) if job_queue else AgentHandler()
+agent_chain = AgentChain(agent_handler)
+
+# Every request is timed as a trace span, kept with the run it starts or asks about
+@app.before_request
+def trace_request():
+    g.trace = ExitStack()
+    g.span = g.trace.enter_context(agent_handler.tracer.span(f"HTTP {request.method} {request.path}", lane='http',
+                                                             request_bytes=request.content_length or 0))
+
+@app.after_request
+def trace_response(response):
+    if 'span' in g:
+        g.span.set(status=response.status_code, response_bytes=response.content_length)
+    return response
+
+@app.teardown_request
+def end_trace(error=None):
+    if 'trace' in g:
+        g.trace.close()
 
 @app.route('/submit_context', methods=['POST'])
 def submit_context():
     data = request.get_json()
     custom_context = data.get('custom_context', '')
-    stored_context['custom_context'] = custom_context
-    print(f"\napp.py: Stored initial context: {custom_context}")
-    return jsonify({'success': True})
+    try:
+        session_id = agent_handler.submit_context(data.get('session_id'), custom_context)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    print(f"\napp.py: Stored initial context for session {session_id}: {custom_context}")
+    return jsonify({'success': True, 'session_id': session_id})
 
 @app.route('/process/<step>', methods=['POST'])
 def process_step(step):
     try:
         data = request.get_json() or {}
-        data['custom_context'] = stored_context.get('custom_context', '')
         print(f"\napp.py: Processing {step}")
         print(f"app.py: Sending data to agent_handler: {data}")
         
@@ -52,9 +80,222 @@ def process_step(step):
         print(f"app.py: Error processing {step}: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/process/<step>/stream', methods=['POST'])
+def process_step_stream(step):
+    if step not in agent_handler.agents:
+        return jsonify({"error": f"Unknown step: {step}"}), 404
+
+    data = request.get_json(silent=True) or {}
+    print(f"\napp.py: Streaming {step}")
+    try:
+        agent_handler.check_session(data.get('session_id'))
+        chunks = agent_handler.stream_request(step, data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Chunks are relayed to the client as soon as the model produces them
+    return Response(
+        stream_with_context(chunks),
+        mimetype='text/plain',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/process_all', methods=['POST'])
+def process_all():
+    try:
+        data = request.get_json() or {}
+        print(f"\napp.py: Processing all steps")
+
+        run_id = agent_handler.start_run(data)
+        return jsonify({"status": "processing", "run_id": run_id})
+    except Exception as e:
+        print(f"app.py: Error processing all steps: {e}")
+        return jsonify({"error": str(e)}), 500
+
+# Submit a concept and start every step in one call; /process/<step> then returns the run's results
+@app.route('/runs', methods=['POST'])
+def start_run():
+    data = request.get_json(silent=True) or {}
+    try:
+        started = agent_chain.start(data.get('custom_context', ''), data.get('session_id'), data.get('rerun', False),
+                                    data.get('profile'), data.get('steps'), data.get('document_id'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"status": "processing", **started}), 202
+
+# Business plans, reports or exported spreadsheets as JSON {"text", "name"} or as the raw text with
+# ?name=; returns their brief and the document_id that adds it to a POST /runs concept. With a job
+# queue, a new document is summarised by a worker: 202 with the job_id to poll /documents/jobs/<job_id>
+@app.route('/documents', methods=['POST'])
+def ingest_document():
+    data = (request.get_json(silent=True) or {}) if request.is_json else {'text': request.get_data(as_text=True)}
+    try:
+        result = agent_handler.ingest_document(data.get('text', ''), data.get('name') or request.args.get('name', ''))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(result), 202 if 'job_id' in result else 200
+
+@app.route('/documents/jobs/<job_id>', methods=['GET'])
+def document_job(job_id):
+    try:
+        result = agent_handler.document_job(job_id)
+    except JobFailed as e:
+        return jsonify({"error": str(e)}), 502
+    if result is None:
+        return jsonify({"error": f"Unknown document job: {job_id}"}), 404
+    return jsonify(result), 202 if 'job_id' in result else 200
+
+@app.route('/documents/<document_id>', methods=['GET'])
+def document_brief(document_id):
+    document = agent_handler.documents.get(document_id)
+    if document is None:
+        return jsonify({"error": f"Unknown document: {document_id}"}), 404
+    return jsonify({key: value for key, value in document.items() if key != 'settings'})
+
+# Analysis profiles for POST /runs, each with the dependencies its steps need
+@app.route('/profiles', methods=['GET'])
+def profiles():
+    scheduler = agent_handler.scheduler
+    return jsonify({
+        "profiles": {name: scheduler.select(name) for name in scheduler.profiles},
+        "dependencies": {step: scheduler.dependencies(step) for step in agent_handler.agents}
+    })
+
+# Past runs, newest first; page with ?before=<created_at of the last run>
+@app.route('/runs', methods=['GET'])
+def list_runs():
+    if not agent_handler.runs:
+        return jsonify({"error": "Run store is disabled"}), 404
+    before = request.args.get('before', type=float)
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    return jsonify({"runs": agent_handler.runs.list(limit, before, request.args.get('concept'))})
+
+# Incremental re-run: {"steps": [...]} to regenerate and/or an edited "custom_context";
+# steps whose inputs are unchanged are served from this run
+@app.route('/runs/<run_id>/regenerate', methods=['POST'])
+def regenerate_run(run_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        started = agent_chain.regenerate(run_id, data.get('steps') or [], data.get('custom_context'), data.get('session_id'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if started is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    return jsonify({"status": "processing", **started}), 202
+
+# Stop a run: no further steps start, queued formatting is dropped and unsent LLM calls are abandoned
+@app.route('/runs/<run_id>/cancel', methods=['POST'])
+def cancel_run(run_id):
+    try:
+        cancelled = agent_handler.cancel_run(run_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if cancelled is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    return jsonify({"status": "cancelling", "run_id": run_id}), 202
+
+@app.route('/runs/<run_id>', methods=['GET'])
+def run_status(run_id):
+    status = agent_chain.status(run_id)
+    if status is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    return jsonify(status)
+
+@app.route('/runs/<run_id>/results', methods=['GET'])
+def run_results(run_id):
+    stored = agent_handler.runs.get(run_id) if agent_handler.runs else None
+    if stored is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    return jsonify(stored)
+
+# ZIP of every step rendered server-side; ?format=html|txt|pdf|pptx for a single format
+@app.route('/runs/<run_id>/export', methods=['GET'])
+def export_run(run_id):
+    if not agent_handler.exporter:
+        return jsonify({"error": "Exports need the run store"}), 404
+    fmt = request.args.get('format', 'all')
+    try:
+        path = agent_handler.exporter.bundle(run_id, fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if path is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    return Response(
+        agent_handler.exporter.stream(path),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="business_analysis_{fmt}.zip"'}
+    )
+
+# Follow-up questions: {"question": ..., "k": 5}; only the k most relevant sections go to the model
+@app.route('/runs/<run_id>/ask', methods=['POST'])
+def ask_run(run_id):
+    data = request.get_json(silent=True) or {}
+    try:
+        result = agent_handler.ask(run_id, data.get('question', ''), data.get('k'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except JobFailed as e:
+        return jsonify({"error": str(e)}), 502
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 504
+    if result is None:
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+    return jsonify(result)
+
+# Chrome trace-event JSON of the run's spans; open it in chrome://tracing or ui.perfetto.dev
+@app.route('/runs/<run_id>/trace', methods=['GET'])
+def run_trace(run_id):
+    trace = agent_handler.tracer.chrome_trace(run_id)
+    if trace is None:
+        return jsonify({"error": f"No trace for run: {run_id}"}), 404
+    return jsonify(trace)
+
+@app.route('/runs/<run_id>/events', methods=['GET'])
+def run_events(run_id):
+    if not agent_handler.events.exists(run_id):
+        return jsonify({"error": f"Unknown run: {run_id}"}), 404
+
+    # Browsers send Last-Event-ID when they reconnect, replay only what they missed
+    last_event_id = RunEvents.last_event_id(request.headers.get('Last-Event-ID'))
+    print(f"\napp.py: Streaming events for run {run_id} from event {last_event_id}")
+
+    # A run whose clients all disconnect for good is cancelled
+    def stream():
+        for event in agent_handler.followers.subscribe(run_id, last_event_id):
+            yield RunEvents.format_sse(event)
+
+    return Response(
+        stream_with_context(stream()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    if not agent_handler.cache:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **agent_handler.cache.stats()})
+
+# Near-duplicate concept reuse: hit rate and the most recent lookups with their scores
+@app.route('/similar_concepts', methods=['GET'])
+def similar_concepts():
+    if not agent_handler.similar:
+        return jsonify({"enabled": False})
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    return jsonify({"enabled": True, **agent_handler.similar.stats(),
+                    "lookups": agent_handler.runs.similar_lookups(limit)})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(agent_handler.metrics.render(), content_type=agent_handler.metrics.CONTENT_TYPE)
+
+# Polling fallback for clients that do not use the run event stream
 @app.route('/get_formatted_result/<step>', methods=['GET'])
 def get_formatted_result(step):
-    result = agent_handler.get_formatted_result(step)
+    try:
+        result = agent_handler.get_formatted_result(step, request.args.get('session_id'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(result)
 
 if __name__ == '__main__':
@@ -0,0 +1,348 @@
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.agents.agent_chain import AgentChain
+from Agents.job_queue import JobFailed, JobQueue
+from Agents.queued_handler import AsyncQueuedAgentHandler
+from Agents.run_events import RunEvents
+from dotenv import load_dotenv
+import inspect
+import os
+import uvicorn
+
+# ASGI variant of app.py: the same routes, served from one event loop.
+# Run with: uvicorn asgi_app:app --port 5000
+print("\nasgi_app.py: Loading environment variables...")
+load_dotenv()
+
+job_queue = JobQueue.from_env()
+agent_handler = AsyncQueuedAgentHandler(job_queue) if job_queue else AsyncAgentHandler()
+agent_chain = AgentChain(agent_handler)
+max_document_bytes = int(os.getenv('DOCUMENT_MAX_MB', 20)) * 1024 * 1024
+
+
+class TraceRequests:
+    """Times every request as a trace span, kept with the run it starts or asks about"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        with agent_handler.tracer.span(f"HTTP {scope['method']} {scope['path']}", lane='http') as traced:
+            async def send_traced(message):
+                if message['type'] == 'http.response.start':
+                    traced.set(status=message['status'])
+                await send(message)
+            await self.app(scope, receive, send_traced)
+
+
+async def _json(request):
+    try:
+        return await request.json() or {}
+    except ValueError:
+        return {}
+
+
+async def submit_context(request):
+    data = await _json(request)
+    custom_context = data.get('custom_context', '')
+    try:
+        session_id = await agent_handler.blocking(agent_handler.submit_context, data.get('session_id'), custom_context)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    print(f"\nasgi_app.py: Stored initial context for session {session_id}: {custom_context}")
+    return JSONResponse({'success': True, 'session_id': session_id})
+
+
+async def process_step(request):
+    step = request.path_params['step']
+    try:
+        data = await _json(request)
+        print(f"\nasgi_app.py: Processing {step}")
+        result = await agent_handler.process_request(step, data)
+        return JSONResponse(result)
+    except Exception as e:
+        print(f"asgi_app.py: Error processing {step}: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def process_step_stream(request):
+    step = request.path_params['step']
+    if step not in agent_handler.agents:
+        return JSONResponse({"error": f"Unknown step: {step}"}, status_code=404)
+
+    data = await _json(request)
+    try:
+        agent_handler.check_session(data.get('session_id'))
+        chunks = agent_handler.stream_request(step, data)
+        if inspect.isawaitable(chunks):
+            # Queued runs are streamed whole, so the step's result is checked before responding
+            chunks = await chunks
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+
+    print(f"\nasgi_app.py: Streaming {step}")
+    return StreamingResponse(
+        chunks,
+        media_type='text/plain',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def process_all(request):
+    try:
+        data = await _json(request)
+        print(f"\nasgi_app.py: Processing all steps")
+        run_id = await agent_handler.blocking(agent_handler.start_run, data)
+        return JSONResponse({"status": "processing", "run_id": run_id})
+    except Exception as e:
+        print(f"asgi_app.py: Error processing all steps: {e}")
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+async def start_run(request):
+    data = await _json(request)
+    try:
+        started = await agent_handler.blocking(
+            agent_chain.start, data.get('custom_context', ''), data.get('session_id'), data.get('rerun', False),
+            data.get('profile'), data.get('steps'), data.get('document_id')
+        )
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse({"status": "processing", **started}, status_code=202)
+
+
+async def ingest_document(request):
+    # Refuse oversized uploads before reading them when the size is declared
+    if int(request.headers.get('content-length') or 0) > max_document_bytes:
+        return JSONResponse({"error": "Document is too large"}, status_code=413)
+    body = await request.body()
+    if len(body) > max_document_bytes:
+        return JSONResponse({"error": "Document is too large"}, status_code=413)
+    if request.headers.get('content-type', '').startswith('application/json'):
+        data = await _json(request)
+    else:
+        data = {'text': body.decode('utf-8', errors='replace')}
+    try:
+        result = await agent_handler.ingest_document(data.get('text', ''), data.get('name') or request.query_params.get('name', ''))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(result, status_code=202 if 'job_id' in result else 200)
+
+
+async def document_job(request):
+    job_id = request.path_params['job_id']
+    try:
+        result = await agent_handler.blocking(agent_handler.document_job, job_id)
+    except JobFailed as e:
+        return JSONResponse({"error": str(e)}, status_code=502)
+    if result is None:
+        return JSONResponse({"error": f"Unknown document job: {job_id}"}, status_code=404)
+    return JSONResponse(result, status_code=202 if 'job_id' in result else 200)
+
+
+async def document_brief(request):
+    document_id = request.path_params['document_id']
+    document = await agent_handler.blocking(agent_handler.documents.get, document_id)
+    if document is None:
+        return JSONResponse({"error": f"Unknown document: {document_id}"}, status_code=404)
+    return JSONResponse({key: value for key, value in document.items() if key != 'settings'})
+
+
+async def profiles(request):
+    scheduler = agent_handler.scheduler
+    return JSONResponse({
+        "profiles": {name: scheduler.select(name) for name in scheduler.profiles},
+        "dependencies": {step: scheduler.dependencies(step) for step in agent_handler.agents}
+    })
+
+
+async def regenerate_run(request):
+    run_id = request.path_params['run_id']
+    data = await _json(request)
+    try:
+        started = await agent_handler.blocking(
+            agent_chain.regenerate, run_id, data.get('steps') or [], data.get('custom_context'), data.get('session_id')
+        )
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if started is None:
+        return JSONResponse({"error": f"Unknown run: {run_id}"}, status_code=404)
+    return JSONResponse({"status": "processing", **started}, status_code=202)
+
+
+async def list_runs(request):
+    if not agent_handler.runs:
+        return JSONResponse({"error": "Run store is disabled"}, status_code=404)
+    try:
+        before = float(request.query_params['before']) if 'before' in request.query_params else None
+        limit = min(int(request.query_params.get('limit', 20)), 100)
+    except ValueError:
+        return JSONResponse({"error": "before and limit must be numbers"}, status_code=400)
+    runs = await agent_handler.blocking(agent_handler.runs.list, limit, before, request.query_params.get('concept'))
+    return JSONResponse({"runs": runs})
+
+
+async def run_results(request):
+    run_id = request.path_params['run_id']
+    stored = await agent_handler.blocking(agent_handler.runs.get, run_id) if agent_handler.runs else None
+    if stored is None:
+        return JSONResponse({"error": f"Unknown run: {run_id}"}, status_code=404)
+    return JSONResponse(stored)
+
+
+async def cancel_run(request):
+    run_id = request.path_params['run_id']
+    try:
+        cancelled = await agent_handler.blocking(agent_handler.cancel_run, run_id)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if cancelled is None:
+        return JSONResponse({"error": f"Unknown run: {run_id}"}, status_code=404)
+    return JSONResponse({"status": "cancelling", "run_id": run_id}, status_code=202)
+
+
+async def run_status(request):
+    run_id = request.path_params['run_id']
+    status = await agent_handler.blocking(agent_chain.status, run_id)
+    if status is None:
+        return JSONResponse({"error": f"Unknown run: {run_id}"}, status_code=404)
+    return JSONResponse(status)
+
+
+async def export_run(request):
+    run_id = request.path_params['run_id']
+    if not agent_handler.exporter:
+        return JSONResponse({"error": "Exports need the run store"}, status_code=404)
+    fmt = request.query_params.get('format', 'all')
+    try:
+        path = await run_in_threadpool(agent_handler.exporter.bundle, run_id, fmt)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if path is None:
+        return JSONResponse({"error": f"Unknown run: {run_id}"}, status_code=404)
+    return StreamingResponse(
+        agent_handler.exporter.stream(path),
+        media_type='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="business_analysis_{fmt}.zip"'}
+    )
+
+
+async def ask_run(request):
+    run_id = request.path_params['run_id']
+    data = await _json(request)
+    try:
+        result = await agent_handler.ask(run_id, data.get('question', ''), data.get('k'))
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except JobFailed as e:
+        return JSONResponse({"error": str(e)}, status_code=502)
+    except TimeoutError as e:
+        return JSONResponse({"error": str(e)}, status_code=504)
+    if result is None:
+        return JSONResponse({"error": f"Unknown run: {run_id}"}, status_code=404)
+    return JSONResponse(result)
+
+
+async def run_trace(request):
+    run_id = request.path_params['run_id']
+    trace = await agent_handler.blocking(agent_handler.tracer.chrome_trace, run_id)
+    if trace is None:
+        return JSONResponse({"error": f"No trace for run: {run_id}"}, status_code=404)
+    return JSONResponse(trace)
+
+
+async def run_events(request):
+    run_id = request.path_params['run_id']
+    if not await agent_handler.blocking(agent_handler.events.exists, run_id):
+        return JSONResponse({"error": f"Unknown run: {run_id}"}, status_code=404)
+
+    last_event_id = RunEvents.last_event_id(request.headers.get('Last-Event-ID'))
+
+    async def stream():
+        async for event in agent_handler.followers.asubscribe(run_id, last_event_id):
+            yield RunEvents.format_sse(event)
+
+    return StreamingResponse(
+        stream(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def cache_stats(request):
+    if not agent_handler.cache:
+        return JSONResponse({"enabled": False})
+    return JSONResponse({"enabled": True, **agent_handler.cache.stats()})
+
+
+async def similar_concepts(request):
+    if not agent_handler.similar:
+        return JSONResponse({"enabled": False})
+    try:
+        limit = min(int(request.query_params.get('limit', 50)), 500)
+    except ValueError:
+        return JSONResponse({"error": "limit must be a number"}, status_code=400)
+    stats = await agent_handler.blocking(agent_handler.similar.stats)
+    lookups = await agent_handler.blocking(agent_handler.runs.similar_lookups, limit)
+    return JSONResponse({"enabled": True, **stats, "lookups": lookups})
+
+
+async def metrics(request):
+    return Response(agent_handler.metrics.render(), media_type=agent_handler.metrics.CONTENT_TYPE)
+
+
+async def get_formatted_result(request):
+    try:
+        result = await agent_handler.blocking(
+            agent_handler.get_formatted_result, request.path_params['step'], request.query_params.get('session_id')
+        )
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse(result)
+
+
+app = Starlette(
+    routes=[
+        Route('/submit_context', submit_context, methods=['POST']),
+        Route('/process/{step}', process_step, methods=['POST']),
+        Route('/process/{step}/stream', process_step_stream, methods=['POST']),
+        Route('/process_all', process_all, methods=['POST']),
+        Route('/runs', start_run, methods=['POST']),
+        Route('/runs', list_runs, methods=['GET']),
+        Route('/documents', ingest_document, methods=['POST']),
+        Route('/documents/jobs/{job_id}', document_job, methods=['GET']),
+        Route('/documents/{document_id}', document_brief, methods=['GET']),
+        Route('/profiles', profiles, methods=['GET']),
+        Route('/runs/{run_id}', run_status, methods=['GET']),
+        Route('/runs/{run_id}/regenerate', regenerate_run, methods=['POST']),
+        Route('/runs/{run_id}/cancel', cancel_run, methods=['POST']),
+        Route('/runs/{run_id}/results', run_results, methods=['GET']),
+        Route('/runs/{run_id}/export', export_run, methods=['GET']),
+        Route('/runs/{run_id}/ask', ask_run, methods=['POST']),
+        Route('/runs/{run_id}/trace', run_trace, methods=['GET']),
+        Route('/runs/{run_id}/events', run_events, methods=['GET']),
+        Route('/cache_stats', cache_stats, methods=['GET']),
+        Route('/similar_concepts', similar_concepts, methods=['GET']),
+        Route('/metrics', metrics, methods=['GET']),
+        Route('/get_formatted_result/{step}', get_formatted_result, methods=['GET'])
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=["http://127.0.0.1:8000", "http://localhost:8000"],
+            allow_methods=["*"],
+            allow_headers=["*"]
+        ),
+        Middleware(TraceRequests)
+    ]
+)
+
+if __name__ == '__main__':
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,175 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from config.ai_models import AI_CONFIG
+from format_handler import format_analysis
+from Agents.llm_cache import SEED_FILES
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+
+class LatencyModel:
+    """Time to first token, sampled from 'fixed:S', 'uniform:LOW,HIGH' or 'lognormal:MEDIAN,SIGMA'"""
+
+    def __init__(self, spec='lognormal:0.5,0.4', seed=None):
+        kind, _, params = spec.partition(':')
+        self.kind = kind
+        self.params = [float(p) for p in params.split(',') if p]
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self.random = random.Random(seed)
+
+    def sample(self):
+        if self.kind == 'fixed':
+            return self.params[0]
+        if self.kind == 'uniform':
+            return self.random.uniform(*self.params)
+        median, sigma = self.params
+        return median * self.random.lognormvariate(0, sigma)
+
+
+class FakeOpenAI:
+    """OpenAI-compatible /v1/chat/completions that replays the sample analyses in backend/data.
+
+    Agent calls are recognised by their system role from AI_CONFIG and answered with that
+    step's sample; formatting calls get the sample parsed into sections JSON. Latency,
+    per-chunk streaming delay and injected errors are configurable, so benchmarks exercise
+    the real client, scheduler and cache code paths without the network.
+    """
+
+    def __init__(self, latency='lognormal:0.5,0.4', chunk_delay=0.0, errors='', data_dir=DATA_DIR, seed=None):
+        self.latency = LatencyModel(latency, seed)
+        self.chunk_delay = chunk_delay
+        # 'STATUS:RATE,...', e.g. '429:0.02,500:0.01'
+        self.errors = [(int(status), float(rate)) for status, rate in
+                       (item.split(':') for item in errors.split(',') if item)]
+        self.random = random.Random(seed)
+        self.samples = {}
+        for step, filename in SEED_FILES.items():
+            path = os.path.join(data_dir, filename)
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    self.samples[step] = f.read()
+        self.requests = 0
+        self.app = Starlette(routes=[
+            Route('/v1/chat/completions', self.chat_completions, methods=['POST']),
+            Route('/v1/models', self.models, methods=['GET'])
+        ])
+
+    def reply_for(self, messages):
+        system = next((m['content'] for m in messages if m['role'] == 'system'), '')
+        user = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), '')
+        if system.lstrip().startswith('Format this business analysis'):
+            return json.dumps(format_analysis(user))
+        for step, config in AI_CONFIG.items():
+            if system.startswith(config['system_role']):
+                # The deck has no recorded sample; it replays the strategy analysis
+                return self.samples.get(step) or self.samples.get('strategy', '')
+        return self.samples.get('strategy', '')
+
+    async def chat_completions(self, request):
+        self.requests += 1
+        body = await request.json()
+        await asyncio.sleep(self.latency.sample())
+
+        error = self._injected_error()
+        if error:
+            return error
+
+        content = self.reply_for(body.get('messages', []))
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get('model', 'gpt-3.5-turbo')
+        prompt_tokens = sum(len(m.get('content') or '') for m in body.get('messages', [])) // 4
+        completion_tokens = len(content) // 4
+
+        if body.get('stream'):
+            return StreamingResponse(self._stream(completion_id, model, content), media_type='text/event-stream')
+        return JSONResponse({
+            'id': completion_id,
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        })
+
+    async def models(self, request):
+        return JSONResponse({'object': 'list', 'data': [{'id': 'gpt-3.5-turbo', 'object': 'model'}]})
+
+    async def _stream(self, completion_id, model, content):
+        words = content.split(' ')
+        pieces = [word + ' ' for word in words[:-1]] + words[-1:]
+        for i, piece in enumerate(pieces):
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        final = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]}
+        yield f"data: {json.dumps(final)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    def _injected_error(self):
+        roll = self.random.random()
+        for status, rate in self.errors:
+            if roll < rate:
+                headers = {'retry-after-ms': '200'} if status == 429 else {}
+                kind = 'rate_limit_exceeded' if status == 429 else 'server_error'
+                return JSONResponse({'error': {'message': f"Injected {status}", 'type': kind, 'code': kind}},
+                                    status_code=status, headers=headers)
+            roll -= rate
+        return None
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(app, port=None):
+    """Run an ASGI app with uvicorn on a background thread, returning (server, base url)"""
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Fake OpenAI server did not start")
+        time.sleep(0.01)
+    return server, f"http://127.0.0.1:{port}"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve a local OpenAI-compatible API that replays backend/data")
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--latency', default='lognormal:0.5,0.4', help="fixed:S, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA")
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help="Seconds between streamed chunks")
+    parser.add_argument('--errors', default='', help="Injected error rates, e.g. 429:0.02,500:0.01")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.latency, args.chunk_delay, args.errors)
+    print(f"fake_openai.py: Serving on http://127.0.0.1:{args.port}/v1, set OPENAI_BASE_URL to use it")
+    uvicorn.run(fake.app, host='127.0.0.1', port=args.port)
@@ -0,0 +1,162 @@
+import argparse
+import json
+import math
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from werkzeug.serving import make_server
+
+from .fake_openai import FakeOpenAI, free_port, serve_in_thread
+
+CONCEPT = "A 3D modeling business serving the overlanding community"
+
+
+def percentile(values, p):
+    """Nearest-rank percentile, None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered), max(1, math.ceil(p / 100 * len(ordered)))) - 1]
+
+
+def rss_mb():
+    """Current resident set size, falling back to the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def start_app(fake_url, cache, rpm, tpm):
+    """Import app.py against the fake server and serve it on a background thread"""
+    os.environ['OPENAI_BASE_URL'] = f"{fake_url}/v1"
+    # The fake server has no provider limits, so by default only the app's own scheduling is measured
+    os.environ['OPENAI_RPM'] = str(rpm)
+    os.environ['OPENAI_TPM'] = str(tpm)
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+    if not cache:
+        # The run store would otherwise serve a repeated concept from its earlier run
+        os.environ['LLM_CACHE_PATH'] = ''
+        os.environ['RUN_STORE_PATH'] = ''
+    import app as flask_app
+
+    port = free_port()
+    server = make_server('127.0.0.1', port, flask_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def run_once(client, base_url, concept):
+    """Submit a concept, run every step and follow the event stream until the run completes"""
+    session_id = uuid.uuid4().hex
+    start = time.monotonic()
+    response = client.post(f"{base_url}/runs", json={'session_id': session_id, 'custom_context': concept})
+    response.raise_for_status()
+    run_id = response.json()['run_id']
+
+    started, steps, errors = {}, {}, []
+    event = None
+    with client.stream('GET', f"{base_url}/runs/{run_id}/events") as stream:
+        for line in stream.iter_lines():
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            elif line.startswith('data: ') and event:
+                data = json.loads(line[len('data: '):])
+                now = time.monotonic()
+                if event == 'step_started':
+                    started[data['step']] = now
+                elif event == 'raw_ready' and data['step'] in started:
+                    steps[data['step']] = now - started[data['step']]
+                elif event == 'error':
+                    errors.append(data)
+                elif event == 'run_complete':
+                    errors.extend({'step': step, 'error': error} for step, error in data['errors'].items())
+                    break
+    return {'seconds': time.monotonic() - start, 'steps': steps, 'errors': errors}
+
+
+def run_level(base_url, concurrency, runs):
+    """Run `runs` analyses with `concurrency` simultaneous users and summarise them"""
+    with httpx.Client(timeout=300) as client, ThreadPoolExecutor(concurrency) as pool:
+        start = time.monotonic()
+        results = list(pool.map(lambda i: run_once(client, base_url, f"{CONCEPT} #{i}"), range(runs)))
+        elapsed = time.monotonic() - start
+
+    step_latencies = {}
+    for result in results:
+        for step, seconds in result['steps'].items():
+            step_latencies.setdefault(step, []).append(seconds)
+    run_seconds = [result['seconds'] for result in results]
+    failed = sum(1 for result in results if result['errors'])
+    return {
+        'concurrency': concurrency,
+        'runs': runs,
+        'failed_runs': failed,
+        'throughput_runs_per_second': runs / elapsed,
+        'run_p50': percentile(run_seconds, 50),
+        'run_p95': percentile(run_seconds, 95),
+        'steps': {step: {'p50': percentile(values, 50), 'p95': percentile(values, 95)}
+                  for step, values in step_latencies.items()},
+        'rss_mb': rss_mb()
+    }
+
+
+def print_level(level):
+    print(f"\nconcurrency {level['concurrency']}: {level['runs']} runs, {level['failed_runs']} failed, "
+          f"{level['throughput_runs_per_second']:.2f} runs/s, run p50 {level['run_p50']:.2f}s "
+          f"p95 {level['run_p95']:.2f}s, RSS {level['rss_mb']:.0f} MB")
+    for step, latency in level['steps'].items():
+        print(f"  {step:<14} p50 {latency['p50']:.2f}s  p95 {latency['p95']:.2f}s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the app.py endpoints against a local fake OpenAI server")
+    parser.add_argument('--concurrency', default='1,2,4,8', help="Comma-separated concurrent users per level")
+    parser.add_argument('--runs', type=int, default=0, help="Runs per level, default twice the concurrency")
+    parser.add_argument('--latency', default='lognormal:0.3,0.4', help="Fake server latency distribution")
+    parser.add_argument('--chunk-delay', type=float, default=0.0)
+    parser.add_argument('--errors', default='', help="Injected error rates, e.g. 429:0.02,500:0.01")
+    parser.add_argument('--cache', action='store_true', help="Keep the LLM response cache and run store enabled")
+    parser.add_argument('--rpm', type=int, default=0, help="Rate limiter requests per minute, 0 for no limit")
+    parser.add_argument('--tpm', type=int, default=0, help="Rate limiter tokens per minute, 0 for no limit")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Write the results as JSON to this file")
+    parser.add_argument('--max-run-p95', type=float, help="Exit non-zero if any level's run p95 exceeds this")
+    parser.add_argument('--max-failed', type=int, default=None, help="Exit non-zero if more runs than this fail")
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.latency, args.chunk_delay, args.errors, seed=args.seed)
+    fake_server, fake_url = serve_in_thread(fake.app)
+    app_server, base_url = start_app(fake_url, args.cache, args.rpm, args.tpm)
+
+    levels = []
+    for concurrency in (int(c) for c in args.concurrency.split(',')):
+        level = run_level(base_url, concurrency, args.runs or 2 * concurrency)
+        levels.append(level)
+        print_level(level)
+
+    app_server.shutdown()
+    fake_server.should_exit = True
+    print(f"\nrun_benchmark.py: Fake server answered {fake.requests} requests")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': vars(args), 'levels': levels}, f, indent=2)
+
+    failures = []
+    if args.max_run_p95 is not None:
+        failures += [f"run p95 {level['run_p95']:.2f}s > {args.max_run_p95}s at concurrency {level['concurrency']}"
+                     for level in levels if level['run_p95'] > args.max_run_p95]
+    if args.max_failed is not None:
+        failures += [f"{level['failed_runs']} failed runs at concurrency {level['concurrency']}"
+                     for level in levels if level['failed_runs'] > args.max_failed]
+    for failure in failures:
+        print(f"run_benchmark.py: FAIL - {failure}")
+    sys.exit(1 if failures else 0)
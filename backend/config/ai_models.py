@@ -1,20 +1,99 @@
+# Each step's 'agent' is 'module.Class', relative to Agents.agents unless the module path is dotted
+# 'formatter' is 'local' (parser only), 'auto' (parser, then the LLM when it finds no structure) or 'llm';
+# only 'llm' publishes section_ready events while it formats, the others deliver the whole result at once
+# 'reuse_similar' steps may take their output from the run of a near-identical concept, only when
+# SIMILAR_CONCEPT_THRESHOLD is set (off by default)
 AI_CONFIG = {
     'strategy': {
+        'agent': 'strategy_analysis.StrategyAnalysis',
         'model': 'gpt-3.5-turbo',
         'temperature': 0.7,
+        'formatter': 'local',
         'system_role': 'You are a strategic business analyst with expertise in market analysis and business strategy.',
+        'reuse_similar': True,
         'dependencies': []
     },
     'competitors': {
+        'agent': 'competitor_analysis.CompetitorAnalysis',
         'model': 'gpt-3.5-turbo',
         'temperature': 0.7,
+        'formatter': 'local',
         'system_role': 'You are a competitive intelligence expert.',
+        'reuse_similar': True,
         'dependencies': ['strategy']
     },
     'revenue': {
+        'agent': 'revenue_analysis.RevenueAnalysis',
         'model': 'gpt-3.5-turbo',
         'temperature': 0.7,
+        'formatter': 'local',
         'system_role': 'You are a revenue analysis expert.',
         'dependencies': ['strategy', 'competitors']
+    },
+    'cost': {
+        'agent': 'cost_analysis.CostAnalysis',
+        'model': 'gpt-3.5-turbo',
+        'temperature': 0.7,
+        'formatter': 'local',
+        'system_role': 'You are a cost analysis and financial modeling expert.',
+        # Costs are estimated from the concept and strategy alone, so cost runs alongside
+        # competitors and revenue; ROI is where they meet. Adding competitors and revenue
+        # here would make every step up to ROI run one after another
+        'dependencies': ['strategy']
+    },
+    'roi': {
+        'agent': 'roi_analysis.ROIAnalysis',
+        'model': 'gpt-3.5-turbo',
+        'temperature': 0.7,
+        'formatter': 'local',
+        'system_role': 'You are an ROI and investment analysis expert.',
+        'context_budget': 2000,
+        'dependencies': ['strategy', 'competitors', 'revenue', 'cost']
+    },
+    'justification': {
+        'agent': 'business_justification.BusinessJustification',
+        'model': 'gpt-3.5-turbo',
+        'temperature': 0.7,
+        'formatter': 'local',
+        'system_role': 'You are a business case and investment justification expert.',
+        'context_budget': 2000,
+        'dependencies': ['strategy', 'competitors', 'revenue', 'cost', 'roi']
+    },
+    'deck': {
+        'agent': 'investor_deck.InvestorDeck',
+        'model': 'gpt-3.5-turbo',
+        'temperature': 0.7,
+        'formatter': 'local',
+        'system_role': 'You are a presentation and executive communication expert.',
+        'context_budget': 2000,
+        'dependencies': ['strategy', 'competitors', 'revenue', 'cost', 'roi', 'justification']
     }
-}
\ No newline at end of file
+}
+
+# Named selections of steps; their dependencies are added when a run starts
+ANALYSIS_PROFILES = {
+    'quick': ['strategy', 'competitors'],
+    'financial': ['revenue', 'cost', 'roi'],
+    'full': list(AI_CONFIG)
+}
+
+# Follow-up questions about a run's results, answered from its top_k most relevant chunks
+QA_CONFIG = {
+    'model': 'gpt-3.5-turbo',
+    'temperature': 0.2,
+    'top_k': 5
+}
+
+# Uploaded documents: cut into chunk_tokens pieces, each trimmed locally to extract_tokens and
+# summarised concurrently, then reduced into the brief every agent reads instead of the document
+DOCUMENT_CONFIG = {
+    'model': 'gpt-3.5-turbo',
+    'temperature': 0.2,
+    'chunk_tokens': 3000,
+    'extract_tokens': 1200,
+    'summary_words': 200,
+    'reduce_tokens': 6000,
+    'brief_words': 500,
+    'concurrency': 4,
+    'max_tokens': 250000
+}
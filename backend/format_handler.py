@@ -1,24 +1,150 @@
-from openai import OpenAI
 import json
+import re
 
-client = None
+# Agents often return markdown flattened onto one line, so headings and bullets are
+# recognised inline as well as at the start of a line
+INLINE_BREAK = re.compile(r"\s+(?=#{1,6}\s)|(?<!#)\s+(?=(?:[-*•]|\d+\.)\s)")
+HEADING = re.compile(r"^#{1,6}\s+(.*)$")
+BOLD_HEADING = re.compile(r"^\*\*([^*]+?)\*\*:?$")
+BULLET = re.compile(r"^(?:[-*•]|\d+\.)\s+(.*)$")
+LABELLED = re.compile(r"^([^:]{2,80}):\s*(.+)$")
+MARKUP = re.compile(r"\*\*|__|`")
+NUMERIC_FACT = re.compile(
+    r"(?P<currency>\$)\s?(?P<amount>\d[\d,]*(?:\.\d+)?)(?:\s?(?P<scale>[kKmMbB]n?\b|thousand\b|million\b|billion\b))?"
+    r"|(?P<percent>\d+(?:\.\d+)?)\s?(?:%|percent\b)"
+    r"|(?P<multiple>\d+(?:\.\d+)?)x\b"
+    r"|(?P<year>\b(?:19|20)\d{2}\b)"
+)
+SCALES = {'k': 'thousand', 'm': 'million', 'b': 'billion', 'bn': 'billion'}
 
-def get_client():
-    global client
-    if client is None:
-        client = OpenAI()
-    return client
 
 def format_analysis(text):
+    """Turn an agent's markdown into the sections JSON the frontend renders, without an LLM call"""
     try:
-        # Just return the text in a simple structure
+        return parse_analysis(text)
+    except ValueError as e:
+        print(f"format_handler.py: No structure found, returning paragraphs: {e}")
+        paragraphs = [_clean(p) for p in re.split(r"\n\s*\n", str(text or '')) if p.strip()]
         return {
-            "sections": [
-                {
-                    "content": text
-                }
-            ]
+            "sections": [{
+                "title": "Analysis",
+                "content": paragraphs,
+                "key_points": [],
+                "metrics": [metric for p in paragraphs for metric in _metrics(p, "Analysis")]
+            }]
         }
-    except Exception as e:
-        print(f"Error formatting analysis: {e}")
-        return {"error": str(e)} 
\ No newline at end of file
+
+
+def parse_analysis(text):
+    """Parse headings, bullets and numeric facts into sections.
+
+    Raises ValueError when the text has no markdown structure to build sections from.
+    """
+    if not text or not text.strip():
+        raise ValueError("Empty analysis")
+
+    stripped = text.strip()
+    if stripped.startswith('{'):
+        return _parse_json(stripped)
+
+    sections = []
+    current = None
+    group = None
+    structured = False
+    for line in _lines(stripped):
+        heading = HEADING.match(line) or BOLD_HEADING.match(line)
+        if heading:
+            structured = True
+            current = _section(_clean(heading.group(1)).rstrip(':'))
+            sections.append(current)
+            group = None
+            continue
+
+        if current is None:
+            current = _section("Overview")
+            sections.append(current)
+
+        bullet = BULLET.match(line)
+        if bullet:
+            structured = True
+            point = _clean(bullet.group(1))
+            if not point:
+                continue
+            current['key_points'].append(point)
+            if point.endswith(':') and len(point) <= 60:
+                # A short lead-in such as 'Competitor A:' names the metrics listed under it
+                group = point.rstrip(':')
+            else:
+                current['metrics'].extend(_metrics(point, current['title'], group))
+        else:
+            paragraph = _clean(line)
+            current['content'].append(paragraph)
+            current['metrics'].extend(_metrics(paragraph, current['title']))
+            group = None
+
+    if not structured:
+        raise ValueError("No headings or bullet points")
+
+    # Title headings directly followed by a subheading carry nothing of their own
+    sections = [s for s in sections if s['content'] or s['key_points']]
+    if not sections:
+        raise ValueError("Headings without any content")
+    return {"sections": sections}
+
+
+def _parse_json(text):
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(parsed, dict) or not isinstance(parsed.get('sections'), list):
+        raise ValueError("JSON without a sections list")
+    return parsed
+
+
+def _lines(text):
+    for line in text.splitlines():
+        for piece in INLINE_BREAK.split(line):
+            if piece.strip():
+                yield piece.strip()
+
+
+def _section(title):
+    return {"title": title, "content": [], "key_points": [], "metrics": []}
+
+
+def _clean(text):
+    return MARKUP.sub('', text).strip()
+
+
+def _metrics(text, title, group=None):
+    """Numeric facts in a line, labelled by the line's own 'Label:' prefix or else its section"""
+    labelled = LABELLED.match(text)
+    if labelled:
+        label, rest = labelled.groups()
+        label = label.strip()
+        if group:
+            label = f"{group} - {label}"
+        facts = list(NUMERIC_FACT.finditer(rest))
+        # A dollar amount or percentage says more about a line than the year it mentions
+        fact = next((f for f in facts if not f.group('year')), facts[0] if facts else None)
+        return [_metric(label, fact, rest)] if fact else []
+
+    # Unlabelled prose: keep amounts, percentages and multiples, not every year mentioned
+    return [_metric(title, fact, text) for fact in NUMERIC_FACT.finditer(text) if not fact.group('year')]
+
+
+def _metric(label, fact, text):
+    if fact.group('currency'):
+        value = fact.group('amount')
+        scale = fact.group('scale')
+        if scale:
+            value += ' ' + SCALES.get(scale.lower(), scale.lower())
+        return {"label": label, "value": value, "unit": "USD"}
+    if fact.group('percent'):
+        if re.search(r"\bCAGR\b[^.%]*$", text[:fact.start()]):
+            label += " (CAGR)"
+        return {"label": label, "value": fact.group('percent'), "unit": "%"}
+    if fact.group('multiple'):
+        return {"label": label, "value": fact.group('multiple'), "unit": "x"}
+    return {"label": label, "value": fact.group('year'), "unit": "year"}
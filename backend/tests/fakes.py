@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+
+class FakeClient:
+    """Stands in for OpenAI, answering with fixed pieces of text"""
+
+    def __init__(self, pieces):
+        self.pieces = pieces
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs.get('stream'):
+            chunks = [SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+                      for piece in self.pieces]
+            # The final chunk of a real stream carries no content
+            chunks.append(SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None))]))
+            return iter(chunks)
+        message = SimpleNamespace(content=''.join(self.pieces))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeAsyncClient(FakeClient):
+    """Async version of FakeClient, optionally slow to answer"""
+
+    def __init__(self, pieces, delay=0):
+        super().__init__(pieces)
+        self.delay = delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+
+    async def acreate(self, **kwargs):
+        await asyncio.sleep(self.delay)
+        response = self.create(**kwargs)
+        if kwargs.get('stream'):
+            return _async_iter(response)
+        return response
+
+
+async def _async_iter(items):
+    for item in items:
+        yield item
+
+
+def start_fake_openai(**options):
+    """Serve benchmarks.fake_openai on a local port, returning (fake, server, base_url for the SDK)"""
+    from benchmarks.fake_openai import FakeOpenAI, serve_in_thread
+
+    fake = FakeOpenAI(**options)
+    server, url = serve_in_thread(fake.app)
+    return fake, server, f"{url}/v1"
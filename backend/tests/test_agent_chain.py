@@ -0,0 +1,149 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agents.agent_chain import AgentChain
+from Agents.async_agent_handler import AsyncAgentHandler
+from fakes import FakeAsyncClient
+
+
+@pytest.fixture
+def fake():
+    return FakeAsyncClient(['## Summary\n- Revenue: $1,000'], delay=0.05)
+
+
+@pytest.fixture
+def handler(monkeypatch, fake):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', '')
+    return AsyncAgentHandler(client=fake)
+
+
+def test_process_request_waits_for_the_run_instead_of_calling_again(handler, fake):
+    chain = AgentChain(handler)
+
+    async def scenario():
+        started = chain.start('Overland 3D models', 's1')
+        # Asked for while the run is still computing it
+        result = await handler.process_request('roi', {'session_id': started['session_id']})
+        await asyncio.gather(*handler.background_runs)
+        return started, result
+
+    started, result = asyncio.run(scenario())
+
+    assert result['precomputed'] is True
+    assert result['raw_result'].startswith('## Summary')
+    # One call per agent from the run, none from process_request
+    assert len(fake.calls) == len(handler.agents)
+    status = chain.status(started['run_id'])
+    assert status['status'] == 'complete'
+    assert set(status['steps'].values()) == {'complete'}
+
+
+def test_rerun_and_new_concept_bypass_stored_results(handler):
+    async def scenario():
+        handler.submit_context('s1', 'Overland 3D models')
+        first = await handler.process_request('strategy', {'session_id': 's1'})
+        again = await handler.process_request('strategy', {'session_id': 's1'})
+        rerun = await handler.process_request('strategy', {'session_id': 's1', 'rerun': True})
+        handler.submit_context('s1', 'Drone mapping')
+        return first, again, rerun, 'strategy' in handler.contexts.get('s1')
+
+    first, again, rerun, kept = asyncio.run(scenario())
+
+    assert 'precomputed' not in first
+    assert again['precomputed'] is True
+    assert 'precomputed' not in rerun
+    assert not kept
+
+
+def test_start_requires_a_concept_and_unknown_runs_have_no_status(handler):
+    chain = AgentChain(handler)
+
+    with pytest.raises(ValueError):
+        chain.start('  ')
+    assert chain.status('missing') is None
+
+
+def test_closed_run_with_errors_is_failed(handler):
+    chain = AgentChain(handler)
+    handler.events.open('run1')
+    handler.events.publish('run1', 'run_started', {'steps': ['strategy', 'roi']})
+    handler.events.publish('run1', 'formatted_ready', {'step': 'strategy'})
+    handler.events.publish('run1', 'error', {'step': 'roi', 'error': 'boom'})
+    assert chain.status('run1')['status'] == 'running'
+
+    handler.events.close('run1')
+    status = chain.status('run1')
+
+    assert status['status'] == 'failed'
+    assert status['steps'] == {'strategy': 'complete', 'roi': 'failed'}
+    assert status['errors'] == {'roi': 'boom'}
+
+
+def test_regenerate_recomputes_only_changed_steps_and_their_dependents(monkeypatch, tmp_path, fake):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    handler = AsyncAgentHandler(client=fake)
+    chain = AgentChain(handler)
+
+    async def calls_for(start):
+        before = len(fake.calls)
+        started = start()
+        await asyncio.gather(*handler.background_runs)
+        return started, len(fake.calls) - before
+
+    async def scenario():
+        first, _ = await calls_for(lambda: chain.start('Overland 3D models', 's1'))
+        deck = await calls_for(lambda: chain.regenerate(first['run_id'], ['deck']))
+        # Same answer again, so nothing downstream of strategy has changed inputs
+        same = await calls_for(lambda: chain.regenerate(first['run_id'], ['strategy']))
+        fake.pieces = ['## Summary\n- Cost: $500']
+        cost = await calls_for(lambda: chain.regenerate(first['run_id'], ['cost']))
+        return first, deck, same, cost
+
+    first, (deck, deck_calls), (_, same_calls), (cost, cost_calls) = asyncio.run(scenario())
+
+    assert deck_calls == 1 and same_calls == 1
+    assert deck['affected'] == ['deck']
+    assert cost['affected'] == ['cost', 'roi', 'justification', 'deck'] and cost_calls == 4
+    stored = handler.runs.get(cost['run_id'])
+    assert stored['status'] == 'complete'
+    assert stored['steps']['strategy']['raw_result'] == handler.runs.get(first['run_id'])['steps']['strategy']['raw_result']
+    assert stored['steps']['roi']['raw_result'].endswith('$500')
+    with pytest.raises(ValueError):
+        chain.regenerate(first['run_id'])
+    assert chain.regenerate('missing', ['deck']) is None
+
+
+def test_profile_runs_only_the_steps_it_needs(monkeypatch, tmp_path, fake):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    monkeypatch.setenv('SIMILAR_CONCEPT_THRESHOLD', '0.8')
+    handler = AsyncAgentHandler(client=fake)
+    chain = AgentChain(handler)
+
+    async def scenario():
+        quick = chain.start('Overland 3D models', 's1', profile='quick')
+        running = chain.status(quick['run_id'])
+        await asyncio.gather(*handler.background_runs)
+        # The quick run does not cover cost, so it is not reused for it
+        cost = chain.start('Overland 3D models', 's2', steps=['cost'])
+        await asyncio.gather(*handler.background_runs)
+        again = chain.start('Overland 3D models', 's3', profile='quick')
+        return quick, running, cost, again
+
+    quick, running, cost, again = asyncio.run(scenario())
+
+    assert quick['steps'] == ['strategy', 'competitors']
+    assert set(running['steps']) == {'strategy', 'competitors'}
+    assert chain.status(quick['run_id'])['status'] == 'complete'
+    assert 'reused' not in cost and cost['steps'] == ['strategy', 'cost']
+    assert again['reused'] is True
+    # strategy, competitors, then only cost: the second run reuses strategy from the first
+    assert len(fake.calls) == 3
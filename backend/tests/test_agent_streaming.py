@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agents.strategy_analysis import StrategyAnalysis
+from Agents.agents.roi_analysis import ROIAnalysis
+from fakes import FakeClient
+
+
+def test_stream_yields_pieces_in_order():
+    client = FakeClient(['Market ', 'size ', 'is $1B'])
+    agent = ROIAnalysis(client)
+
+    pieces = list(agent.stream({'custom_context': 'Overland 3D models', 'strategy': 'Strategy text'}))
+
+    assert pieces == ['Market ', 'size ', 'is $1B']
+    assert client.calls[0]['stream'] is True
+    assert 'Strategy text' in client.calls[0]['messages'][1]['content']
+
+
+def test_process_and_stream_send_the_same_prompt():
+    client = FakeClient(['Full answer'])
+    agent = StrategyAnalysis(client)
+    context = {'custom_context': 'Overland 3D models'}
+
+    assert agent.process(context) == 'Full answer'
+    assert ''.join(agent.stream(context)) == 'Full answer'
+    assert client.calls[0]['messages'] == client.calls[1]['messages']
+
+
+def test_strategy_without_concept_does_not_call_the_model():
+    client = FakeClient(['unused'])
+    agent = StrategyAnalysis(client)
+
+    assert list(agent.stream({})) == [StrategyAnalysis.NO_INPUT_ERROR]
+    assert agent.process({}) == StrategyAnalysis.NO_INPUT_ERROR
+    assert client.calls == []
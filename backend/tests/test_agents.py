@@ -1,57 +1,35 @@
-import os
 import sys
 from pathlib import Path
 
-# Add debug prints
-print("Current working directory:", os.getcwd())
+import pytest
+from openai import OpenAI
 
-# Add the backend directory to the Python path using relative path
 backend_dir = Path(__file__).parent.parent
-print("Backend directory:", backend_dir)
 sys.path.append(str(backend_dir))
 
-from openai import OpenAI
-from dotenv import load_dotenv
+from Agents.agents.competitor_analysis import CompetitorAnalysis
+from fakes import start_fake_openai
 
-# Load .env from the Agents directory using relative path
-dotenv_path = backend_dir / 'Agents' / '.env'
-print("Looking for .env at:", dotenv_path)
-print(".env exists:", dotenv_path.exists())
 
-load_dotenv(dotenv_path)
-print("OPENAI_API_KEY exists:", bool(os.getenv('OPENAI_API_KEY')))
+@pytest.fixture(scope='module')
+def client():
+    fake, server, base_url = start_fake_openai(latency='fixed:0')
+    yield OpenAI(api_key='sk-test', base_url=base_url, max_retries=0)
+    server.should_exit = True
 
-from Agents.agents.competitor_analysis import CompetitorAnalysis
 
-def test_competitor_analysis():
-    # Initialize OpenAI client with both API key and organization
-    client = OpenAI(
-        api_key=os.getenv('OPENAI_API_KEY'),
-        organization=os.getenv('OPENAI_ORGANIZATION')
-    )
-    
-    # Create agent
+def test_competitor_analysis(client):
     agent = CompetitorAnalysis(client)
-    
-    # Test context
-    business_context = "A new electric vehicle charging station network"
-    previous_results = {
+
+    context = {
+        'custom_context': "A new electric vehicle charging station network",
         'strategy': """
         ### Market Analysis
         • Growing EV market
         • High demand for charging infrastructure
         """
     }
-    
-    # Run analysis
-    try:
-        result = agent.analyze(business_context, previous_results)
-        print("\nTest successful! Agent response:")
-        print(result)
-        return True
-    except Exception as e:
-        print(f"\nTest failed with error: {str(e)}")
-        return False
-
-if __name__ == "__main__":
-    test_competitor_analysis() 
\ No newline at end of file
+    result = agent.process(context)
+
+    # The fake server answers competitor prompts with the recorded competitor analysis
+    assert result == (backend_dir / 'data' / 'competitor').read_text()
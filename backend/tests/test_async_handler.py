@@ -0,0 +1,125 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.run_events import RunEvents
+from Agents.scheduler import DependencyScheduler
+from fakes import FakeAsyncClient
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', '')
+    return AsyncAgentHandler(client=FakeAsyncClient(['{"sections": []}'], delay=0.05))
+
+
+def test_arun_overlaps_independent_steps():
+    config = {
+        'a': {'dependencies': []},
+        'b': {'dependencies': ['a']},
+        'c': {'dependencies': ['a']},
+    }
+
+    async def run_step(step):
+        await asyncio.sleep(0.05)
+        return step
+
+    start = time.monotonic()
+    results, errors = asyncio.run(DependencyScheduler(config).arun(run_step))
+
+    assert results == {'a': 'a', 'b': 'b', 'c': 'c'}
+    assert errors == {}
+    assert time.monotonic() - start < 0.14
+
+
+def test_process_all_streams_events_for_every_step(handler):
+    async def scenario():
+        handler.submit_context('s1', 'Overland 3D models')
+        run_id = handler.start_run({'session_id': 's1'})
+        return [event async for event in handler.events.asubscribe(run_id) if event]
+
+    events = asyncio.run(scenario())
+
+    formatted = [event['data']['step'] for event in events if event['event'] == 'formatted_ready']
+    assert sorted(formatted) == sorted(handler.agents)
+    assert events[-1]['event'] == 'run_complete'
+    assert events[-1]['data']['errors'] == {}
+    assert handler.get_formatted_result('deck', 's1')['status'] == 'complete'
+
+
+def test_blocking_work_stays_off_the_event_loop(monkeypatch, tmp_path):
+    monkeypatch.setenv('LLM_CACHE_PATH', str(tmp_path / 'cache.sqlite3'))
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+
+    def slow_format(text):
+        time.sleep(0.1)
+        return {'sections': []}
+
+    monkeypatch.setattr('Agents.agents.format_handler.format_locally', slow_format)
+    handler = AsyncAgentHandler(client=FakeAsyncClient(['## Summary\n- Revenue: $1,000']))
+
+    async def scenario():
+        handler.submit_context('s1', 'Overland 3D models')
+        run_id = handler.start_run({'session_id': 's1', 'profile': 'quick'})
+        gaps, last = [], time.monotonic()
+        while handler.background_runs:
+            await asyncio.sleep(0.005)
+            gaps.append(time.monotonic() - last)
+            last = time.monotonic()
+        return run_id, max(gaps)
+
+    run_id, longest = asyncio.run(scenario())
+
+    assert longest < 0.05  # Each formatting call alone blocks for 0.1s
+    # Events reach clients in the order they were stored
+    stored, _ = handler.runs.events_after(run_id)
+    assert [e['event'] for e in handler.events.history(run_id)['events']] == [e['event'] for e in stored]
+    assert stored[-1]['event'] == 'run_complete'
+
+
+def test_run_started_from_a_blocking_thread_runs_on_the_loop(handler):
+    async def scenario():
+        handler.submit_context('s1', 'Overland 3D models')
+        run_id = await handler.blocking(handler.start_run, {'session_id': 's1', 'profile': 'quick'})
+        assert handler.background_runs
+        await asyncio.gather(*handler.background_runs)
+        return run_id
+
+    run_id = asyncio.run(scenario())
+
+    assert handler.events.history(run_id)['events'][-1]['event'] == 'run_complete'
+    assert handler.get_formatted_result('strategy', 's1')['status'] == 'complete'
+
+
+def test_stream_request_stores_full_text(handler):
+    async def scenario():
+        pieces = [piece async for piece in handler.stream_request('strategy', {'session_id': 's1', 'custom_context': 'idea'})]
+        await asyncio.sleep(0.1)
+        return pieces
+
+    assert asyncio.run(scenario()) == ['{"sections": []}']
+    assert handler.contexts.get('s1')['strategy'] == '{"sections": []}'
+    assert handler.get_formatted_result('strategy', 's1')['status'] == 'complete'
+
+
+def test_asubscribe_wakes_on_publish_from_another_thread():
+    events = RunEvents(heartbeat=5)
+    events.open('run1')
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.02, lambda: loop.run_in_executor(None, events.close, 'run1'))
+        events.publish('run1', 'step_started', {'step': 'strategy'})
+        return [event['event'] async for event in events.asubscribe('run1') if event]
+
+    start = time.monotonic()
+    assert asyncio.run(scenario()) == ['step_started']
+    assert time.monotonic() - start < 1
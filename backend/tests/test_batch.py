@@ -0,0 +1,110 @@
+import asyncio
+import io
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.batch import BatchRunner, BatchStore, read_concepts, write_summary
+from fakes import FakeAsyncClient
+
+
+class CountingClient(FakeAsyncClient):
+    """Records the most calls it had in flight at once"""
+
+    def __init__(self, pieces, delay=0):
+        super().__init__(pieces, delay)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def acreate(self, **kwargs):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().acreate(**kwargs)
+        finally:
+            self.in_flight -= 1
+
+
+class UsageClient(FakeAsyncClient):
+    """FakeAsyncClient whose completions report token usage like the real API"""
+
+    async def acreate(self, **kwargs):
+        response = await super().acreate(**kwargs)
+        response.usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120)
+        return response
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', '')
+
+
+def run_batch(client, db_path, concepts, concurrency=2):
+    output = io.StringIO()
+    runner = BatchRunner(AsyncAgentHandler(client=client), BatchStore(str(db_path)), output, concurrency)
+    summaries = asyncio.run(runner.run(concepts))
+    return summaries, [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_batch_runs_every_step_within_the_concurrency_limit(tmp_path):
+    client = CountingClient(['## Summary\n- Revenue: $100,000'], delay=0.01)
+    concepts = read_concepts(['{"id": "a", "concept": "Overland 3D models"}', '', '{"concept": "Coffee subscription"}'])
+
+    summaries, lines = run_batch(client, tmp_path / 'batch.sqlite3', concepts)
+
+    assert [line['id'] for line in sorted(lines, key=lambda line: line['concept'])][1] == 'a'
+    assert all(set(line['results']) == {'strategy', 'competitors', 'revenue', 'cost', 'roi', 'justification', 'deck'}
+               for line in lines)
+    assert lines[0]['results']['roi']['formatted_result']['sections'][0]['metrics'][0]['value'] == '100,000'
+    assert client.peak <= 2
+    assert all(summary['prompt_tokens'] > 0 and summary['completion_tokens'] > 0 for summary in summaries)
+
+    totals = write_summary(tmp_path / 'summary.json', summaries)
+    assert totals['concepts'] == 2 and totals['failed'] == 0
+
+
+def test_resume_skips_checkpointed_steps_and_concepts(tmp_path):
+    db_path = tmp_path / 'batch.sqlite3'
+    store = BatchStore(str(db_path))
+    store.save_step('a', 'strategy', {
+        'raw_result': 'Checkpointed strategy', 'formatted_result': {'sections': []},
+        'prompt_tokens': 10, 'completion_tokens': 3, 'seconds': 1.0
+    })
+    store.save_concept('done', 'Finished concept', {}, 1.0)
+
+    client = CountingClient(['Analysis'])
+    concepts = read_concepts(['{"id": "a", "concept": "Overland 3D models"}', '{"id": "done", "concept": "Finished concept"}'])
+    summaries, lines = run_batch(client, db_path, concepts)
+
+    assert len(client.calls) == 6
+    assert all('Checkpointed strategy' in call['messages'][1]['content'] for call in client.calls)
+    assert [line['id'] for line in lines] == ['a']
+    assert summaries[0]['resumed_steps'] == ['strategy']
+    assert BatchStore(str(db_path)).is_complete('a')
+
+
+def test_concepts_need_text():
+    with pytest.raises(ValueError):
+        read_concepts(['{"id": "empty"}'])
+
+
+def test_tokens_come_from_the_provider_and_cache_hits_are_free(tmp_path, monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', str(tmp_path / 'cache.sqlite3'))
+    concepts = read_concepts(['{"id": "a", "concept": "Overland 3D models"}'])
+
+    first, _ = run_batch(UsageClient(['Analysis']), tmp_path / 'first.sqlite3', concepts)
+    again, _ = run_batch(UsageClient(['Analysis']), tmp_path / 'again.sqlite3', concepts)
+
+    assert first[0]['steps']['roi'] == {'seconds': first[0]['steps']['roi']['seconds'],
+                                        'prompt_tokens': 100, 'completion_tokens': 20}
+    assert first[0]['cached_steps'] == []
+    assert again[0]['prompt_tokens'] == again[0]['completion_tokens'] == 0
+    assert len(again[0]['cached_steps']) == len(first[0]['steps'])
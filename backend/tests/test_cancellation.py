@@ -0,0 +1,127 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agent_handler import AgentHandler
+from Agents.agents.agent_chain import AgentChain
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.cancellation import RunFollowers
+from Agents.run_events import RunEvents
+from fakes import FakeAsyncClient, FakeClient
+
+ANSWER = ['## Summary\n- Revenue: $1,000']
+
+
+class GatedClient(FakeClient):
+    """FakeClient whose calls block until the test opens the gate, like a slow provider"""
+
+    def __init__(self, pieces):
+        super().__init__(pieces)
+        self.gate = threading.Event()
+        self.waiting = threading.Event()
+
+    def create(self, **kwargs):
+        self.waiting.set()
+        self.gate.wait(5)
+        return super().create(**kwargs)
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    monkeypatch.setenv('EXPORT_CACHE_PATH', str(tmp_path / 'exports'))
+
+
+def events_of(handler, run_id):
+    return [event['event'] for event in handler.events.subscribe(run_id) if event]
+
+
+def test_cancel_stops_the_run_without_waiting_for_the_call_in_flight(store):
+    fake = GatedClient(ANSWER)
+    handler = AgentHandler(client=fake)
+    chain = AgentChain(handler)
+    run_id = chain.start('Overland 3D models', 's1')['run_id']
+    assert fake.waiting.wait(2)
+
+    assert handler.cancel_run(run_id) is True
+    start = time.monotonic()
+    events = events_of(handler, run_id)
+    assert time.monotonic() - start < 1  # Strategy's call is still blocked
+    fake.gate.set()
+
+    assert events[-1] == 'run_cancelled' and 'raw_ready' not in events
+    time.sleep(0.1)
+    # Strategy's late answer is dropped and none of its dependents ever called the model
+    assert len(fake.calls) == 1 and 'strategy' not in handler.contexts.get('s1')
+    status = chain.status(run_id)
+    assert status['status'] == 'cancelled' and set(status['steps'].values()) == {'cancelled'}
+    assert handler.runs.get(run_id)['status'] == 'cancelled'
+    with pytest.raises(ValueError):
+        handler.cancel_run(run_id)
+    assert handler.cancel_run('missing') is None
+
+
+def test_a_new_run_supersedes_the_sessions_previous_run(store):
+    fake = GatedClient(ANSWER)
+    handler = AgentHandler(client=fake)
+    chain = AgentChain(handler)
+    first = chain.start('Overland 3D models', 's1')['run_id']
+    assert fake.waiting.wait(2)
+
+    second = chain.start('Drone mapping', 's1', profile='quick')['run_id']
+    fake.gate.set()
+
+    last = list(handler.events.subscribe(first))[-1]
+    list(handler.events.subscribe(second))
+    assert last['event'] == 'run_cancelled' and last['data']['reason'] == f"Superseded by run {second}"
+    assert chain.status(second)['status'] == 'complete'
+
+
+def test_async_cancel_aborts_llm_calls_in_flight(monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', '')
+    fake = FakeAsyncClient(ANSWER, delay=10)
+    handler = AsyncAgentHandler(client=fake)
+
+    async def scenario():
+        handler.submit_context('s1', 'Overland 3D models')
+        run_id = handler.start_run({'session_id': 's1'})
+        await asyncio.sleep(0.05)
+        handler.cancel_run(run_id)
+        await asyncio.wait_for(asyncio.gather(*handler.background_runs), 1)
+        return run_id
+
+    run_id = asyncio.run(scenario())
+
+    # The fake records a call only once it answers, so the request was abandoned mid-flight
+    assert fake.calls == []
+    assert handler.events.history(run_id)['events'][-1]['event'] == 'run_cancelled'
+    assert handler.limiter.stats()['in_flight'] == 0
+
+
+def test_runs_are_cancelled_once_every_client_leaves_for_the_grace_period():
+    events = RunEvents(heartbeat=0.01)
+    cancelled = []
+    followers = RunFollowers(events, lambda run_id, reason: cancelled.append(run_id), grace=0.05)
+    for run_id in ('left', 'returned', 'finished'):
+        events.open(run_id)
+
+    for run_id in ('left', 'returned'):
+        stream = followers.subscribe(run_id)
+        next(stream)
+        stream.close()
+    back = followers.subscribe('returned')
+    next(back)
+    events.close('finished')
+    list(followers.subscribe('finished'))
+    time.sleep(0.15)
+
+    assert cancelled == ['left']
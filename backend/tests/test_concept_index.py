@@ -0,0 +1,124 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agents.agent_chain import AgentChain
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.concept_index import ConceptIndex
+from Agents.run_store import RunStore
+from fakes import FakeAsyncClient
+
+CONCEPTS = [
+    'A 3D modeling business serving the overlanding community',
+    'Drone mapping service for farms',
+    'Subscription coffee delivery for offices'
+]
+
+
+def completed_store(path, concepts):
+    runs = RunStore(path)
+    for i, concept in enumerate(concepts):
+        runs.start(f'run{i}', 's1', concept)
+        runs.record(f'run{i}', 'raw_ready', {'step': 'strategy', 'raw_result': f'strategy for {concept}'})
+        runs.record(f'run{i}', 'run_complete', {'steps': ['strategy'], 'errors': {}})
+        time.sleep(0.001)
+    return runs
+
+
+def test_rewording_matches_and_unrelated_concept_does_not(tmp_path):
+    runs = completed_store(str(tmp_path / 'runs.sqlite3'), CONCEPTS)
+    index = ConceptIndex(runs, threshold=0.6)
+
+    match = index.match('A 3D modelling business for the overlanding community', 'new1')
+    assert match[0] == 'run0' and match[2] > 0.6
+    assert index.match('AI bookkeeping for small restaurants', 'new2') is None
+
+    assert index.stats()['hit_rate'] == 0.5
+    audit = runs.similar_lookups()
+    assert [(entry['run_id'], entry['reused']) for entry in audit] == [('new2', False), ('new1', True)]
+    assert audit[1]['match_concept'] == CONCEPTS[0]
+
+
+def test_index_picks_up_new_runs_and_keeps_the_newest(tmp_path):
+    runs = completed_store(str(tmp_path / 'runs.sqlite3'), CONCEPTS[:1])
+    index = ConceptIndex(runs, max_entries=2)
+    assert index.search('drone mapping')[0] == 'run0'
+
+    runs.start('run9', 's1', 'Drone mapping service for farms')
+    runs.record('run9', 'run_complete', {'steps': [], 'errors': {}})
+    runs.start('run10', 's1', 'Coffee delivery')
+    runs.record('run10', 'run_complete', {'steps': [], 'errors': {}})
+
+    assert index.search('drone mapping for farms')[0] == 'run9'
+    assert index.run_ids == ['run9', 'run10']
+
+
+def test_concurrent_searches_load_each_run_once(tmp_path):
+    runs = completed_store(str(tmp_path / 'runs.sqlite3'), CONCEPTS)
+    index = ConceptIndex(runs)
+    threads = [threading.Thread(target=index.search, args=('drone mapping',)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert index.run_ids == ['run0', 'run1', 'run2'] and len(index.counts) == 3
+
+
+def test_similar_reuse_is_off_unless_a_threshold_is_set(tmp_path, monkeypatch):
+    monkeypatch.delenv('SIMILAR_CONCEPT_THRESHOLD', raising=False)
+    runs = completed_store(str(tmp_path / 'runs.sqlite3'), CONCEPTS)
+
+    assert ConceptIndex.from_env(runs) is None
+    monkeypatch.setenv('SIMILAR_CONCEPT_THRESHOLD', '0.8')
+    assert ConceptIndex.from_env(runs).threshold == 0.8
+
+
+def test_near_but_distinct_concepts_below_the_threshold_are_not_reused(tmp_path, monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    monkeypatch.setenv('SIMILAR_CONCEPT_THRESHOLD', '0.8')
+    completed_store(str(tmp_path / 'runs.sqlite3'), CONCEPTS)
+    concept = 'A 3D modeling business serving the boating community'
+
+    fake = FakeAsyncClient(['## Summary\n- Revenue: $2,000'])
+    handler = AsyncAgentHandler(client=fake)
+    assert 0.5 < handler.similar.search(concept)[2] < 0.8
+
+    async def run():
+        started = AgentChain(handler).start(concept)
+        await asyncio.gather(*handler.background_runs)
+        return handler.events.history(started['run_id'])['events']
+
+    events = asyncio.run(run())
+
+    assert not [event for event in events if event['event'] == 'step_reused']
+    assert len(fake.calls) == len(handler.agents)
+    assert handler.runs.similar_lookups()[0]['reused'] is False
+
+
+def test_run_reuses_upstream_steps_of_a_similar_concept(tmp_path, monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    monkeypatch.setenv('SIMILAR_CONCEPT_THRESHOLD', '0.6')
+
+    async def run(handler, concept):
+        started = AgentChain(handler).start(concept)
+        await asyncio.gather(*handler.background_runs)
+        return [event for event in handler.events.history(started['run_id'])['events']]
+
+    asyncio.run(run(AsyncAgentHandler(client=FakeAsyncClient(['## Summary\n- Revenue: $1,000'])), CONCEPTS[0]))
+
+    fake = FakeAsyncClient(['## Summary\n- Revenue: $2,000'])
+    handler = AsyncAgentHandler(client=fake)
+    events = asyncio.run(run(handler, 'A 3D modelling business for the overlanding community'))
+
+    reused = [event['data']['step'] for event in events if event['event'] == 'step_reused']
+    assert reused == ['strategy', 'competitors']
+    assert len(fake.calls) == len(handler.agents) - 2
+    assert 'similar_concept_lookups_total{result="hit"} 1' in handler.metrics.render()
@@ -0,0 +1,78 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agents.context_filter_agent import ContextFilterAgent
+from Agents.tokens import count_tokens
+from config.ai_models import AI_CONFIG
+
+DATA_FILES = {
+    'strategy': 'strategy',
+    'competitors': 'competitor',
+    'revenue': 'revenue',
+    'cost': 'cost',
+    'roi': 'roi',
+    'justification': 'justification'
+}
+
+
+@pytest.fixture
+def context():
+    context = {'custom_context': 'Custom 3D models for the overlanding community'}
+    for step, name in DATA_FILES.items():
+        context[step] = (backend_dir / 'data' / name).read_text()
+    return context
+
+
+def test_deck_context_fits_budget(context):
+    filtered, report = ContextFilterAgent(AI_CONFIG).process(context, 'deck')
+
+    assert report['tokens_before'] > AI_CONFIG['deck']['context_budget']
+    assert report['tokens_after'] <= AI_CONFIG['deck']['context_budget']
+    assert report['tokens_saved'] == report['tokens_before'] - report['tokens_after']
+    assert set(report['dependencies']) == set(AI_CONFIG['deck']['dependencies'])
+    assert filtered['custom_context'] == context['custom_context']
+    for dep, counts in report['dependencies'].items():
+        assert count_tokens(filtered[dep]) == counts['after']
+
+
+def test_steps_without_budget_pass_context_through(context):
+    filtered, report = ContextFilterAgent(AI_CONFIG).process(context, 'revenue')
+
+    assert filtered == {
+        'custom_context': context['custom_context'],
+        'strategy': context['strategy'],
+        'competitors': context['competitors']
+    }
+    assert report['tokens_saved'] == 0
+
+
+def test_compact_keeps_numeric_facts_in_order():
+    text = (
+        "## Market\n"
+        "The overlanding market is growing quickly across many regions. "
+        "Enthusiasts value rugged and reliable gear for long trips. "
+        "The market reached $2.1 billion in 2023. "
+        "Many buyers research products online before purchasing.\n"
+        "## Costs\n"
+        "Printing costs fall 12% each year as hardware improves."
+    )
+    facts = ['## Market', 'The market reached $2.1 billion in 2023.', '## Costs', 'Printing costs fall 12% each year as hardware improves.']
+    budget = sum(count_tokens(fact) for fact in facts) + 2
+    compacted = ContextFilterAgent(AI_CONFIG).compact(text, budget)
+
+    assert count_tokens(compacted) <= budget
+    assert '$2.1 billion in 2023' in compacted
+    assert '12% each year' in compacted
+    assert compacted.index('## Market') < compacted.index('$2.1') < compacted.index('## Costs')
+
+
+def test_allocate_gives_unused_share_to_longer_analyses():
+    shares = ContextFilterAgent._allocate({'a': 100, 'b': 1000, 'c': 2000}, 900)
+
+    assert shares['a'] == 100
+    assert shares['b'] == shares['c'] == 400
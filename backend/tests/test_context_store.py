@@ -0,0 +1,89 @@
+import sys
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.context_store import ContextStore, DEFAULT_SESSION
+
+
+def test_sessions_are_isolated():
+    store = ContextStore()
+    first = store.get('user-a')
+    second = store.get('user-b')
+
+    first['custom_context'] = 'Overland 3D models'
+    second['custom_context'] = 'Coffee subscription'
+
+    assert store.get('user-a').get('custom_context') == 'Overland 3D models'
+    assert store.get('user-b')['custom_context'] == 'Coffee subscription'
+    assert store.get(None).session_id == DEFAULT_SESSION
+    assert 'strategy' not in first
+
+
+def test_lru_eviction_cancels_unpolled_formatting():
+    store = ContextStore(max_sessions=2)
+    oldest = store.get('a')
+    pending = Future()
+    oldest.formatting_tasks['strategy'] = pending
+    store.get('b')
+    store.get('c')
+
+    assert 'a' not in store.sessions
+    assert pending.cancelled()
+
+
+def test_ttl_expiry():
+    store = ContextStore(ttl=0.01)
+    store.get('a')['strategy'] = 'text'
+    time.sleep(0.02)
+    store.get('b')
+
+    assert list(store.sessions) == ['b']
+    assert store.stats()['memory_bytes'] == 0
+
+
+def test_memory_cap_evicts_least_recently_used():
+    store = ContextStore(max_bytes=100)
+    store.get('a')['strategy'] = 'x' * 60
+    store.get('b')['strategy'] = 'y' * 60
+
+    assert list(store.sessions) == ['b']
+    assert store.stats()['memory_bytes'] == 60
+
+
+def test_writes_to_evicted_session_are_not_counted():
+    store = ContextStore(max_sessions=1)
+    evicted = store.get('a')
+    store.get('b')['strategy'] = 'y' * 10
+
+    evicted['strategy'] = 'x' * 1000
+    assert evicted['strategy'] == 'x' * 1000
+    assert list(store.sessions) == ['b']
+    assert store.stats()['memory_bytes'] == 10
+
+    del evicted['strategy']
+    assert store.stats()['memory_bytes'] == 10
+
+
+def test_large_values_spill_to_disk(tmp_path):
+    store = ContextStore(max_bytes=100, spill_dir=str(tmp_path), spill_threshold=50)
+    text = 'Market size is $11.1 billion. ' * 10
+    store.get('a')['strategy'] = text
+
+    stats = store.stats()
+    assert stats['memory_bytes'] == 0
+    assert 0 < stats['spilled_bytes'] < len(text)
+    assert store.get('a')['strategy'] == text
+
+    store.discard('a')
+    assert not (tmp_path / 'a').exists()
+
+
+def test_rejects_unsafe_session_ids():
+    with pytest.raises(ValueError):
+        ContextStore().get('../etc')
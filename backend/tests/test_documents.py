@@ -0,0 +1,103 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agent_handler import AgentHandler
+from Agents.agents.agent_chain import AgentChain
+from Agents.agents.document_summary import DocumentSummary
+from Agents.documents import DocumentIngestor, chunk_document
+from Agents.run_store import RunStore
+from Agents.tokens import count_tokens
+from fakes import FakeAsyncClient, FakeClient
+
+CONFIG = {'model': 'gpt-3.5-turbo', 'chunk_tokens': 60, 'extract_tokens': 40, 'reduce_tokens': 30, 'concurrency': 2,
+          'max_tokens': 5000}
+
+
+def business_plan(sections=6):
+    return '\n\n'.join(
+        f"Section {i}. The workshop sells {i * 10} printed models a month at $45 each. "
+        f"Most buyers are overland travellers who want a scale model of their own truck. "
+        f"Marketing happens at rallies and through owners' forums, which cost little to reach."
+        for i in range(1, sections + 1)
+    )
+
+
+def test_chunks_fit_the_token_budget_and_keep_the_text_in_order():
+    text = business_plan() + '\n\n' + 'word ' * 200
+    chunks = chunk_document(text, 60)
+
+    assert len(chunks) > 6
+    assert all(count_tokens(chunk) <= 60 for chunk in chunks)
+    assert chunks[0].startswith('Section 1.') and chunks[-1].endswith('word')
+    assert ' '.join(' '.join(chunks).split()) == ' '.join(text.split())
+
+
+def test_chunks_are_summarised_reduced_and_cached_by_hash(tmp_path):
+    fake = FakeClient(['- Sells printed truck models at $45'])
+    ingestor = DocumentIngestor(DocumentSummary(fake, CONFIG), CONFIG, RunStore(str(tmp_path / 'runs.sqlite3')))
+    text = business_plan()
+
+    first = ingestor.ingest(text, 'plan.txt')
+    chunks = first['chunks']
+    assert chunks > 2 and first['cached'] is False
+    # The extractive pass trims each chunk before the model sees it
+    assert all('Marketing happens' not in call['messages'][1]['content'] for call in fake.calls[:chunks])
+    # One summary per chunk, reduced in rounds until the summaries fit, then once more into the brief
+    assert chunks + 2 <= len(fake.calls) <= 2 * chunks
+    assert first['brief'] == '- Sells printed truck models at $45'
+
+    calls = len(fake.calls)
+    again = ingestor.ingest(text, 'plan.txt')
+    assert again['cached'] is True and again['document_id'] == first['document_id']
+    assert len(fake.calls) == calls
+    assert ingestor.get(first['document_id'])['name'] == 'plan.txt'
+    with pytest.raises(ValueError):
+        ingestor.ingest(' ')
+    with pytest.raises(ValueError):
+        ingestor.ingest('word ' * 6000)
+
+
+def test_async_summaries_run_at_most_concurrency_at_a_time():
+    load = {'running': 0, 'peak': 0}
+
+    class CountingClient(FakeAsyncClient):
+        async def acreate(self, **kwargs):
+            load['running'] += 1
+            load['peak'] = max(load['peak'], load['running'])
+            try:
+                return await super().acreate(**kwargs)
+            finally:
+                load['running'] -= 1
+
+    fake = CountingClient(['- Summary'], delay=0.02)
+    ingestor = DocumentIngestor(DocumentSummary(fake, CONFIG), dict(CONFIG, reduce_tokens=1000))
+
+    result = asyncio.run(ingestor.aingest(business_plan(), 'plan.txt'))
+
+    assert load['peak'] == 2
+    assert len(fake.calls) == result['chunks'] + 1
+
+
+def test_runs_read_the_brief_instead_of_the_document(monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', '')
+    fake = FakeClient(['## Summary\n- Brief: truck models sell at $45'])
+    handler = AgentHandler(client=fake)
+    chain = AgentChain(handler)
+
+    document = handler.ingest_document(business_plan(40), 'plan.txt')
+    calls = len(fake.calls)
+    started = chain.start('', 's1', profile='quick', document_id=document['document_id'])
+    list(handler.events.subscribe(started['run_id']))
+
+    prompt = fake.calls[calls]['messages'][1]['content']
+    assert 'Brief of the submitted document plan.txt' in prompt and 'truck models sell at $45' in prompt
+    assert 'Section 40.' not in prompt
+    with pytest.raises(ValueError):
+        chain.start('Truck models', 's2', document_id='missing')
@@ -0,0 +1,69 @@
+import io
+import sys
+import zipfile
+from pathlib import Path
+from xml.etree import ElementTree
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.export import Exporter, render
+from Agents.run_store import RunStore
+
+FORMATTED = {'sections': [{
+    'title': 'Market (2024)',
+    'content': ['Overlanders spend on gear — and on 3D printed mounts.'],
+    'key_points': [f'Point {i}' for i in range(9)],
+    'metrics': [{'label': 'Market size', 'value': '1.2B', 'unit': 'USD'}]
+}]}
+
+
+def test_pdf_is_well_formed():
+    pdf = render('pdf', 'strategy', FORMATTED)
+
+    assert pdf.startswith(b'%PDF-1.4') and pdf.endswith(b'%%EOF\n')
+    assert b'(Market \\(2024\\)) Tj' in pdf
+    # startxref points at the cross-reference table
+    offset = int(pdf.rsplit(b'startxref\n', 1)[1].split(b'\n')[0])
+    assert pdf[offset:].startswith(b'xref')
+
+
+def test_pptx_splits_long_sections_into_valid_slides():
+    package = zipfile.ZipFile(io.BytesIO(render('pptx', 'deck', FORMATTED)))
+
+    slides = [name for name in package.namelist() if name.startswith('ppt/slides/slide')]
+    # Title slide, then 10 bullets over two slides
+    assert len(slides) == 3
+    for name in package.namelist():
+        ElementTree.fromstring(package.read(name))
+    assert b'Market (2024) (cont.)' in package.read('ppt/slides/slide3.xml')
+
+
+def test_text_and_html_include_metrics():
+    assert '- Market size: 1.2B USD' in render('txt', 'roi', FORMATTED).decode('utf-8')
+    assert '<h1>ROI Analysis</h1>' in render('html', 'roi', FORMATTED).decode('utf-8')
+
+
+def test_bundle_is_built_once_and_cached(tmp_path):
+    runs = RunStore(str(tmp_path / 'runs.sqlite3'))
+    runs.start('run1', 's1', 'idea')
+    for step in ('strategy', 'deck'):
+        runs.record('run1', 'raw_ready', {'step': step, 'raw_result': 'text'})
+        runs.record('run1', 'formatted_ready', {'step': step, 'formatted_result': FORMATTED})
+    runs.record('run1', 'run_complete', {'steps': ['strategy', 'deck'], 'errors': {}})
+    exporter = Exporter(runs, str(tmp_path / 'exports'), workers=2)
+    assert exporter.pool is None  # Started with the first export
+
+    path = exporter.bundle('run1')
+    assert exporter.pool._mp_context.get_start_method() == 'spawn'
+    exporter.pool.shutdown()
+
+    assert exporter.bundle('run1') == path  # Served from disk, the pool is no longer usable
+    names = zipfile.ZipFile(path).namelist()
+    assert len(names) == 8 and 'deck/deck_analysis.pptx' in names
+    assert b''.join(exporter.stream(path)) == Path(path).read_bytes()
+    assert exporter.bundle('missing', 'txt') is None
+    with pytest.raises(ValueError):
+        exporter.bundle('run1', 'docx')
@@ -0,0 +1,54 @@
+import sys
+from pathlib import Path
+
+import pytest
+from openai import OpenAI
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agents.format_handler import FormatHandler
+from Agents.agents.roi_analysis import ROIAnalysis
+from Agents.rate_limiter import RateLimitedClient, RateLimiter
+from benchmarks.fake_openai import LatencyModel
+from benchmarks.run_benchmark import percentile
+from fakes import start_fake_openai
+
+
+@pytest.fixture(scope='module')
+def fake_server():
+    fake, server, base_url = start_fake_openai(latency='fixed:0', errors='429:0.5', seed=3)
+    yield fake, base_url
+    server.should_exit = True
+
+
+def test_replays_samples_through_the_real_sdk(fake_server):
+    fake, base_url = fake_server
+    client = RateLimitedClient(OpenAI(api_key='sk-test', base_url=base_url, max_retries=0), RateLimiter(base_delay=0.01))
+    agent = ROIAnalysis(client)
+
+    assert agent.process({'custom_context': 'idea'}) == (backend_dir / 'data' / 'roi').read_text()
+    assert ''.join(agent.stream({'custom_context': 'idea'})) == (backend_dir / 'data' / 'roi').read_text()
+    # Half the requests get an injected 429, which the limiter retries
+    assert client.limiter.stats()['throttled'] > 0
+
+
+def test_formatting_requests_get_sections(fake_server):
+    fake, base_url = fake_server
+    client = RateLimitedClient(OpenAI(api_key='sk-test', base_url=base_url, max_retries=0), RateLimiter(base_delay=0.01))
+
+    result = FormatHandler(client).format_step((backend_dir / 'data' / 'cost').read_text(), 'llm')
+
+    assert len(result['sections']) > 1
+    assert result['sections'][0]['title'] != 'Error in Formatting'
+
+
+def test_latency_models_and_percentiles():
+    assert LatencyModel('fixed:0.25').sample() == 0.25
+    assert 0.1 <= LatencyModel('uniform:0.1,0.2', seed=1).sample() <= 0.2
+    assert LatencyModel('lognormal:1,0', seed=1).sample() == 1
+    with pytest.raises(ValueError):
+        LatencyModel('normal:1')
+
+    assert percentile([3, 1, 2, 4], 50) == 2
+    assert percentile(list(range(1, 101)), 95) == 95
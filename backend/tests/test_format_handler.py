@@ -0,0 +1,113 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from format_handler import format_analysis, parse_analysis
+from Agents.agents.format_handler import FormatHandler
+from Agents.section_stream import SectionStreamParser, parse_sections
+from fakes import FakeClient
+
+
+def test_flattened_markdown_becomes_sections():
+    text = (backend_dir / 'data' / 'roi').read_text()
+
+    sections = parse_analysis(text)['sections']
+
+    assert [s['title'] for s in sections][:3] == ['1. Investment Analysis', '2. Return Projections', '3. Revenue Projections']
+    revenue = sections[2]
+    assert revenue['key_points'][0] == 'Year 1 Revenue Projection: $100,000'
+    assert revenue['metrics'][0] == {'label': 'Year 1 Revenue Projection', 'value': '100,000', 'unit': 'USD'}
+    assert all(set(s) == {'title', 'content', 'key_points', 'metrics'} for s in sections)
+
+
+def test_numeric_facts_in_prose_and_grouped_bullets():
+    text = (
+        "## Market Size\n"
+        "The market was worth $11.1 billion in 2020, growing at a CAGR of 19.5%.\n"
+        "## Competitors\n"
+        "1. **Competitor A**:\n"
+        "- Market Share: 30%\n"
+    )
+    market, competitors = parse_analysis(text)['sections']
+
+    assert market['content'] == ['The market was worth $11.1 billion in 2020, growing at a CAGR of 19.5%.']
+    assert market['metrics'] == [
+        {'label': 'Market Size', 'value': '11.1 billion', 'unit': 'USD'},
+        {'label': 'Market Size (CAGR)', 'value': '19.5', 'unit': '%'}
+    ]
+    assert competitors['metrics'] == [{'label': 'Competitor A - Market Share', 'value': '30', 'unit': '%'}]
+
+
+def test_unstructured_text_fails_to_parse_but_still_formats():
+    with pytest.raises(ValueError):
+        parse_analysis("Plain prose without any headings.")
+
+    result = format_analysis("Plain prose without any headings.")
+    assert result['sections'][0]['content'] == ['Plain prose without any headings.']
+
+
+def test_llm_is_only_called_for_llm_or_failed_auto_formatting():
+    client = FakeClient(['{"sections": [{"title": "LLM"}]}'])
+    formatter = FormatHandler(client)
+
+    assert formatter.format_step("## Title\n- point", 'auto')['sections'][0]['title'] == 'Title'
+    formatter.format_step("Plain prose", 'local')
+    assert client.calls == []
+
+    assert formatter.format_step("Plain prose", 'auto')['sections'][0]['title'] == 'LLM'
+    assert formatter.format_step("## Title\n- point", 'llm')['sections'][0]['title'] == 'LLM'
+    assert len(client.calls) == 2
+
+
+def test_sections_are_emitted_as_soon_as_they_close():
+    reply = '{"sections": [{"title": "A", "content": "one"}, {"title": "B", "key_points": ["x"]}]}'
+    parser = SectionStreamParser()
+
+    emitted = []
+    for i in range(0, len(reply), 4):
+        emitted.append([section['title'] for section in parser.feed(reply[i:i + 4])])
+
+    titles = [title for batch in emitted for title in batch]
+    assert titles == ['A', 'B']
+    # A is out before B has finished streaming
+    assert emitted.index(['A']) < len(emitted) - 2
+    assert parser.done
+
+
+def test_bad_and_truncated_sections_do_not_lose_the_rest():
+    reply = (
+        '{"sections": [{"title": "A", "content": ["a",],}, {"title": "B" "oops"}, '
+        '{"title": "C", "metrics": [{"label": "Share", "value": 30, "unit": "%"}], "key_points": ["c1", "c'
+    )
+
+    sections = parse_sections(reply)['sections']
+
+    assert [s['title'] for s in sections] == ['A', 'C']
+    assert sections[0]['content'] == ['a']
+    assert sections[1]['metrics'] == [{'label': 'Share', 'value': '30', 'unit': '%'}]
+    assert sections[1]['key_points'] == ['c1', 'c']
+
+
+def test_local_formatting_repairs_replies_already_in_sections_json():
+    client = FakeClient(['{"sections": []}'])
+    reply = '{"sections": [{"title": "A", "content": ["a",],}, {"title": "B", "key_points": ["b1", "b'
+
+    for formatter in ('local', 'auto'):
+        sections = FormatHandler(client).format_step(reply, formatter)['sections']
+        assert [s['title'] for s in sections] == ['A', 'B'] and sections[1]['key_points'] == ['b1', 'b']
+    assert client.calls == []
+
+
+def test_llm_formatting_streams_sections_to_callback():
+    client = FakeClient(['{"sections": [{"title": "A"}', ', {"title": "B"}', ']}'])
+    seen = []
+
+    result = FormatHandler(client).format_step("text", 'llm', seen.append)
+
+    assert [s['title'] for s in seen] == ['A', 'B']
+    assert result == {'sections': seen}
+    assert client.calls[0]['stream'] is True
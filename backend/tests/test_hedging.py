@@ -0,0 +1,127 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agents.roi_analysis import ROIAnalysis
+from Agents.hedging import AsyncHedgedClient, HedgedClient, HedgePolicy
+from Agents.llm_cache import CachedClient, ResponseCache
+from Agents.metrics import MeteredClient, Metrics
+from Agents.rate_limiter import AsyncRateLimitedClient, RateLimitedClient, RateLimiter
+from fakes import FakeAsyncClient, FakeClient
+
+REQUEST = {'model': 'gpt-4', 'messages': [{'role': 'user', 'content': 'Overland 3D models'}]}
+
+
+class SlowModelClient(FakeClient):
+    """Answers gpt-4 slowly and every other model at once, naming the model that answered"""
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        time.sleep(0.5 if kwargs['model'] == 'gpt-4' else 0)
+        return FakeClient([kwargs['model']]).create(**kwargs)
+
+
+class AsyncSlowModelClient(FakeAsyncClient):
+    async def acreate(self, **kwargs):
+        self.calls.append(kwargs)
+        await asyncio.sleep(0.5 if kwargs['model'] == 'gpt-4' else 0)
+        return FakeClient([kwargs['model']]).create(**kwargs)
+
+
+def primed(client_class, inner, metrics, max_ratio=1.0, limiter=None):
+    client = client_class(inner, metrics, 'roi', HedgePolicy(min_samples=5, max_ratio=max_ratio), 'gpt-4o-mini', limiter)
+    client.latencies.extend([0.01] * 5)
+    return client
+
+
+def test_agents_take_model_and_temperature_from_config():
+    fake = FakeClient(['ROI is 20%'])
+    ROIAnalysis(fake, {'model': 'gpt-4o', 'temperature': 0.2}).process({'custom_context': 'idea'})
+
+    assert fake.calls[0]['model'] == 'gpt-4o'
+    assert fake.calls[0]['temperature'] == 0.2
+
+
+def test_slow_call_is_hedged_to_the_fallback_model():
+    metrics = Metrics()
+    client = primed(HedgedClient, SlowModelClient([]), metrics)
+
+    start = time.monotonic()
+    response = client.chat.completions.create(**REQUEST)
+
+    assert response.choices[0].message.content == 'gpt-4o-mini'
+    assert time.monotonic() - start < 0.3
+    assert response.answered_by == 'gpt-4o-mini'
+    assert 'llm_hedges_total{step="roi",model="gpt-4o-mini",winner="hedge"} 1' in metrics.render()
+
+
+def test_fallback_answers_are_priced_as_the_fallback_and_not_cached(tmp_path):
+    metrics = Metrics()
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    client = MeteredClient(CachedClient(primed(HedgedClient, SlowModelClient([]), metrics), cache), metrics, 'roi')
+
+    client.chat.completions.create(**REQUEST)
+    text = metrics.render()
+
+    assert cache.stats()['entries'] == 0
+    assert 'llm_calls_total{step="roi",model="gpt-4o-mini"} 1' in text
+    assert 'model="gpt-4"}' not in text
+
+
+def test_hedges_are_capped_and_skipped_without_history():
+    fake = SlowModelClient([])
+    client = primed(HedgedClient, fake, Metrics(), max_ratio=0.3)
+
+    client.chat.completions.create(**REQUEST)
+    # One hedge in three calls is over the cap
+    client.chat.completions.create(**dict(REQUEST, model='gpt-4o'))
+    assert client.threshold() is None
+    assert HedgedClient(fake, Metrics(), 'roi', HedgePolicy()).threshold() is None
+
+
+def test_async_loser_is_cancelled_and_releases_its_slot():
+    limiter = RateLimiter()
+    inner = AsyncRateLimitedClient(AsyncSlowModelClient([]), limiter)
+    client = primed(AsyncHedgedClient, inner, Metrics())
+
+    async def scenario():
+        response = await client.chat.completions.create(**REQUEST)
+        await asyncio.sleep(0)  # Let the cancelled call unwind
+        return response
+
+    start = time.monotonic()
+    assert asyncio.run(scenario()).choices[0].message.content == 'gpt-4o-mini'
+    assert time.monotonic() - start < 0.3
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_time_queued_in_the_limiter_neither_hedges_nor_counts_as_latency():
+    limiter = RateLimiter(max_concurrency=1)
+    fake = FakeClient(['fast'])
+    metrics = Metrics()
+    client = primed(HedgedClient, RateLimitedClient(fake, limiter), metrics, limiter=limiter)
+    limiter.acquire(0)  # Another call holds the only slot for a while
+    threading.Timer(0.3, limiter.release, (0,)).start()
+
+    response = client.chat.completions.create(**REQUEST)
+
+    assert response.choices[0].message.content == 'fast' and len(fake.calls) == 1
+    assert 'llm_hedges_total{' not in metrics.render()
+    assert client.latencies[-1] < 0.1
+
+
+def test_nothing_is_hedged_while_the_limiter_is_throttling():
+    limiter = RateLimiter(max_concurrency=4)
+    limiter.concurrency = 2  # Halved by a 429
+    fake = SlowModelClient([])
+    client = primed(HedgedClient, RateLimitedClient(fake, limiter), Metrics(), limiter=limiter)
+
+    response = client.chat.completions.create(**REQUEST)
+
+    assert response.choices[0].message.content == 'gpt-4'
+    assert [call['model'] for call in fake.calls] == ['gpt-4']
@@ -0,0 +1,134 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agent_handler import AgentHandler
+from Agents.agents.agent_chain import AgentChain
+from Agents.job_queue import JobQueue
+from Agents.queued_handler import QueuedAgentHandler
+from Agents.worker import Worker
+from fakes import FakeClient
+
+
+@pytest.fixture
+def paths(monkeypatch, tmp_path):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    monkeypatch.setenv('EXPORT_CACHE_PATH', str(tmp_path / 'exports'))
+    monkeypatch.setenv('JOB_QUEUE_PATH', str(tmp_path / 'jobs.sqlite3'))
+    return tmp_path
+
+
+def test_claims_are_leased_and_expired_leases_reclaimed(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=2)
+    job_id = queue.enqueue('run', {'run_id': 'r1'})
+
+    job = queue.claim('w1', lease=0.05)
+    assert job['payload'] == {'run_id': 'r1'} and job['attempts'] == 1
+    assert queue.claim('w2') is None
+    time.sleep(0.1)
+
+    # w1 stopped heartbeating, so w2 takes the job over
+    assert queue.claim('w2')['attempts'] == 2
+    assert not queue.heartbeat(job_id, 'w1')
+    assert not queue.complete(job_id, 'w1')
+    assert queue.heartbeat(job_id, 'w2')
+    assert queue.fail(job_id, 'w2', 'boom') == 'failed'
+    assert queue.stats() == {'queued': 0, 'running': 0, 'done': 0, 'failed': 1}
+
+
+def test_failed_jobs_are_requeued_until_out_of_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=2)
+    job_id = queue.enqueue('run', {})
+
+    queue.claim('w1')
+    assert queue.fail(job_id, 'w1', 'boom') == 'queued'
+    queue.claim('w1')
+    assert queue.complete(job_id, 'w1', {'steps': []})
+    assert queue.get(job_id)['status'] == 'done'
+
+
+def test_concurrent_claims_never_share_a_job(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.sqlite3'))
+    for i in range(20):
+        queue.enqueue('run', {'i': i})
+    # A second connection to the same file, as another process would have
+    other = JobQueue(str(tmp_path / 'jobs.sqlite3'))
+    claimed = []
+
+    def drain(q, worker_id):
+        while (job := q.claim(worker_id)) is not None:
+            claimed.append(job['job_id'])
+
+    threads = [threading.Thread(target=drain, args=(q, f'w{i}')) for i, q in enumerate([queue, other, queue, other])]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == len(set(claimed)) == 20
+
+
+def test_web_handler_serves_results_computed_by_a_worker(paths):
+    web = QueuedAgentHandler(JobQueue.from_env())
+    started = AgentChain(web).start('Overland 3D models', 's1')
+    assert web.get_formatted_result('strategy', 's1') == {'status': 'processing'}
+
+    fake = FakeClient(['## Summary\n- Revenue: $1,000'])
+    worker = Worker(AgentHandler(client=fake), JobQueue.from_env(), poll=0.05)
+    assert worker.run_once()
+
+    result = web.process_request('roi', {'session_id': 's1'})
+    assert result['precomputed'] is True and result['raw_result'].startswith('## Summary')
+    assert len(fake.calls) == len(web.agents)
+    assert web.get_formatted_result('roi', 's1')['status'] == 'complete'
+    status = AgentChain(web).status(started['run_id'])
+    assert status['status'] == 'complete'
+    assert set(status['steps'].values()) == {'complete'}
+    events = list(web.events.subscribe(started['run_id']))
+    assert events[-1]['event'] == 'run_complete'
+    assert web.queue.stats()['done'] == 1
+
+
+def test_cancelled_runs_are_skipped_or_stopped_by_their_worker(paths):
+    web = QueuedAgentHandler(JobQueue.from_env())
+    chain = AgentChain(web)
+    first = chain.start('Overland 3D models', 's1')['run_id']
+    second = chain.start('Drone mapping', 's1', profile='quick')['run_id']
+    assert web.runs.get(first)['status'] == 'cancelled'
+
+    gate = threading.Event()
+
+    class SlowClient(FakeClient):
+        def create(self, **kwargs):
+            gate.wait(5)
+            return super().create(**kwargs)
+
+    fake = SlowClient(['## Summary\n- Revenue: $1,000'])
+    worker = Worker(AgentHandler(client=fake), JobQueue.from_env(), concurrency=1, poll=0.05)
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    while not web.runs.get(second)['steps']:
+        time.sleep(0.02)
+    assert web.cancel_run(second) is True
+
+    events = [event['event'] for event in web.events.subscribe(second) if event]
+    # The worker notices within its poll interval and finishes the job while strategy's call is still in flight
+    while web.queue.stats()['done'] < 2:
+        time.sleep(0.02)
+    gate.set()
+    worker.stop()
+    thread.join(2)
+
+    # The superseded run never reached the model, the cancelled one stopped after its first call
+    assert len(fake.calls) == 1
+    assert events[-1] == 'run_cancelled' and events.count('run_cancelled') == 1
+    assert web.runs.get(second)['status'] == 'cancelled'
+    with pytest.raises(ValueError):
+        web.cancel_run(second)
@@ -0,0 +1,95 @@
+import asyncio
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agents.roi_analysis import ROIAnalysis
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.cancellation import RunCancelled
+from Agents.llm_cache import CachedClient, ResponseCache
+from Agents.metrics import MeteredClient, Metrics
+from fakes import FakeAsyncClient, FakeClient
+
+
+class UsageClient(FakeClient):
+    """FakeClient whose completions report token usage like the real API"""
+
+    def create(self, **kwargs):
+        response = super().create(**kwargs)
+        if not kwargs.get('stream'):
+            response.usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=500, total_tokens=1500)
+        return response
+
+
+def test_agent_calls_are_recorded_by_step_and_model():
+    metrics = Metrics()
+    agent = ROIAnalysis(MeteredClient(UsageClient(['ROI is 20%']), metrics, 'roi'))
+
+    agent.process({'custom_context': 'Overland 3D models'})
+    text = metrics.render()
+
+    assert 'llm_tokens_total{step="roi",model="gpt-3.5-turbo",kind="prompt"} 1000' in text
+    assert 'llm_tokens_total{step="roi",model="gpt-3.5-turbo",kind="completion"} 500' in text
+    assert 'llm_cost_usd_total{step="roi",model="gpt-3.5-turbo"} 0.00125' in text
+    assert 'llm_latency_seconds_bucket{step="roi",model="gpt-3.5-turbo",le="+Inf"} 1' in text
+    assert 'llm_latency_seconds_count{step="roi",model="gpt-3.5-turbo"} 1' in text
+
+
+def test_cache_hits_and_errors_are_counted(tmp_path):
+    metrics = Metrics()
+    cached = CachedClient(FakeClient(['Answer']), ResponseCache(str(tmp_path / 'cache.sqlite3')))
+    agent = ROIAnalysis(MeteredClient(cached, metrics, 'roi'))
+    agent.process({})
+    agent.process({})
+
+    failing = ROIAnalysis(MeteredClient(None, metrics, 'roi'))
+    with pytest.raises(AttributeError):
+        failing.process({})
+
+    text = metrics.render()
+    assert 'llm_calls_total{step="roi",model="gpt-3.5-turbo"} 3' in text
+    assert 'llm_cache_hits_total{step="roi",model="gpt-3.5-turbo"} 1' in text
+    assert 'llm_errors_total{step="roi",model="gpt-3.5-turbo"} 1' in text
+
+
+def test_abandoned_streams_are_recorded_and_cancellations_are_not_errors():
+    metrics = Metrics()
+    request = {'model': 'gpt-4', 'messages': [{'role': 'user', 'content': 'idea'}], 'stream': True}
+    stream = MeteredClient(FakeClient(['Market ', 'size ', 'is $1B']), metrics, 'roi').chat.completions.create(**request)
+    next(stream)
+    stream.close()  # e.g. the client disconnected
+
+    class CancelledClient(FakeClient):
+        def create(self, **kwargs):
+            raise RunCancelled("Cancelled by the client")
+
+    with pytest.raises(RunCancelled):
+        MeteredClient(CancelledClient([]), metrics, 'roi').chat.completions.create(**dict(request, stream=False))
+    text = metrics.render()
+
+    assert 'llm_calls_total{step="roi",model="gpt-4"} 1' in text
+    assert 'llm_tokens_total{step="roi",model="gpt-4",kind="completion"} 1' in text
+    assert 'llm_errors_total' not in text.replace('# HELP llm_errors_total', '').replace('# TYPE llm_errors_total', '')
+
+
+def test_handler_exposes_step_and_format_metrics(monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', '')
+    handler = AsyncAgentHandler(client=FakeAsyncClient(['## Summary\n- Revenue: $1,000']))
+
+    async def scenario():
+        pieces = [piece async for piece in handler.stream_request('strategy', {'session_id': 's1', 'custom_context': 'idea'})]
+        await asyncio.gather(*handler.contexts.get('s1').formatting_tasks.values())
+        return pieces
+
+    asyncio.run(scenario())
+    text = handler.metrics.render()
+
+    assert 'llm_queue_wait_seconds_count{step="strategy",model="gpt-3.5-turbo"} 1' in text
+    assert 'format_seconds_count{step="strategy",formatter="local"} 1' in text
+    assert '# TYPE llm_concurrency_limit gauge' in text
@@ -0,0 +1,118 @@
+import importlib
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from starlette.testclient import TestClient
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.job_queue import JobQueue
+from Agents.run_store import RunStore
+
+ROI = {'sections': [{'title': 'Payback', 'content': ['Payback: 18 months']}]}
+
+
+class Client:
+    """The same requests against app.py or asgi_app.py, answering (status, json)"""
+
+    def __init__(self, module):
+        self.module = module
+        self.client = module.app.test_client() if module.__name__ == 'app' else TestClient(module.app)
+
+    def get(self, path):
+        return self._result(self.client.get(path))
+
+    def post(self, path, **kwargs):
+        return self._result(self.client.post(path, **kwargs))
+
+    @staticmethod
+    def _result(response):
+        return response.status_code, response.get_json() if hasattr(response, 'get_json') else response.json()
+
+
+@pytest.fixture(params=['app', 'asgi_app'])
+def client(request, monkeypatch, tmp_path):
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    monkeypatch.setenv('EXPORT_CACHE_PATH', str(tmp_path / 'exports'))
+    monkeypatch.setenv('JOB_QUEUE_PATH', str(tmp_path / 'jobs.sqlite3'))
+    monkeypatch.setenv('JOB_MAX_ATTEMPTS', '1')
+    monkeypatch.setenv('JOB_ANSWER_TIMEOUT_SECONDS', '0.3')
+    sys.modules.pop(request.param, None)
+    return Client(importlib.import_module(request.param))
+
+
+def failing_worker(stop):
+    """Fails every job it claims, as a worker whose provider is down would"""
+    queue = JobQueue.from_env()
+    while not stop.is_set():
+        job = queue.claim('w1')
+        if job:
+            queue.fail(job['job_id'], 'w1', 'provider down')
+        stop.wait(0.02)
+
+
+@pytest.fixture
+def worker_down():
+    stop = threading.Event()
+    thread = threading.Thread(target=failing_worker, args=(stop,), daemon=True)
+    thread.start()
+    yield
+    stop.set()
+    thread.join(1)
+
+
+@pytest.fixture
+def run_id(client):
+    runs = RunStore.from_env()
+    runs.start('run1', 's1', 'Overland 3D models')
+    runs.record('run1', 'raw_ready', {'step': 'roi', 'raw_result': 'text'})
+    runs.record('run1', 'formatted_ready', {'step': 'roi', 'formatted_result': ROI})
+    runs.record('run1', 'run_complete', {'steps': ['roi'], 'errors': {}})
+    return 'run1'
+
+
+def test_ask_times_out_with_504_when_no_worker_answers(client, run_id):
+    status, body = client.post(f'/runs/{run_id}/ask', json={'question': 'What is the payback period?'})
+
+    assert status == 504 and 'in time' in body['error']
+
+
+def test_ask_answers_502_when_the_job_fails(client, run_id, worker_down):
+    status, body = client.post(f'/runs/{run_id}/ask', json={'question': 'What is the payback period?'})
+
+    assert status == 502 and 'provider down' in body['error']
+
+
+def test_documents_are_queued_and_a_failed_job_answers_502(client, worker_down):
+    status, queued = client.post('/documents', json={'text': 'Revenue grew 20% in 2024.', 'name': 'plan.txt'})
+    assert status == 202 and queued['status'] == 'processing'
+
+    while (result := client.get(f"/documents/jobs/{queued['job_id']}"))[0] == 202:
+        time.sleep(0.02)
+    status, body = result
+
+    assert status == 502 and 'provider down' in body['error']
+    assert client.get('/documents/jobs/missing')[0] == 404
+
+
+def test_malformed_last_event_id_streams_from_the_start(client, run_id):
+    response = client.client.get(f'/runs/{run_id}/events', headers={'Last-Event-ID': 'abc'})
+    body = response.get_data(as_text=True) if hasattr(response, 'get_data') else response.text
+
+    assert response.status_code == 200
+    assert body.startswith('id: 1\nevent: raw_ready')
+
+
+def test_streaming_a_step_the_run_did_not_produce_answers_400(client, run_id):
+    RunStore.from_env().save_session('s1', 'Overland 3D models', run_id)
+
+    status, body = client.post('/process/strategy/stream', json={'session_id': 's1'})
+    assert status == 400 and 'without this step' in body['error']
+
+    response = client.client.post('/process/roi/stream', json={'session_id': 's1'})
+    assert response.status_code == 200
+    assert (response.get_data(as_text=True) if hasattr(response, 'get_data') else response.text) == 'text'
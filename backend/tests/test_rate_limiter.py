@@ -0,0 +1,131 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.rate_limiter import AsyncRateLimitedClient, RateLimitedClient, RateLimiter, TokenBucket
+from fakes import FakeAsyncClient, FakeClient
+
+REQUEST = {'model': 'gpt-3.5-turbo', 'messages': [{'role': 'user', 'content': 'Overland 3D models'}]}
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers=headers or {})
+
+
+class FlakyClient(FakeClient):
+    """Raises the given errors before answering normally"""
+
+    def __init__(self, pieces, errors):
+        super().__init__(pieces)
+        self.errors = list(errors)
+
+    def create(self, **kwargs):
+        if self.errors:
+            self.calls.append(kwargs)
+            raise self.errors.pop(0)
+        return super().create(**kwargs)
+
+
+def test_throttled_call_honours_retry_after_and_halves_concurrency():
+    limiter = RateLimiter(max_concurrency=8, base_delay=0.001)
+    client = RateLimitedClient(FlakyClient(['ok'], [StatusError(429, {'retry-after-ms': '50'})]), limiter)
+
+    start = time.monotonic()
+    response = client.chat.completions.create(**REQUEST)
+
+    assert response.choices[0].message.content == 'ok'
+    assert time.monotonic() - start >= 0.05
+    assert limiter.stats() == {'concurrency_limit': 4, 'in_flight': 0, 'throttled': 1, 'retries': 1}
+
+
+def test_client_errors_are_not_retried():
+    limiter = RateLimiter()
+    client = RateLimitedClient(FlakyClient(['ok'], [StatusError(400)]), limiter)
+
+    with pytest.raises(StatusError):
+        client.chat.completions.create(**REQUEST)
+    assert limiter.stats()['retries'] == 0
+    assert limiter.stats()['in_flight'] == 0
+
+
+def test_server_errors_give_up_after_max_retries():
+    limiter = RateLimiter(max_retries=2, base_delay=0.001)
+    fake = FlakyClient(['ok'], [StatusError(503)] * 3)
+
+    with pytest.raises(StatusError):
+        RateLimitedClient(fake, limiter).chat.completions.create(**REQUEST)
+    assert len(fake.calls) == 3
+
+
+def test_token_bucket_makes_callers_wait_for_refill():
+    bucket = TokenBucket(600)  # 10 per second
+
+    assert bucket.reserve(600) == 0
+    assert bucket.reserve(5) == pytest.approx(0.5, abs=0.05)
+    bucket.adjust(-5)  # The call turned out to use 5 fewer tokens
+    assert bucket.reserve(1) == pytest.approx(0.1, abs=0.05)
+
+
+def test_concurrency_recovers_additively():
+    limiter = RateLimiter(max_concurrency=4)
+    limiter.concurrency = 2.0
+    for _ in range(4):
+        limiter.acquire(1)
+        limiter.release(1, used=1, succeeded=True)
+
+    assert limiter.stats()['concurrency_limit'] == 3
+
+
+def test_failed_calls_do_not_grow_concurrency():
+    limiter = RateLimiter(max_concurrency=8, max_retries=2, base_delay=0.001)
+    limiter.concurrency = 2.0
+
+    with pytest.raises(StatusError):
+        RateLimitedClient(FlakyClient(['ok'], [StatusError(503)] * 3), limiter).chat.completions.create(**REQUEST)
+    limiter.acquire(1)
+    limiter.release(1)  # e.g. a cancelled call
+
+    assert limiter.concurrency == 2.0
+    assert limiter.stats()['retries'] == 2
+
+
+def test_async_waiter_wakes_as_soon_as_a_slot_is_released():
+    limiter = RateLimiter(max_concurrency=1, rpm=0, tpm=0)
+
+    async def scenario():
+        limiter.acquire(1)
+        waiting = asyncio.create_task(limiter.aacquire(1))
+        await asyncio.sleep(0.01)
+        assert not waiting.done()
+        start = time.monotonic()
+        limiter.release(1, succeeded=True)
+        await waiting
+        return time.monotonic() - start
+
+    assert asyncio.run(scenario()) < 0.01
+    assert limiter.stats()['in_flight'] == 1
+
+
+def test_async_stream_settles_usage_and_releases_slot():
+    limiter = RateLimiter(tpm=100000)
+    client = AsyncRateLimitedClient(FakeAsyncClient(['Market ', 'is growing']), limiter)
+
+    async def scenario():
+        stream = await client.chat.completions.create(stream=True, **REQUEST)
+        assert limiter.stats()['in_flight'] == 1
+        return [chunk.choices[0].delta.content async for chunk in stream]
+
+    assert asyncio.run(scenario())[:2] == ['Market ', 'is growing']
+    assert limiter.stats()['in_flight'] == 0
+    # Only the prompt and the short reply stay charged, not the 500 token completion estimate
+    assert limiter.tokens.level > limiter.tokens.capacity - 50
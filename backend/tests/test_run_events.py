@@ -0,0 +1,111 @@
+import asyncio
+import sys
+import threading
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agent_handler import AgentHandler
+from Agents.run_events import RunEvents, StoredRunEvents
+from fakes import FakeClient
+
+
+def test_subscriber_replays_and_follows_until_closed():
+    events = RunEvents()
+    events.open('run1')
+    events.publish('run1', 'step_started', {'step': 'strategy'})
+
+    def finish():
+        events.publish('run1', 'raw_ready', {'step': 'strategy', 'raw_result': 'text'})
+        events.close('run1')
+
+    threading.Timer(0.05, finish).start()
+    received = [event['event'] for event in events.subscribe('run1') if event]
+
+    assert received == ['step_started', 'raw_ready']
+
+
+def test_resume_from_last_event_id():
+    events = RunEvents()
+    events.open('run1')
+    for step in ['strategy', 'competitors', 'cost']:
+        events.publish('run1', 'formatted_ready', {'step': step})
+    events.close('run1')
+
+    received = [event['data']['step'] for event in events.subscribe('run1', last_event_id=1)]
+
+    assert received == ['competitors', 'cost']
+
+
+def test_heartbeat_while_idle_and_unknown_runs():
+    events = RunEvents(heartbeat=0.01)
+    events.open('run1')
+
+    assert next(events.subscribe('run1')) is None
+    assert list(events.subscribe('missing')) == []
+    assert RunEvents.format_sse(None) == ": keep-alive\n\n"
+
+
+def test_format_sse_and_oldest_runs_are_forgotten():
+    events = RunEvents(max_runs=2)
+    for run_id in ['run1', 'run2', 'run3']:
+        events.open(run_id)
+    events.publish('run3', 'error', {'step': 'roi', 'error': 'boom'})
+
+    assert not events.exists('run1')
+    event = next(events.subscribe('run3'))
+    assert RunEvents.format_sse(event) == 'id: 1\nevent: error\ndata: {"step": "roi", "error": "boom"}\n\n'
+
+
+def test_malformed_last_event_id_replays_everything():
+    assert RunEvents.last_event_id('3') == 3
+    assert RunEvents.last_event_id(None) == 0
+    assert RunEvents.last_event_id('abc') == 0
+    assert RunEvents.last_event_id('-2') == 0
+
+
+def test_every_formatted_result_reaches_the_stream_before_it_closes(monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', '')
+    handler = AgentHandler(client=FakeClient(['## Summary\n- Revenue: $1,000']))
+    publish = handler._publish_formatted
+
+    def slow_publish(*args, **kwargs):
+        time.sleep(0.05)
+        publish(*args, **kwargs)
+
+    monkeypatch.setattr(handler, '_publish_formatted', slow_publish)
+    handler.submit_context('s1', 'Overland 3D models')
+    run_id = handler.start_run({'session_id': 's1'})
+    events = [event['event'] for event in handler.events.subscribe(run_id) if event]
+
+    assert events.count('formatted_ready') == len(handler.agents)
+    assert events[-1] == 'run_complete'
+
+
+def test_stored_events_are_read_off_the_event_loop():
+    class SlowStore:
+        def events_after(self, run_id, position=0):
+            time.sleep(0.1)
+            return [{'id': 1, 'event': 'run_complete', 'data': {}}][position:], True
+
+    async def scenario():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        received = [event['event'] async for event in StoredRunEvents(SlowStore()).asubscribe('run1')]
+        ticker.cancel()
+        return received, ticks
+
+    received, ticks = asyncio.run(scenario())
+
+    assert received == ['run_complete']
+    assert ticks >= 5  # Two 0.1s reads, neither holding up the loop
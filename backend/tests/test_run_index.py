@@ -0,0 +1,83 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.run_index import RunIndex, RunIndexes, section_chunks
+from Agents.run_store import RunStore
+from fakes import FakeAsyncClient
+
+
+def formatted(*sections):
+    return {'sections': [{'title': title, 'content': [text], 'key_points': [], 'metrics': []} for title, text in sections]}
+
+
+ROI = formatted(('Payback Period', 'The investment pays back in 18 months.'),
+                ('Risks', 'Supplier concentration is the main risk.'))
+COST = formatted(('Startup Costs', 'Printers and filament cost $40,000 up front.'))
+
+
+def test_best_chunks_rank_first_and_steps_are_replaced():
+    index = RunIndex()
+    index.add('roi', ROI)
+    index.add('cost', COST)
+
+    hits = index.search('When does the investment pay back?', k=2)
+    assert hits[0]['title'] == 'Payback Period' and hits[0]['step'] == 'roi'
+    assert index.search('startup costs')[0]['step'] == 'cost'
+    assert index.search('blockchain') == []
+
+    index.add('cost', formatted(('Operating Costs', 'Rent is $2,000 a month.')))
+    assert [hit['title'] for hit in index.search('costs')] == ['Operating Costs']
+
+
+def test_long_sections_are_split_with_their_title():
+    section = {'title': 'Market', 'content': ['word ' * 100, 'more ' * 100], 'key_points': ['Growing'],
+               'metrics': [{'label': 'Size', 'value': '1.2B', 'unit': 'USD'}]}
+    chunks = section_chunks('strategy', {'sections': [section]})
+
+    assert len(chunks) == 2
+    assert all(chunk['title'] == 'Market' for chunk in chunks)
+    assert chunks[1]['text'].endswith('- Size: 1.2B USD')
+
+
+def test_index_is_loaded_from_the_store_and_refreshed_while_running(tmp_path):
+    runs = RunStore(str(tmp_path / 'runs.sqlite3'))
+    runs.start('run1', 's1', 'idea')
+    runs.record('run1', 'raw_ready', {'step': 'roi', 'raw_result': 'text'})
+    runs.record('run1', 'formatted_ready', {'step': 'roi', 'formatted_result': ROI})
+    indexes = RunIndexes(runs)
+
+    assert indexes.search('run1', 'payback')[0][0]['step'] == 'roi'
+    runs.record('run1', 'raw_ready', {'step': 'cost', 'raw_result': 'text'})
+    runs.record('run1', 'formatted_ready', {'step': 'cost', 'formatted_result': COST})
+    assert indexes.search('run1', 'filament')[0][0]['step'] == 'cost'
+    assert indexes.search('missing', 'payback') is None
+    with pytest.raises(ValueError):
+        indexes.search('run1', ' ')
+
+
+def test_ask_sends_only_the_top_chunks(monkeypatch, tmp_path):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    fake = FakeAsyncClient(['## Payback\n- Payback: 18 months\n\n## Risks\n- Supplier risk'])
+    handler = AsyncAgentHandler(client=fake)
+
+    async def scenario():
+        handler.submit_context('s1', 'Overland 3D models')
+        run_id = handler.start_run({'session_id': 's1'})
+        await asyncio.gather(*handler.background_runs)
+        calls = len(fake.calls)
+        return await handler.ask(run_id, 'What is the payback period?', 2), calls
+
+    result, calls = asyncio.run(scenario())
+
+    assert len(fake.calls) == calls + 1
+    assert len(result['sources']) == 2 and result['search_ms'] < 50
+    prompt = fake.calls[-1]['messages'][1]['content']
+    assert '[1]' in prompt and '[3]' not in prompt
@@ -0,0 +1,116 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agents.agent_chain import AgentChain
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.run_store import RunStore
+from fakes import FakeAsyncClient
+
+
+def test_records_run_events(tmp_path):
+    store = RunStore(str(tmp_path / 'runs.sqlite3'))
+    store.start('run1', 's1', 'Overland 3D models')
+    store.record('run1', 'step_started', {'step': 'strategy'})
+    store.record('run1', 'raw_ready', {'step': 'strategy', 'raw_result': 'text'})
+    store.record('run1', 'section_ready', {'step': 'strategy', 'index': 0, 'section': {}})
+    store.record('run1', 'formatted_ready', {'step': 'strategy', 'formatted_result': {'sections': []}})
+    store.record('run1', 'error', {'step': 'roi', 'error': 'boom'})
+    store.record('run1', 'run_complete', {'steps': ['strategy'], 'errors': {'roi': 'boom'}})
+
+    run = store.get('run1')
+
+    assert run['status'] == 'failed'
+    assert run['errors'] == {'roi': 'boom'}
+    assert run['steps']['strategy']['formatted_result'] == {'sections': []}
+    assert run['steps']['strategy']['seconds'] >= 0
+    assert run['steps']['roi']['status'] == 'failed'
+    assert store.get('missing') is None
+    # Failed runs are never reused
+    assert store.latest_complete('Overland 3D models') is None
+
+
+def test_restart_drops_the_earlier_attempt(tmp_path):
+    store = RunStore(str(tmp_path / 'runs.sqlite3'))
+    store.start('run1', 's1', 'Overland 3D models')
+    store.record('run1', 'step_started', {'step': 'strategy'})
+    store.record('run1', 'raw_ready', {'step': 'strategy', 'raw_result': 'text'})
+    store.record('run1', 'error', {'step': 'roi', 'error': 'worker died'})
+
+    store.restart('run1', 's1', 'Overland 3D models')
+    store.record('run1', 'step_started', {'step': 'strategy'})
+
+    events, ended = store.events_after('run1', 2)
+    assert store.get('run1')['steps'].keys() == {'strategy'}
+    assert store.get('run1')['steps']['strategy']['raw_result'] is None
+    # Followers that had read the first attempt's events carry on with the new attempt
+    assert [(e['id'], e['event']) for e in events] == [(4, 'run_restarted'), (5, 'step_started')] and not ended
+    assert [e['event'] for e in store.events_after('run1')[0]] == ['run_restarted', 'step_started']
+
+
+def test_list_pages_newest_first_and_filters_by_concept(tmp_path):
+    store = RunStore(str(tmp_path / 'runs.sqlite3'))
+    for i, concept in enumerate(['A', 'B', 'a ']):
+        store.start(f'run{i}', 's1', concept)
+
+    first = store.list(limit=2)
+    assert [run['run_id'] for run in first] == ['run2', 'run1']
+    assert [run['run_id'] for run in store.list(before=first[-1]['created_at'])] == ['run0']
+    assert [run['run_id'] for run in store.list(concept='a')] == ['run2', 'run0']
+
+
+def test_compact_keeps_newest_runs(tmp_path):
+    store = RunStore(str(tmp_path / 'runs.sqlite3'), max_runs=2)
+    for i in range(3):
+        store.start(f'run{i}', 's1', 'idea')
+        store.record(f'run{i}', 'raw_ready', {'step': 'strategy', 'raw_result': 'text'})
+        store.record(f'run{i}', 'run_complete', {'steps': ['strategy'], 'errors': {}})
+        time.sleep(0.001)
+
+    assert store.compact() == 1
+    assert store.get('run0') is None
+    assert store.db.execute("SELECT COUNT(*) FROM run_steps").fetchone()[0] == 2
+
+
+def test_compact_keeps_running_runs(tmp_path):
+    store = RunStore(str(tmp_path / 'runs.sqlite3'), max_runs=1, retention_days=0)
+    store.start('queued', 's1', 'idea')
+    store.record('queued', 'step_started', {'step': 'strategy'})
+    time.sleep(0.001)
+    store.start('done', 's1', 'idea')
+    store.record('done', 'run_complete', {'steps': [], 'errors': {}})
+    time.sleep(0.001)
+
+    assert store.compact() == 1
+    assert store.get('done') is None
+    assert store.get('queued')['status'] == 'running'
+    assert store.db.execute("SELECT COUNT(*) FROM run_steps").fetchone()[0] == 1
+
+
+def test_completed_run_is_reused_by_a_new_process(tmp_path, monkeypatch):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+
+    async def run(handler, concept):
+        chain = AgentChain(handler)
+        started = chain.start(concept)
+        await asyncio.gather(*handler.background_runs)
+        return started, chain.status(started['run_id'])
+
+    first_fake = FakeAsyncClient(['## Summary\n- Revenue: $1,000'])
+    first, _ = asyncio.run(run(AsyncAgentHandler(client=first_fake), 'Overland 3D models'))
+
+    # A restarted server has an empty event log and no sessions
+    fake = FakeAsyncClient(['unused'])
+    handler = AsyncAgentHandler(client=fake)
+    assert AgentChain(handler).status(first['run_id'])['status'] == 'complete'
+    second, status = asyncio.run(run(handler, ' overland 3D  models'))
+
+    assert second['run_id'] == first['run_id'] and second['reused']
+    assert status['steps'] == {step: 'complete' for step in handler.agents}
+    assert fake.calls == []
+    assert handler.get_formatted_result('deck', second['session_id'])['status'] == 'complete'
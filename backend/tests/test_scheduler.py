@@ -0,0 +1,121 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.scheduler import DependencyScheduler
+from config.ai_models import AI_CONFIG
+
+
+def test_config_declares_all_agents():
+    assert list(AI_CONFIG.keys()) == ['strategy', 'competitors', 'revenue', 'cost', 'roi', 'justification', 'deck']
+    scheduler = DependencyScheduler(AI_CONFIG)
+    order = scheduler.topological_order(scheduler.build_graph())
+    assert order[0] == 'strategy'
+    assert order[-1] == 'deck'
+
+
+def test_prompts_read_exactly_their_declared_dependencies():
+    from Agents.agents.registry import build_agents
+
+    agents = build_agents(AI_CONFIG, lambda step: None)
+    context = {'custom_context': 'Overland 3D models', **{step: f"<{step} output>" for step in AI_CONFIG}}
+
+    for step, agent in agents.items():
+        prompt = ' '.join(message['content'] for message in agent.build_messages(context))
+        assert [dep for dep in AI_CONFIG if f"<{dep} output>" in prompt] == AI_CONFIG[step]['dependencies'], step
+    # Cost was narrowed to strategy so it no longer waits for competitors and revenue
+    assert AI_CONFIG['cost']['dependencies'] == ['strategy']
+
+
+def test_independent_steps_run_concurrently():
+    config = {
+        'a': {'dependencies': []},
+        'b': {'dependencies': ['a']},
+        'c': {'dependencies': ['a']},
+        'd': {'dependencies': ['b', 'c']},
+    }
+    barrier = threading.Barrier(2, timeout=2)
+    finished = []
+
+    def run_step(step):
+        if step in ('b', 'c'):
+            # Both must be running at the same time to pass the barrier
+            barrier.wait()
+        finished.append(step)
+        return step.upper()
+
+    results, errors = DependencyScheduler(config).run(run_step)
+
+    assert errors == {}
+    assert results == {'a': 'A', 'b': 'B', 'c': 'C', 'd': 'D'}
+    assert finished[0] == 'a'
+    assert finished[-1] == 'd'
+
+
+def test_failed_step_skips_dependents():
+    config = {
+        'a': {'dependencies': []},
+        'b': {'dependencies': ['a']},
+        'c': {'dependencies': ['b']},
+        'd': {'dependencies': ['a']},
+    }
+
+    def run_step(step):
+        if step == 'b':
+            raise RuntimeError('boom')
+        time.sleep(0.01)
+        return step
+
+    completed = []
+    results, errors = DependencyScheduler(config).run(
+        run_step, on_complete=lambda step, result, error: completed.append(step)
+    )
+
+    assert set(results) == {'a', 'd'}
+    assert errors['b'] == 'boom'
+    assert errors['c'].startswith('Skipped')
+    assert sorted(completed) == ['a', 'b', 'c', 'd']
+
+
+def test_rejects_cycles_and_unscheduled_dependencies():
+    scheduler = DependencyScheduler({
+        'a': {'dependencies': ['b']},
+        'b': {'dependencies': ['a']},
+    })
+    with pytest.raises(ValueError):
+        scheduler.build_graph()
+
+    with pytest.raises(ValueError):
+        DependencyScheduler(AI_CONFIG).build_graph(['roi'])
+
+
+def test_profiles_select_the_dependency_closure():
+    scheduler = DependencyScheduler(AI_CONFIG, profiles={'financial': ['roi'], 'quick': ['competitors']})
+
+    assert scheduler.select('quick') == ['strategy', 'competitors']
+    assert scheduler.select('financial') == ['strategy', 'competitors', 'revenue', 'cost', 'roi']
+    assert scheduler.select(steps=['cost']) == ['strategy', 'cost']
+    assert scheduler.select() == list(AI_CONFIG)
+    with pytest.raises(ValueError):
+        scheduler.select('everything')
+    with pytest.raises(ValueError):
+        scheduler.select(steps=['tarot'])
+
+
+def test_agents_are_registered_from_config():
+    from Agents.agents.investor_deck import InvestorDeck
+    from Agents.agents.registry import agent_class, build_agents
+
+    config = {'deck': dict(AI_CONFIG['deck'], model='gpt-4o')}
+    agents = build_agents(config, lambda step: None)
+
+    assert isinstance(agents['deck'], InvestorDeck) and agents['deck'].model == 'gpt-4o'
+    assert agent_class('Agents.agents.roi_analysis.ROIAnalysis').__name__ == 'ROIAnalysis'
+    with pytest.raises(ValueError):
+        agent_class('roi_analysis.Missing')
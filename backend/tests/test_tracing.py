@@ -0,0 +1,109 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+backend_dir = Path(__file__).parent.parent
+sys.path.append(str(backend_dir))
+
+from Agents.agent_handler import AgentHandler
+from Agents.agents.agent_chain import AgentChain
+from Agents.async_agent_handler import AsyncAgentHandler
+from Agents.metrics import MeteredClient, Metrics
+from Agents.tracing import Tracer, span
+from fakes import FakeAsyncClient, FakeClient
+
+ANSWER = ['## Summary\n- Revenue: $1,000\n- Costs are low']
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    monkeypatch.setenv('LLM_CACHE_PATH', '')
+    monkeypatch.setenv('RUN_STORE_PATH', str(tmp_path / 'runs.sqlite3'))
+    monkeypatch.setenv('EXPORT_CACHE_PATH', str(tmp_path / 'exports'))
+
+
+def by_id(run_id, tracer):
+    return {s['span_id']: s for s in tracer.spans(run_id)}
+
+
+def ancestors(spans, s):
+    names = []
+    while s['parent_id'] in spans:
+        s = spans[s['parent_id']]
+        names.append(s['name'])
+    return names
+
+
+def test_run_is_traced_from_request_to_llm_attempts(store):
+    handler = AgentHandler(client=FakeClient(ANSWER))
+    with handler.tracer.span('HTTP POST /runs', lane='http'):
+        run_id = AgentChain(handler).start('Overland 3D models', 's1', profile='quick')['run_id']
+    list(handler.events.subscribe(run_id))
+
+    spans = by_id(run_id, handler.tracer)
+    names = [s['name'] for s in spans.values()]
+    assert names.count('step') == 2 and names.count('format') == 2
+    for s in spans.values():
+        if s['name'] == 'attempt':
+            assert ancestors(spans, s) == ['llm', 'step', 'run', 'HTTP POST /runs']
+        if s['name'] == 'format':
+            assert ancestors(spans, s)[:2] == ['step', 'run'] and s['lane'].endswith(' format')
+    llm = next(s for s in spans.values() if s['name'] == 'llm')
+    assert llm['attrs']['prompt_tokens'] > 0 and llm['attrs']['response_bytes'] == len(ANSWER[0])
+    step = next(s for s in spans.values() if s['name'] == 'step' and s['attrs']['step'] == 'strategy')
+    assert step['lane'] == 'strategy' and step['attrs']['source'] == 'agent'
+
+    trace = handler.tracer.chrome_trace(run_id)
+    complete = [event for event in trace['traceEvents'] if event['ph'] == 'X']
+    assert len(complete) == len(spans) and all(event['dur'] >= 0 for event in complete)
+    lanes = {event['args']['name'] for event in trace['traceEvents'] if event['name'] == 'thread_name'}
+    assert {'http', 'run', 'strategy', 'strategy format', 'competitors'} <= lanes
+    assert handler.tracer.chrome_trace('missing') is None
+
+
+def test_async_formatting_traces_under_its_step(store):
+    handler = AsyncAgentHandler(client=FakeAsyncClient(ANSWER))
+
+    async def scenario():
+        handler.submit_context('s1', 'Overland 3D models')
+        run_id = handler.start_run({'session_id': 's1', 'steps': ['strategy']})
+        await asyncio.gather(*handler.background_runs)
+        return run_id
+
+    run_id = asyncio.run(scenario())
+    spans = by_id(run_id, handler.tracer)
+    fmt = next(s for s in spans.values() if s['name'] == 'format')
+    assert ancestors(spans, fmt) == ['step', 'run'] and fmt['attrs']['queue_seconds'] >= 0
+    assert spans[fmt['parent_id']]['attrs']['raw_bytes'] == fmt['attrs']['raw_bytes']
+
+
+def test_spans_outside_a_run_are_dropped_and_errors_kept():
+    tracer = Tracer()
+    with span('orphan'):
+        pass
+    with tracer.span('HTTP GET /runs', lane='http'):
+        with span('unbound'):
+            pass
+    with pytest.raises(RuntimeError):
+        with tracer.span('run', 'r1'):
+            with span('step'):
+                raise RuntimeError("provider down")
+
+    assert tracer.traces.keys() == {'r1'}
+    assert [(s['name'], s['attrs'].get('error')) for s in tracer.spans('r1')] == [
+        ('step', 'provider down'), ('run', 'provider down')
+    ]
+
+
+def test_abandoned_stream_still_ends_its_span():
+    tracer = Tracer()
+    client = MeteredClient(FakeClient(['Market ', 'size']), Metrics(), 'roi')
+    with tracer.span('step', 'run1'):
+        stream = client.chat.completions.create(model='gpt-4', messages=[], stream=True)
+        next(stream)
+        stream.close()
+
+    llm = next(s for s in tracer.spans('run1') if s['name'] == 'llm')
+    assert llm['attrs']['cancelled'] is True and llm['attrs']['response_bytes'] == len('Market ')